@@ -1,27 +1,64 @@
 from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks
-from fastapi import UploadFile, File, Form
-from fastapi.responses import FileResponse
+from fastapi import UploadFile, File, Form, Request, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pathlib import Path
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import func, or_, select
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from typing import List, Optional
+from urllib.parse import quote
+import logging
 import os
+import tempfile
+from contextlib import nullcontext
 
-from database import get_db, engine
+from database import get_db, engine, upgrade_schema, SessionLocal
 import models
 import schemas
 import auth
 from file_storage import file_storage
-from personal_rag import PersonalRAGSystem
+from file_catalog import PublicFileCatalog
+from scheduler import scheduler, PeriodicJob
+import storage_accounting
+import storage_gc
+import upload_sessions
+import bulk_import
+from body_stream import BlockingBodyReader
+from bulk_import import BulkImporter
+import file_export
+import document_transfer
+import projection
+import change_tracking
+import change_events
+import rag_cache
+import index_server
+from json_responses import FastJSONResponse, model_response
+from response_compression import CompressionMiddleware
+import metrics
+import profiling
+import sql_monitor
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Durée et nombre des requêtes SQL, requêtes lentes (avec plan) et N+1
+sql_monitor.instrument_engine(engine)
 
 # Créer les tables
 models.Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
+
+# Ne plus conserver d'API Key en clair
+with SessionLocal() as _db:
+    auth.migrate_legacy_api_keys(_db)
 
 app = FastAPI(
     title="Multi-Tenant SaaS API - Authentification Complète",
     description="API SaaS avec création de compte, reconnexion et séparation des données",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # Middleware CORS
@@ -35,6 +72,63 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profil d'une requête à la demande d'un administrateur (en-tête X-Profile)
+if profiling.PROFILING:
+    app.add_middleware(profiling.ProfilingMiddleware)
+
+# Compression gzip/brotli des réponses JSON et texte (seuil RESPONSE_COMPRESSION_MIN_SIZE)
+app.add_middleware(CompressionMiddleware)
+
+# Nombre, durée et requêtes en cours par route (en dernier : mesure aussi la compression)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Tâches de fond
+if storage_accounting.RECONCILE_INTERVAL_SECONDS > 0:
+    scheduler.register(PeriodicJob(
+        "storage-usage-reconcile",
+        storage_accounting.RECONCILE_INTERVAL_SECONDS,
+        storage_accounting.run_reconciliation_job
+    ))
+if upload_sessions.EXPIRY_INTERVAL_SECONDS > 0:
+    scheduler.register(PeriodicJob(
+        "upload-session-expiry",
+        upload_sessions.EXPIRY_INTERVAL_SECONDS,
+        upload_sessions.run_expiry_job
+    ))
+if change_events.POLL_SECONDS > 0:
+    # Invalidation des caches de ce worker (réponses, API Keys, index RAG) après les écritures des autres
+    scheduler.register(PeriodicJob(
+        "change-events-poll",
+        change_events.POLL_SECONDS,
+        change_events.run_poll_job
+    ))
+    scheduler.register(PeriodicJob(
+        "change-events-prune",
+        change_events.PRUNE_INTERVAL_SECONDS,
+        change_events.run_prune_job,
+        run_at_start=False
+    ))
+if storage_gc.GC_INTERVAL_SECONDS > 0:
+    scheduler.register(PeriodicJob(
+        "storage-gc",
+        storage_gc.GC_INTERVAL_SECONDS,
+        storage_gc.run_gc_job,
+        run_at_start=False
+    ))
+
+@app.on_event("startup")
+def start_background_jobs():
+    scheduler.start_all()
+    metrics.check_worker_setup()
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    scheduler.stop_all()
+    file_storage.extractor.shutdown()
+    if index_server.client is not None:
+        index_server.client.close()
+    metrics.shutdown()
+
 # ==================== ENDPOINTS PUBLICS ====================
 
 @app.post("/auth/register", response_model=schemas.Token)
@@ -140,20 +234,21 @@ def refresh_token(
 
 # ==================== ENDPOINTS API KEYS ====================
 
-@app.post("/api-keys/", response_model=schemas.ApiKey)
+@app.post("/api-keys/", response_model=schemas.ApiKeyCreated)
 def create_api_key(
     api_key_data: schemas.ApiKeyCreate,
     current_user: models.User = Depends(auth.get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
-    Créer une nouvelle API Key pour l'utilisateur
+    Créer une nouvelle API Key pour l'utilisateur (la clé complète n'est retournée qu'ici)
     """
     # Générer une clé unique
     key = auth.generate_api_key()
     
     api_key = models.ApiKey(
-        key=key,
+        key_prefix=auth.get_api_key_prefix(key),
+        key_hash=auth.hash_api_key(key),
         name=api_key_data.name,
         user_id=current_user.id,
         client_id=current_user.client_id,
@@ -164,7 +259,10 @@ def create_api_key(
     db.commit()
     db.refresh(api_key)
     
-    return api_key
+    return schemas.ApiKeyCreated(
+        **schemas.ApiKey.model_validate(api_key).model_dump(),
+        key=key
+    )
 
 @app.get("/api-keys/", response_model=List[schemas.ApiKey])
 def get_api_keys(
@@ -201,7 +299,10 @@ def delete_api_key(
         )
     
     api_key.is_active = False
+    # Les autres workers retirent la clé de leur cache (bus change_events)
+    change_events.publish(db, change_events.API_KEY, current_user.client_id, current_user.id, object_id=api_key.id)
     db.commit()
+    auth.principal_cache.invalidate_api_key(api_key.id)
     
     return {"message": "API Key désactivée avec succès"}
 
@@ -263,24 +364,79 @@ def create_document(
         user_id=current_user.id
     )
     db.add(db_document)
+    change_tracking.touch(db, current_user.client_id, kind=change_events.DOCUMENTS)
     db.commit()
     db.refresh(db_document)
     return db_document
 
-@app.get("/documents/", response_model=List[schemas.Document])
+@app.post("/documents/bulk", response_model=schemas.DocumentBulkResult)
+async def bulk_create_documents(
+    request: Request,
+    batch_size: int = document_transfer.DOCUMENT_BATCH_SIZE,
+    report: str = "all",
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Créer des documents en masse : corps NDJSON (un document par ligne) ou tableau JSON.
+    Résultat ligne par ligne (report=errors pour ne lister que les erreurs).
+    """
+    if report not in ("all", "errors"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="report doit valoir 'all' ou 'errors'"
+        )
+    
+    # Le corps est lu au fil de la réception : les premiers lots sont insérés avant la fin de l'envoi
+    importer = document_transfer.DocumentImporter(
+        db, current_user, batch_size=batch_size, report_errors_only=(report == "errors")
+    )
+    return await run_in_threadpool(importer.run, BlockingBodyReader(request.stream()))
+
+@app.get("/documents/export")
+def export_documents(
+    format: str = "ndjson",
+    updated_after: Optional[datetime] = None,
+    current_user: models.User = Depends(auth.get_current_active_user)
+):
+    """
+    Exporter en flux les documents du client connecté (NDJSON, ou format=json pour un tableau)
+    """
+    if format not in ("ndjson", "json"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="format doit valoir 'ndjson' ou 'json'"
+        )
+    
+    return StreamingResponse(
+        document_transfer.iter_export(current_user.client_id, updated_after, as_array=(format == "json")),
+        media_type="application/json" if format == "json" else "application/x-ndjson",
+        headers={
+            "Content-Disposition": f"attachment; filename=documents_{datetime.utcnow():%Y%m%d}.{format}"
+        }
+    )
+
+@app.get("/documents/", response_model=List[schemas.DocumentView], response_model_exclude_unset=True)
 def get_documents(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
+    fields: Optional[str] = None,
     current_user: models.User = Depends(auth.get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     Récupérer tous les documents du client connecté
+    (fields=summary ou fields=id,title,... pour ne renvoyer que certains champs)
     """
-    documents = db.query(models.Document).filter(
+    field_list = projection.parse_fields(fields, projection.DOCUMENT_FIELDS, projection.DOCUMENT_VIEWS)
+    query = db.query(models.Document).filter(
         models.Document.client_id == current_user.client_id
-    ).offset(skip).limit(limit).all()
-    return documents
+    ).offset(skip).limit(limit)
+    return change_tracking.cached_response(
+        request, db, current_user, [change_tracking.CLIENT_SCOPE],
+        lambda: projection.documents(query, field_list)
+    )
 
 @app.get("/documents/{document_id}", response_model=schemas.Document)
 def get_document(
@@ -329,6 +485,7 @@ def update_document(
         setattr(document, field, value)
     
     document.updated_at = datetime.utcnow()
+    change_tracking.touch(db, current_user.client_id, kind=change_events.DOCUMENTS)
     db.commit()
     db.refresh(document)
     return document
@@ -354,27 +511,71 @@ def delete_document(
         )
     
     db.delete(document)
+    change_tracking.touch(db, current_user.client_id, kind=change_events.DOCUMENTS)
     db.commit()
     
     return {"message": "Document supprimé avec succès"}
 
-@app.get("/search/", response_model=List[schemas.Document])
+@app.get("/search/", response_model=List[schemas.DocumentView], response_model_exclude_unset=True)
 def search_documents(
+    request: Request,
     query: str,
+    fields: Optional[str] = None,
     current_user: models.User = Depends(auth.get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
-    Rechercher des documents par titre ou contenu pour le client connecté
+    Rechercher des documents par titre ou contenu pour le client connecté (projection: voir GET /documents/)
     """
+    field_list = projection.parse_fields(fields, projection.DOCUMENT_FIELDS, projection.DOCUMENT_VIEWS)
     documents = db.query(models.Document).filter(
         models.Document.client_id == current_user.client_id,
         (models.Document.title.contains(query)) | (models.Document.content.contains(query))
-    ).all()
-    return documents
+    )
+    return change_tracking.cached_response(
+        request, db, current_user, [change_tracking.CLIENT_SCOPE],
+        lambda: projection.documents(documents, field_list)
+    )
 
 # ==================== ENDPOINTS FICHIERS UTILISATEUR ====================
 
+def _register_user_file(db: Session, current_user: models.User, file_info: dict, is_public: bool) -> models.UserFile:
+    """Enregistrer en base un fichier déjà écrit dans le stockage (quota, compteurs, nettoyage en cas d'échec)"""
+    # Vérifier les quotas avec la taille réelle écrite
+    storage_accounting.check_quota_for_blob(db, current_user.client_id, current_user.id, file_info)
+    
+    # Enregistrer les métadonnées en base (et les compteurs dans la même transaction)
+    db_file = models.UserFile(
+        filename=file_info["filename"],
+        original_filename=file_info.get("original_filename"),
+        file_path=file_info["file_path"],
+        title=file_info["title"],
+        client_id=current_user.client_id,
+        user_id=current_user.id,
+        file_size=file_info["file_size"],
+        content_hash=file_info["content_hash"],
+        storage_encoding=file_info.get("storage_encoding"),
+        stored_size=file_info.get("stored_size"),
+        mime_type=file_info["mime_type"],
+        is_public=is_public,
+        tags=file_info.get("tags") or ""
+    )
+    
+    db.add(db_file)
+    storage_accounting.record_upload(
+        db, current_user.client_id, current_user.id, db_file.mime_type, db_file.file_size
+    )
+    try:
+        db.commit()
+    except Exception:
+        # Ne pas laisser de fichier orphelin si la ligne n'a pas pu être enregistrée
+        db.rollback()
+        file_storage.delete_user_file(current_user.client_id, current_user.id, file_info["file_path"])
+        raise
+    db.refresh(db_file)
+    
+    return db_file
+
 @app.post("/my-files/upload", response_model=schemas.UserFileMetadata)
 async def upload_my_file(
     title: str = Form(...),
@@ -382,7 +583,8 @@ async def upload_my_file(
     is_public: bool = Form(False),
     file: UploadFile = File(...),
     current_user: models.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks = None
 ):
     """
     Uploader un fichier personnel
@@ -396,37 +598,168 @@ async def upload_my_file(
         tags=tags or ""
     )
     
-    # Enregistrer les métadonnées en base
-    db_file = models.UserFile(
-        filename=file_info["filename"],
-        original_filename=file_info.get("original_filename"),
-        file_path=file_info["file_path"],
-        title=file_info["title"],
-        client_id=current_user.client_id,
-        user_id=current_user.id,
-        file_size=file_info["file_size"],
-        mime_type=file_info["mime_type"],
-        is_public=is_public,
-        tags=tags or ""
+    db_file = _register_user_file(db, current_user, file_info, is_public)
+    
+    # Extraire le texte (PDF, DOCX...) après la réponse, pour que RAG et recherche lisent le cache
+    background_tasks.add_task(file_storage.warm_extracted_text, [file_info])
+    
+    return db_file
+
+@app.post("/my-files/bulk", response_model=schemas.BulkUploadResult)
+async def bulk_upload_my_files(
+    request: Request,
+    tags: Optional[str] = None,
+    is_public: bool = False,
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks = None
+):
+    """
+    Importer une archive (.zip, .tar, .tar.gz...) de fichiers personnels en une requête.
+    Corps brut (tags et is_public en paramètres) : un tar est importé au fil de la réception.
+    Formulaire multipart (champs archive, tags, is_public) : l'archive est d'abord mise en tampon.
+    """
+    importer = BulkImporter(db, current_user)
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        # Le formulaire est recopié en entier avant l'import : taille bornée dès l'en-tête
+        length = request.headers.get("content-length")
+        if length is None:
+            raise HTTPException(status_code=status.HTTP_411_LENGTH_REQUIRED, detail="Content-Length requis")
+        if int(length) > bulk_import.BULK_MAX_SPOOLED_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Archive trop volumineuse (maximum {bulk_import.BULK_MAX_SPOOLED_SIZE} octets en "
+                       f"formulaire, envoyer un .tar.gz en corps brut pour un import en flux)"
+            )
+        form = await request.form()
+        try:
+            archive = form.get("archive")
+            if not hasattr(archive, "file"):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Champ 'archive' manquant")
+            tags = form.get("tags", tags)
+            is_public = str(form.get("is_public", is_public)).lower() in ("1", "true", "on", "yes")
+            result = await run_in_threadpool(importer.run, archive.file, tags or "", is_public)
+        finally:
+            await form.close()
+    else:
+        result = await bulk_import.import_request_body(importer, request.stream(), tags or "", is_public)
+    
+    # Une seule tâche de fond pour l'extraction de texte de tout le lot
+    if importer.imported:
+        background_tasks.add_task(file_storage.warm_extracted_text, importer.imported)
+    
+    return result
+
+# ---- Uploads multipart reprenables (gros fichiers) ----
+
+@app.post("/my-files/uploads", response_model=schemas.UploadSession)
+def create_upload_session(
+    payload: schemas.UploadSessionCreate,
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Démarrer un upload en plusieurs parties
+    """
+    session = upload_sessions.create_session(
+        db, current_user,
+        filename=payload.filename,
+        total_size=payload.total_size,
+        title=payload.title,
+        tags=payload.tags or "",
+        is_public=payload.is_public,
+        part_size=payload.part_size
     )
+    return upload_sessions.describe_session(session)
+
+@app.get("/my-files/uploads/{session_id}", response_model=schemas.UploadSession)
+def get_upload_session(
+    session_id: str,
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    État d'un upload (parties déjà reçues, pour reprendre après une coupure)
+    """
+    return upload_sessions.describe_session(upload_sessions.get_session(db, current_user, session_id))
+
+@app.put("/my-files/uploads/{session_id}/parts/{part_number}", response_model=schemas.UploadPartReceipt)
+async def upload_file_part(
+    session_id: str,
+    part_number: int,
+    request: Request,
+    x_part_sha256: Optional[str] = Header(None),
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Envoyer une partie (corps brut) ; en-tête X-Part-SHA256 optionnel pour la vérifier
+    """
+    # Requête en base hors de la boucle d'événements
+    session = await run_in_threadpool(upload_sessions.get_session, db, current_user, session_id)
+    expected = upload_sessions.expected_part_size(session, part_number)
     
-    db.add(db_file)
-    db.commit()
-    db.refresh(db_file)
+    # Le corps est reçu dans un fichier temporaire, puis écrit dans le stockage hors de la boucle d'événements
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as body:
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > expected:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Partie {part_number} trop grande (attendu: {expected} octets)"
+                )
+            body.write(chunk)
+        return await run_in_threadpool(
+            upload_sessions.write_part, db, session, part_number, body, x_part_sha256
+        )
+
+@app.post("/my-files/uploads/{session_id}/complete", response_model=schemas.UserFileMetadata)
+def complete_upload_session(
+    session_id: str,
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks = None
+):
+    """
+    Assembler les parties et enregistrer le fichier (409 si une autre finalisation est en cours)
+    """
+    session = upload_sessions.get_session(db, current_user, session_id)
+    file_info = upload_sessions.complete_session(db, session)
+    db_file = _register_user_file(db, current_user, file_info, file_info["is_public"])
+    
+    # Hash du contenu et extraction du texte après la réponse
+    background_tasks.add_task(upload_sessions.finalize_uploaded_file, db_file.id)
     
     return db_file
 
-@app.get("/my-files/", response_model=List[schemas.UserFileMetadata])
+@app.delete("/my-files/uploads/{session_id}")
+def abort_upload_session(
+    session_id: str,
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Abandonner un upload en cours
+    """
+    upload_sessions.abort_session(db, upload_sessions.get_session(db, current_user, session_id))
+    return {"message": "Upload abandonné"}
+
+@app.get("/my-files/", response_model=List[schemas.UserFileView], response_model_exclude_unset=True)
 def list_my_files(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     tag: Optional[str] = None,
+    fields: Optional[str] = None,
     current_user: models.User = Depends(auth.get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     Lister tous mes fichiers personnels (avec filtre par tag optionnel)
+    (fields=summary ou fields=id,title,... pour ne renvoyer que certains champs)
     """
+    field_list = projection.parse_fields(fields, projection.USER_FILE_FIELDS, projection.USER_FILE_VIEWS)
     query = db.query(models.UserFile).filter(
         models.UserFile.user_id == current_user.id
     )
@@ -434,21 +767,92 @@ def list_my_files(
     if tag:
         query = query.filter(models.UserFile.tags.contains(tag))
     
-    files = query.offset(skip).limit(limit).all()
-    return files
+    return change_tracking.cached_response(
+        request, db, current_user, [change_tracking.USER_SCOPE],
+        lambda: projection.user_files(query.offset(skip).limit(limit), field_list)
+    )
 
 @app.get("/my-files/stats", response_model=schemas.UserStorageStats)
 def get_my_storage_stats(
-    current_user: models.User = Depends(auth.get_current_active_user)
+    request: Request,
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
 ):
     """
-    Obtenir les statistiques de mon stockage
+    Obtenir les statistiques de mon stockage (lues depuis les compteurs, sans parcourir le disque)
     """
-    stats = file_storage.get_storage_stats(
-        client_id=current_user.client_id,
-        user_id=current_user.id
+    return change_tracking.cached_response(
+        request, db, current_user, [change_tracking.USER_SCOPE, change_tracking.CLIENT_SCOPE],
+        lambda: model_response(schemas.UserStorageStats, storage_accounting.get_usage_stats(
+            db,
+            client_id=current_user.client_id,
+            user_id=current_user.id
+        ))
     )
-    return stats
+
+@app.get("/my-files/export")
+def export_my_files(
+    request: Request,
+    ids: Optional[str] = None,
+    tag: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Exporter mes fichiers (tous, ou filtrés par ids "1,2,3", tag et dates) dans une archive zip en flux.
+    Un téléchargement interrompu peut être repris avec l'en-tête Range (et If-Range avec l'ETag reçu).
+    """
+    query = db.query(models.UserFile).filter(models.UserFile.user_id == current_user.id)
+    if ids:
+        try:
+            id_list = [int(i) for i in ids.split(",") if i.strip()]
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="ids doit être une liste d'entiers séparés par des virgules"
+            )
+        query = query.filter(models.UserFile.id.in_(id_list))
+    if tag:
+        query = query.filter(models.UserFile.tags.contains(tag))
+    if created_after:
+        query = query.filter(models.UserFile.created_at >= created_after)
+    if created_before:
+        query = query.filter(models.UserFile.created_at < created_before)
+    
+    export = file_export.build_export(file_storage, query.order_by(models.UserFile.id).all())
+    headers = {
+        "Content-Disposition": f"attachment; filename=mes_fichiers_{datetime.utcnow():%Y%m%d}.zip",
+        "ETag": export.etag,
+        "Accept-Ranges": "bytes"
+    }
+    
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == export.etag):
+        infos, total = export.layout()
+        byte_range = file_export.parse_range(range_header, total)
+        if byte_range is None:
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                detail="Plage invalide",
+                headers={"Content-Range": f"bytes */{total}"}
+            )
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            export.iter_range(start, end, infos),
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            media_type="application/zip",
+            headers=headers
+        )
+    
+    total = export.known_size()
+    if total is not None:
+        headers["Content-Length"] = str(total)
+    return StreamingResponse(iter(export), media_type="application/zip", headers=headers)
 
 @app.get("/my-files/{file_id}", response_model=schemas.UserFileContent)
 def get_my_file(
@@ -475,7 +879,9 @@ def get_my_file(
         content = file_storage.read_user_file(
             current_user.client_id,
             current_user.id,
-            file_meta.file_path
+            file_meta.file_path,
+            content_hash=file_meta.content_hash,
+            storage_encoding=file_meta.storage_encoding
         )
     except Exception as e:
         raise HTTPException(
@@ -496,6 +902,7 @@ def get_my_file(
 @app.get("/my-files/{file_id}/download")
 def download_my_file(
     file_id: int,
+    request: Request,
     current_user: models.User = Depends(auth.get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -513,16 +920,58 @@ def download_my_file(
             detail="Fichier non trouvé"
         )
     
-    if not Path(file_meta.file_path).exists():
+    blob = file_storage.stat_user_file(file_meta.file_path)
+    if blob is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Fichier physique non trouvé"
         )
     
-    return FileResponse(
-        path=file_meta.file_path,
-        filename=file_meta.original_filename or file_meta.filename,
-        media_type=file_meta.mime_type
+    download_name = file_meta.original_filename or file_meta.filename
+    disposition = f"attachment; filename*=utf-8''{quote(download_name)}"
+    
+    if file_meta.storage_encoding:
+        # Blob compressé au repos : servi tel quel si le client accepte l'encodage, sinon décompressé en flux
+        content_encoding = file_storage.codec.http_content_encoding(file_meta.storage_encoding)
+        accepted = [e.split(";")[0].strip() for e in request.headers.get("accept-encoding", "").lower().split(",")]
+        if content_encoding and content_encoding in accepted:
+            return StreamingResponse(
+                file_storage.iter_stored_chunks(blob["key"]),
+                media_type=file_meta.mime_type,
+                headers={
+                    "Content-Length": str(blob["size"]),
+                    "Content-Encoding": content_encoding,
+                    "Vary": "Accept-Encoding",
+                    "Content-Disposition": disposition
+                }
+            )
+        return StreamingResponse(
+            file_storage.iter_blob_chunks(blob["key"], file_meta.storage_encoding),
+            media_type=file_meta.mime_type,
+            headers={
+                "Content-Length": str(file_meta.file_size),
+                "Vary": "Accept-Encoding",
+                "Content-Disposition": disposition
+            }
+        )
+    
+    local_path = file_storage.driver.local_path(blob["key"])
+    if local_path is not None:
+        metrics.record_storage("read", blob["size"])
+        return FileResponse(
+            path=local_path,
+            filename=download_name,
+            media_type=file_meta.mime_type
+        )
+    
+    # Stockage objet : relayer le flux sans le charger en mémoire
+    return StreamingResponse(
+        file_storage.iter_stored_chunks(blob["key"]),
+        media_type=file_meta.mime_type,
+        headers={
+            "Content-Length": str(blob["size"]),
+            "Content-Disposition": disposition
+        }
     )
 
 @app.put("/my-files/{file_id}", response_model=schemas.UserFileMetadata)
@@ -552,6 +1001,7 @@ def update_my_file(
         setattr(file_meta, field, value)
     
     file_meta.updated_at = datetime.utcnow()
+    change_tracking.touch(db, current_user.client_id, current_user.id, change_events.FILES, object_id=file_meta.id)
     db.commit()
     db.refresh(file_meta)
     
@@ -593,7 +1043,11 @@ def delete_my_file(
             detail=f"Erreur lors de la suppression du fichier: {str(e)}"
         )
     
-    # Supprimer l'entrée en base
+    # Supprimer l'entrée en base et décompter le fichier
+    storage_accounting.record_delete(
+        db, current_user.client_id, current_user.id, file_meta.mime_type, file_meta.file_size,
+        file_id=file_meta.id
+    )
     db.delete(file_meta)
     db.commit()
     
@@ -601,21 +1055,61 @@ def delete_my_file(
 
 @app.get("/shared-files/", response_model=List[schemas.UserFileMetadata])
 def list_shared_files(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
+    tag: Optional[str] = None,
     current_user: models.User = Depends(auth.get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     Lister les fichiers publics des autres utilisateurs de mon client
     """
-    files = db.query(models.UserFile).filter(
-        models.UserFile.client_id == current_user.client_id,
-        models.UserFile.is_public == True,
-        models.UserFile.user_id != current_user.id  # Exclure mes propres fichiers
-    ).offset(skip).limit(limit).all()
-    
-    return files
+    return change_tracking.cached_response(
+        request, db, current_user, [change_tracking.CLIENT_SCOPE],
+        lambda: model_response(List[schemas.UserFileMetadata], PublicFileCatalog(db).list(
+            current_user.client_id,
+            skip=skip,
+            limit=limit,
+            exclude_user_id=current_user.id,  # Exclure mes propres fichiers
+            tag=tag
+        ))
+    )
+
+@app.get("/shared-files/count")
+def count_shared_files(
+    tag: Optional[str] = None,
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Compter les fichiers publics des autres utilisateurs de mon client
+    """
+    count = PublicFileCatalog(db).count(
+        current_user.client_id,
+        exclude_user_id=current_user.id,
+        tag=tag
+    )
+    return {"client_id": current_user.client_id, "count": count}
+
+@app.get("/shared-files/search/", response_model=List[schemas.UserFileMetadata])
+def search_shared_files(
+    query: str,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Rechercher (titre, nom, tags) dans les fichiers publics des autres utilisateurs de mon client
+    """
+    return PublicFileCatalog(db).search(
+        current_user.client_id,
+        query,
+        skip=skip,
+        limit=limit,
+        exclude_user_id=current_user.id
+    )
 
 @app.get("/my-files/search/", response_model=List[schemas.UserFileContent])
 def search_in_my_files(
@@ -645,7 +1139,9 @@ def search_in_my_files(
             content = file_storage.read_user_file(
                 current_user.client_id,
                 current_user.id,
-                file_meta.file_path
+                file_meta.file_path,
+                content_hash=file_meta.content_hash,
+                storage_encoding=file_meta.storage_encoding
             )
             
             # Recherche dans le titre ET le contenu
@@ -675,7 +1171,7 @@ def search_in_my_files(
             print(f"Erreur de lecture du fichier {file_meta.filename}: {e}")
             continue
     
-    return results
+    return model_response(List[schemas.UserFileContent], results)
 
 @app.post("/my-files/rag/query")
 def rag_query_my_files(
@@ -684,7 +1180,10 @@ def rag_query_my_files(
     db: Session = Depends(get_db)
 ):
     """
-    Interroger un chatbot RAG sur MES fichiers seulement
+    Interroger un chatbot RAG sur MES fichiers, complétés par les fichiers publics
+    et les documents de mon client
+    
+    `"debug_timings": true` (administrateurs) ajoute la durée de chaque étape à la réponse.
     """
     question = request.get("question", "")
     
@@ -694,12 +1193,34 @@ def rag_query_my_files(
             detail="Question requise"
         )
     
-    # Initialiser le système RAG pour cet utilisateur
-    rag_system = PersonalRAGSystem(current_user.id, current_user.client_id, db)
-    
-    # Traiter la question
-    result = rag_system.query(question)
+    debug_timings = bool(request.get("debug_timings")) and current_user.is_admin
+    with (tracing.record() if debug_timings else nullcontext([])) as spans:
+        with tracing.span("rag.request", user_id=current_user.id, client_id=current_user.client_id):
+            if index_server.client is not None:
+                # Index gardé par le serveur d'index de l'utilisateur (INDEX_SERVERS)
+                with tracing.span("rag.index_server"):
+                    try:
+                        result = index_server.client.query(current_user, question, debug_timings)
+                    except index_server.IndexServerError as e:
+                        logger.error(f"Erreur du serveur d'index: {e}")
+                        raise HTTPException(
+                            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Service RAG temporairement indisponible"
+                        )
+            else:
+                # Index de l'utilisateur : en cache, synchronisé avec les écritures de tous les workers
+                with rag_cache.rag_index_cache.use(current_user, db) as rag_system:
+                    # Traiter la question
+                    result = rag_system.query(question)
     
+    if debug_timings:
+        remote = result.pop("debug_timings", None)
+        result["debug_timings"] = tracing.timings(spans)
+        if remote:
+            # Étapes exécutées par le serveur d'index, sous rag.request > rag.index_server
+            result["debug_timings"]["stages"] += [
+                {**stage, "depth": stage["depth"] + 2} for stage in remote["stages"]
+            ]
     return result
 
 # ==================== ENDPOINTS ADMIN ====================
@@ -762,6 +1283,116 @@ def create_user(
     
     return user
 
+@app.post("/admin/storage/reconcile")
+def reconcile_storage_usage(
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Recalculer les compteurs de stockage du client depuis le disque (admin seulement)
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès réservé aux administrateurs"
+        )
+    
+    result = storage_accounting.reconcile_usage(db, client_id=current_user.client_id)
+    return {"client_id": current_user.client_id, **result}
+
+@app.get("/admin/storage/gc")
+def get_storage_gc_status(
+    current_user: models.User = Depends(auth.get_current_active_user)
+):
+    """
+    Progression et compteurs du réconciliateur stockage / base (admin seulement)
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès réservé aux administrateurs"
+        )
+    
+    return storage_gc.reconciler.get_metrics()
+
+@app.post("/admin/storage/compression/train")
+def train_compression_dictionary(
+    sample_limit: int = 1000,
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Entraîner le dictionnaire zstd du client sur ses fichiers texte (admin seulement)
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès réservé aux administrateurs"
+        )
+    
+    rows = db.query(models.UserFile.file_path, models.UserFile.storage_encoding).filter(
+        models.UserFile.client_id == current_user.client_id,
+        or_(models.UserFile.filename.ilike("%.txt"), models.UserFile.filename.ilike("%.md"))
+    ).order_by(models.UserFile.id.desc()).limit(max(1, min(sample_limit, 2000))).all()
+    
+    samples = []
+    for file_path, storage_encoding in rows:
+        try:
+            samples.append(file_storage.read_blob(file_storage.resolve_key(file_path), storage_encoding))
+        except Exception as e:
+            logger.warning(f"[Compression] Échantillon illisible {file_path}: {e}")
+    
+    result = file_storage.codec.train_dictionary(current_user.client_id, samples)
+    return {"client_id": current_user.client_id, **result}
+
+def _require_admin(current_user: models.User):
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès réservé aux administrateurs"
+        )
+
+@app.post("/admin/debug/tracemalloc/start")
+def start_tracemalloc(
+    frames: int = 1,
+    current_user: models.User = Depends(auth.get_current_active_user)
+):
+    """
+    Démarrer le suivi des allocations (`frames` cadres par trace ; coûteux, à arrêter après usage)
+    """
+    _require_admin(current_user)
+    return profiling.start_tracemalloc(frames)
+
+@app.post("/admin/debug/tracemalloc/stop")
+def stop_tracemalloc(current_user: models.User = Depends(auth.get_current_active_user)):
+    _require_admin(current_user)
+    return profiling.stop_tracemalloc()
+
+@app.post("/admin/debug/tracemalloc/snapshot")
+def take_tracemalloc_snapshot(
+    group_by: str = "lineno",
+    limit: int = 20,
+    current_user: models.User = Depends(auth.get_current_active_user)
+):
+    """
+    Instantané de référence (pour les comparaisons suivantes) et plus gros allocateurs
+    """
+    _require_admin(current_user)
+    return profiling.top_allocations(group_by, limit, set_baseline=True)
+
+@app.get("/admin/debug/tracemalloc")
+def get_tracemalloc_top(
+    group_by: str = "lineno",
+    limit: int = 20,
+    compare: bool = False,
+    current_user: models.User = Depends(auth.get_current_active_user)
+):
+    """
+    Plus gros allocateurs, ou croissance depuis l'instantané de référence (`compare=true`)
+    """
+    _require_admin(current_user)
+    return profiling.top_allocations(group_by, limit, compare=compare)
+
 # ==================== ENDPOINTS UTILITAIRES ====================
 
 @app.get("/health")
@@ -776,6 +1407,19 @@ def health_check():
         "timestamp": datetime.utcnow().isoformat()
     }
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics(authorization: Optional[str] = Header(None)):
+    """
+    Métriques au format Prometheus (protégées par METRICS_TOKEN si défini)
+    """
+    if metrics.METRICS_TOKEN and authorization != f"Bearer {metrics.METRICS_TOKEN}":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Jeton de métriques invalide"
+        )
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/debug/client-info")
 def debug_client_info(
     current_user: models.User = Depends(auth.get_current_active_user),
@@ -784,14 +1428,18 @@ def debug_client_info(
     """
     Endpoint de debug pour voir les infos du client
     """
-    client = current_user.client
-    user_count = db.query(models.User).filter(
+    # Client et compteurs en une seule requête (sous-requêtes scalaires)
+    user_count = select(func.count(models.User.id)).where(
         models.User.client_id == current_user.client_id
-    ).count()
+    ).scalar_subquery()
     
-    doc_count = db.query(models.Document).filter(
+    doc_count = select(func.count(models.Document.id)).where(
         models.Document.client_id == current_user.client_id
-    ).count()
+    ).scalar_subquery()
+    
+    client, user_count, doc_count = db.query(models.Client, user_count, doc_count).filter(
+        models.Client.id == current_user.client_id
+    ).one()
     
     return {
         "client": {
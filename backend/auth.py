@@ -5,9 +5,16 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from collections import OrderedDict
+import hashlib
+import hmac
+import os
 import secrets
+import threading
+import time
 
 from database import get_db
+import change_events
 import models
 import schemas
 
@@ -19,6 +26,18 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 # Pour l'authentification API Key
 API_KEY_HEADER = HTTPBearer(auto_error=False)
 
+# Format des clés : "tema_" + secret. Les 12 premiers caractères du secret forment
+# le préfixe public (indexé) ; seule l'empreinte HMAC de la clé complète est stockée.
+API_KEY_PREFIX = "tema_"
+API_KEY_LOOKUP_LENGTH = 12
+API_KEY_PEPPER = os.environ.get("API_KEY_PEPPER", SECRET_KEY).encode("utf-8")
+
+# Cache des principaux authentifiés par clé API
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.environ.get("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.environ.get("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+# Ne pas réécrire `last_used` à chaque requête
+API_KEY_LAST_USED_RESOLUTION = timedelta(seconds=60)
+
 # Use pbkdf2_sha256 as primary to avoid bcrypt binary issues on some environments;
 # keep bcrypt as a fallback for compatibility with any existing hashes.
 pwd_context = CryptContext(schemes=["pbkdf2_sha256", "bcrypt"], deprecated="auto")
@@ -30,6 +49,72 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# Utilitaires API Key
+def hash_api_key(key: str) -> str:
+    """Empreinte HMAC-SHA256 (rapide, à clé serveur) d'une API Key"""
+    return hmac.new(API_KEY_PEPPER, key.encode("utf-8"), hashlib.sha256).hexdigest()
+
+def get_api_key_prefix(key: str) -> str:
+    """Partie publique d'une API Key, utilisée comme clé de recherche indexée"""
+    return key[:len(API_KEY_PREFIX) + API_KEY_LOOKUP_LENGTH]
+
+
+class PrincipalCache:
+    """Cache LRU/TTL en mémoire : empreinte de la clé -> (api_key_id, user_id)
+
+    Évite la requête sur `api_keys` pour les clés déjà validées. Les entrées
+    expirent après `ttl_seconds` ; une clé révoquée est retirée explicitement.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: int = 60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key_hash: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key_hash)
+            if entry is None:
+                return None
+            if entry["expires_at"] < time.monotonic():
+                del self._entries[key_hash]
+                return None
+            self._entries.move_to_end(key_hash)
+            return entry
+
+    def set(self, key_hash: str, api_key_id: int, user_id: int, last_used: Optional[datetime] = None):
+        with self._lock:
+            self._entries[key_hash] = {
+                "api_key_id": api_key_id,
+                "user_id": user_id,
+                "last_used": last_used,
+                "expires_at": time.monotonic() + self.ttl_seconds
+            }
+            self._entries.move_to_end(key_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_api_key(self, api_key_id: int):
+        with self._lock:
+            for key_hash in [h for h, e in self._entries.items() if e["api_key_id"] == api_key_id]:
+                del self._entries[key_hash]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_MAX_ENTRIES, PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+@change_events.bus.subscribe
+def _invalidate_revoked_api_keys(events):
+    """API Keys désactivées par un autre worker : ne plus les accepter depuis le cache"""
+    for event in events:
+        if event["kind"] == change_events.API_KEY and event["object_id"]:
+            principal_cache.invalidate_api_key(event["object_id"])
+
 # Gestion des tokens JWT
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -84,19 +169,9 @@ def get_current_user(
             return user
         
         # Vérifier si c'est une API Key
-        api_key = db.query(models.ApiKey).filter(
-            models.ApiKey.key == credentials.credentials,
-            models.ApiKey.is_active == True
-        ).first()
-        
-        if api_key:
-            # Mettre à jour la date d'utilisation
-            api_key.last_used = datetime.utcnow()
-            db.commit()
-            
-            user = db.query(models.User).filter(models.User.id == api_key.user_id).first()
-            if user and user.is_active:
-                return user
+        user = authenticate_api_key(db, credentials.credentials)
+        if user:
+            return user
     
     raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -115,6 +190,53 @@ def get_current_client(current_user: models.User = Depends(get_current_active_us
         raise HTTPException(status_code=400, detail="Client inactif ou non trouvé")
     return client
 
+def authenticate_api_key(db: Session, key: str) -> Optional[models.User]:
+    """Valider une API Key : cache des principaux, sinon recherche par préfixe + comparaison en temps constant"""
+    if not key.startswith(API_KEY_PREFIX):
+        return None
+
+    key_hash = hash_api_key(key)
+    principal = principal_cache.get(key_hash)
+
+    if principal is None:
+        candidates = db.query(models.ApiKey).filter(
+            models.ApiKey.key_prefix == get_api_key_prefix(key),
+            models.ApiKey.is_active == True
+        ).all()
+        api_key = next(
+            (c for c in candidates if c.key_hash and hmac.compare_digest(c.key_hash, key_hash)),
+            None
+        )
+        if api_key is None:
+            return None
+        principal_cache.set(key_hash, api_key.id, api_key.user_id, api_key.last_used)
+        principal = principal_cache.get(key_hash)
+
+    # Mettre à jour la date d'utilisation (au plus une fois par minute et par clé)
+    now = datetime.utcnow()
+    if principal["last_used"] is None or now - principal["last_used"] > API_KEY_LAST_USED_RESOLUTION:
+        db.query(models.ApiKey).filter(models.ApiKey.id == principal["api_key_id"]).update(
+            {models.ApiKey.last_used: now}, synchronize_session=False
+        )
+        db.commit()
+        principal["last_used"] = now
+
+    user = db.get(models.User, principal["user_id"])
+    if user and user.is_active:
+        return user
+    return None
+
+def migrate_legacy_api_keys(db: Session) -> int:
+    """Remplacer les API Keys stockées en clair par préfixe + empreinte HMAC"""
+    legacy_keys = db.query(models.ApiKey).filter(models.ApiKey.key.isnot(None)).all()
+    for api_key in legacy_keys:
+        api_key.key_prefix = get_api_key_prefix(api_key.key)
+        api_key.key_hash = hash_api_key(api_key.key)
+        api_key.key = None
+    if legacy_keys:
+        db.commit()
+    return len(legacy_keys)
+
 # Génération d'API Key
 def generate_api_key(length: int = 32):
-    return f"tema_{secrets.token_urlsafe(length)}"
+    return f"{API_KEY_PREFIX}{secrets.token_urlsafe(length)}"
@@ -0,0 +1,193 @@
+"""Compression au repos des fichiers texte.
+
+Les blobs `.txt` / `.md` peuvent être stockés compressés (``STORAGE_COMPRESSION``) :
+
+- ``off`` (défaut) : stockage brut ;
+- ``gzip`` : gzip standard (servi tel quel aux clients qui acceptent ``Content-Encoding: gzip``) ;
+- ``zstd`` / ``auto`` : zstd si `zstandard` est installé (``auto`` retombe sur gzip sinon),
+  avec le dictionnaire entraîné du client s'il existe.
+
+L'encodage est enregistré dans `UserFile.storage_encoding` (``gzip``, ``zstd`` ou
+``zstd:<dict_id>``) ; `UserFile.file_size` reste la taille logique et
+`UserFile.stored_size` la taille physique. Les dictionnaires sont des clés cachées
+du stockage (``.zdict/<dict_id>.dict``, ``.zdict/client_<id>.current``).
+"""
+import logging
+import os
+import secrets
+import threading
+import time
+import zlib
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, Tuple
+
+# Optional zstd dependency (best-effort)
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_MODE = os.environ.get("STORAGE_COMPRESSION", "off").lower()
+ZSTD_LEVEL = int(os.environ.get("STORAGE_ZSTD_LEVEL", "9"))
+GZIP_LEVEL = 6
+COMPRESSIBLE_EXTENSIONS = {".txt", ".md"}
+
+DICT_SIZE = 112 * 1024
+DICT_MIN_SAMPLES = 20
+DICT_MAX_SAMPLES = 2000
+DICT_POINTER_TTL_SECONDS = 300
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _TransformReader:
+    """Flux en lecture appliquant un compresseur / décompresseur (interface compress|decompress + flush)"""
+
+    def __init__(self, stream: BinaryIO, process, flush=None):
+        self.stream = stream
+        self.process = process
+        self.flush = flush
+        self.buffer = b""
+        self.eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self.eof and (size is None or size < 0 or len(self.buffer) < size):
+            data = self.stream.read(CHUNK_SIZE)
+            if data:
+                self.buffer += self.process(data)
+            else:
+                if self.flush is not None:
+                    self.buffer += self.flush()
+                self.eof = True
+        if size is None or size < 0:
+            data, self.buffer = self.buffer, b""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def close(self):
+        close = getattr(self.stream, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BlobCodec:
+    """Choix de l'encodage, compression et décompression en flux, dictionnaires zstd par client"""
+
+    def __init__(self, driver, mode: str = COMPRESSION_MODE):
+        self.driver = driver
+        self.mode = mode
+        self._dicts: Dict[int, object] = {}
+        self._current: Dict[int, Tuple[Optional[int], float]] = {}
+        self._lock = threading.Lock()
+
+    # ---- dictionnaires ----
+
+    def _dict_key(self, dict_id: int) -> str:
+        return f".zdict/{dict_id}.dict"
+
+    def _pointer_key(self, client_id: int) -> str:
+        return f".zdict/client_{client_id}.current"
+
+    def _load_dict(self, dict_id: int):
+        with self._lock:
+            cached = self._dicts.get(dict_id)
+        if cached is None:
+            cached = zstandard.ZstdCompressionDict(self.driver.read_bytes(self._dict_key(dict_id)))
+            with self._lock:
+                self._dicts[dict_id] = cached
+        return cached
+
+    def current_dict_id(self, client_id: int) -> Optional[int]:
+        """Dictionnaire courant du client (relu périodiquement : entraînement possible dans un autre worker)"""
+        with self._lock:
+            cached = self._current.get(client_id)
+        if cached is not None and time.monotonic() - cached[1] < DICT_POINTER_TTL_SECONDS:
+            return cached[0]
+        try:
+            dict_id = int(self.driver.read_bytes(self._pointer_key(client_id)))
+        except (OSError, ValueError):
+            dict_id = None
+        with self._lock:
+            self._current[client_id] = (dict_id, time.monotonic())
+        return dict_id
+
+    def train_dictionary(self, client_id: int, samples: Iterable[bytes]) -> Dict[str, object]:
+        """Entraîner et activer un dictionnaire zstd pour les prochains fichiers du client"""
+        if zstandard is None:
+            return {"trained": False, "reason": "zstandard non installé"}
+        samples = [s for s in samples if s][:DICT_MAX_SAMPLES]
+        if len(samples) < DICT_MIN_SAMPLES:
+            return {"trained": False, "reason": f"au moins {DICT_MIN_SAMPLES} fichiers texte nécessaires", "samples": len(samples)}
+
+        dict_id = secrets.randbelow(2 ** 31 - 32768) + 32768  # Identifiants < 32768 réservés par zstd
+        trained = zstandard.train_dictionary(DICT_SIZE, samples, dict_id=dict_id, level=ZSTD_LEVEL)
+        self.driver.put_bytes(self._dict_key(dict_id), trained.as_bytes())
+        self.driver.put_bytes(self._pointer_key(client_id), str(dict_id).encode())
+        with self._lock:
+            self._dicts[dict_id] = trained
+            self._current[client_id] = (dict_id, time.monotonic())
+        logger.info(f"[Compression] Dictionnaire {dict_id} entraîné pour le client {client_id} ({len(samples)} fichiers)")
+        return {"trained": True, "dict_id": dict_id, "samples": len(samples), "dict_size": len(trained.as_bytes())}
+
+    # ---- encodage ----
+
+    def choose_encoding(self, client_id: int, extension: str) -> Optional[str]:
+        if self.mode == "off" or extension.lower() not in COMPRESSIBLE_EXTENSIONS:
+            return None
+        if self.mode in ("zstd", "auto") and zstandard is not None:
+            dict_id = self.current_dict_id(client_id)
+            return f"zstd:{dict_id}" if dict_id else "zstd"
+        if self.mode == "zstd":
+            logger.warning("[Compression] zstandard non installé, compression gzip utilisée")
+        return "gzip"
+
+    def _zstd_dict(self, encoding: str):
+        _, _, dict_id = encoding.partition(":")
+        return self._load_dict(int(dict_id)) if dict_id else None
+
+    def compressing_reader(self, stream: BinaryIO, encoding: str) -> _TransformReader:
+        if encoding == "gzip":
+            compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            return _TransformReader(stream, compressor.compress, compressor.flush)
+        dict_data = self._zstd_dict(encoding)
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data).compressobj()
+        return _TransformReader(stream, compressor.compress, compressor.flush)
+
+    def _decompressor(self, encoding: str):
+        if encoding == "gzip":
+            decompressor = zlib.decompressobj(31)
+            return decompressor.decompress, decompressor.flush
+        if zstandard is None:
+            raise RuntimeError("zstandard est requis pour lire ce fichier (pip install zstandard)")
+        decompressor = zstandard.ZstdDecompressor(dict_data=self._zstd_dict(encoding)).decompressobj()
+        return decompressor.decompress, None
+
+    def decompressing_reader(self, stream: BinaryIO, encoding: str) -> _TransformReader:
+        process, flush = self._decompressor(encoding)
+        return _TransformReader(stream, process, flush)
+
+    def iter_decompressed(self, chunks: Iterator[bytes], encoding: str) -> Iterator[bytes]:
+        process, flush = self._decompressor(encoding)
+        for chunk in chunks:
+            data = process(chunk)
+            if data:
+                yield data
+        if flush is not None:
+            data = flush()
+            if data:
+                yield data
+
+    @staticmethod
+    def http_content_encoding(encoding: Optional[str]) -> Optional[str]:
+        """Valeur Content-Encoding si le blob peut être servi tel quel (pas de dictionnaire privé)"""
+        if encoding in ("gzip", "zstd"):
+            return encoding
+        return None
@@ -0,0 +1,74 @@
+"""Lecture bloquante du corps d'une requête depuis un thread de travail.
+
+Les importeurs (archives, documents) sont synchrones : ils lisent un flux binaire
+et écrivent en base et dans le stockage. Plutôt que de recopier tout le corps dans
+un fichier temporaire avant de commencer, `BlockingBodyReader` leur présente
+``request.stream()`` comme un fichier : chaque lecture attend le morceau suivant
+sur la boucle d'événements (``anyio.from_thread``). À utiliser uniquement dans
+une fonction lancée par ``run_in_threadpool``.
+"""
+import io
+from typing import AsyncIterator, Optional
+
+from anyio import from_thread
+from fastapi import HTTPException, status
+
+
+async def read_prefix(chunks: AsyncIterator[bytes], size: int) -> bytes:
+    """Premiers octets du corps (détection du format), à rejouer via `prefix`"""
+    head = b""
+    async for chunk in chunks:
+        head += chunk
+        if len(head) >= size:
+            break
+    return head
+
+
+class BlockingBodyReader(io.RawIOBase):
+    """Flux binaire non positionnable sur un itérateur asynchrone de morceaux"""
+
+    def __init__(self, chunks: AsyncIterator[bytes], prefix: bytes = b"", max_bytes: Optional[int] = None):
+        self._chunks = chunks
+        self._buffer = memoryview(prefix)
+        self._error: Optional[BaseException] = None
+        self._eof = False
+        self.received = len(prefix)
+        self.max_bytes = max_bytes
+
+    def readable(self) -> bool:
+        return True
+
+    async def _next_chunk(self) -> Optional[bytes]:
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    def _fill(self):
+        if self._error is not None:
+            # Erreur déjà signalée (déconnexion, corps trop gros) : rien de plus à lire
+            raise self._error
+        try:
+            chunk = from_thread.run(self._next_chunk)
+        except BaseException as e:
+            self._error = e
+            raise
+        if chunk is None:
+            self._eof = True
+            return
+        self.received += len(chunk)
+        if self.max_bytes is not None and self.received > self.max_bytes:
+            self._error = HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Corps de requête trop volumineux (maximum {self.max_bytes} octets)"
+            )
+            raise self._error
+        self._buffer = memoryview(chunk)
+
+    def readinto(self, target) -> int:
+        while not self._buffer and not self._eof:
+            self._fill()
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
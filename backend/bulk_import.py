@@ -0,0 +1,271 @@
+"""Import d'une archive (zip ou tar) de fichiers personnels.
+
+Les membres sont lus un par un en flux et écrits directement dans le stockage
+(jamais d'archive ni de fichier entier en mémoire). Les lignes `user_files` et les
+compteurs d'usage sont insérés par lots, un commit par lot ; l'extraction de texte
+de tous les fichiers importés est faite ensuite par une seule tâche de fond.
+
+Un tar (compressé ou non) envoyé en corps brut est importé au fil de la réception
+(`import_request_body`). Un zip ne peut pas l'être : son répertoire central est à
+la fin de l'archive. Il est d'abord recopié dans un fichier temporaire, comme toute
+archive envoyée en formulaire multipart, dans la limite de `BULK_MAX_SPOOLED_SIZE`.
+"""
+import logging
+import mimetypes
+import os
+import tarfile
+import tempfile
+import zipfile
+from collections import defaultdict
+from pathlib import PurePosixPath
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+import models
+import storage_accounting
+from body_stream import BlockingBodyReader, read_prefix
+from file_storage import file_storage
+
+logger = logging.getLogger(__name__)
+
+BULK_MAX_FILES = int(os.environ.get("BULK_UPLOAD_MAX_FILES", "10000"))
+BULK_MAX_FILE_SIZE = int(os.environ.get("BULK_UPLOAD_MAX_FILE_SIZE_MB", "100")) * 1024 * 1024
+BULK_MAX_SPOOLED_SIZE = int(os.environ.get("BULK_UPLOAD_MAX_SPOOLED_SIZE_MB", "1024")) * 1024 * 1024
+BULK_BATCH_SIZE = 500
+BULK_MAX_SKIPPED_LISTED = 100  # Au-delà, seul `skipped_count` augmente
+
+ZIP_SIGNATURES = (b"PK\x03\x04", b"PK\x05\x06")
+
+# Fichiers parasites ajoutés par les outils d'archivage
+IGNORED_PARTS = {"__MACOSX", ".DS_Store", "Thumbs.db", "desktop.ini"}
+
+
+class _LimitedReader:
+    """Refuse de lire au-delà de la taille annoncée par l'archive (archives piégées)"""
+
+    def __init__(self, stream: BinaryIO, limit: int):
+        self.stream = stream
+        self.remaining = limit
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.remaining + 1
+        data = self.stream.read(min(size, self.remaining + 1))
+        self.remaining -= len(data)
+        if self.remaining < 0:
+            raise ValueError("contenu plus long que la taille annoncée")
+        return data
+
+
+def iter_archive_members(fileobj: BinaryIO) -> Iterator[Tuple[str, int, Optional[BinaryIO]]]:
+    """(chemin, taille, flux) de chaque fichier de l'archive ; flux None pour un membre non régulier.
+
+    Un flux non positionnable (corps de requête) ne peut être qu'un tar.
+    """
+    if fileobj.seekable():
+        if zipfile.is_zipfile(fileobj):
+            fileobj.seek(0)
+            with zipfile.ZipFile(fileobj) as archive:
+                for info in archive.infolist():
+                    if info.is_dir():
+                        continue
+                    with archive.open(info) as member:
+                        yield info.filename, info.file_size, member
+            return
+        fileobj.seek(0)
+
+    try:
+        # Mode flux "r|*" : lecture séquentielle, compression gzip/bz2/xz détectée
+        archive = tarfile.open(fileobj=fileobj, mode="r|*")
+    except tarfile.TarError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Archive non reconnue (formats acceptés: .zip, .tar, .tar.gz, .tgz, .tar.bz2, .tar.xz)"
+        )
+    with archive:
+        try:
+            for member in archive:
+                if member.isdir():
+                    continue
+                if not member.isfile():
+                    yield member.name, member.size, None  # Liens, périphériques...
+                    continue
+                yield member.name, member.size, archive.extractfile(member)
+        except tarfile.TarError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Archive tronquée ou invalide: {e}"
+            )
+
+
+class BulkImporter:
+    """Import d'une archive pour un utilisateur, par lots de `batch_size` lignes"""
+
+    def __init__(self, db: Session, user: models.User, storage=file_storage, batch_size: int = BULK_BATCH_SIZE):
+        self.db = db
+        self.user = user
+        self.storage = storage
+        self.batch_size = batch_size
+        self.imported: List[Dict[str, Any]] = []
+        self.skipped: List[Dict[str, str]] = []
+        self.skipped_count = 0
+        self.total_bytes = 0
+        self._batch: List[Dict[str, Any]] = []
+        self._used_names = set()
+
+    def _skip(self, name: str, reason: str):
+        self.skipped_count += 1
+        if len(self.skipped) < BULK_MAX_SKIPPED_LISTED:
+            self.skipped.append({"name": name, "reason": reason})
+
+    def _unique_name(self, name: str) -> str:
+        """Deux membres de même nom (dossiers différents) ne doivent pas s'écraser"""
+        candidate, counter = name, 1
+        path = PurePosixPath(name)
+        while candidate.lower() in self._used_names:
+            counter += 1
+            candidate = f"{path.stem}_{counter}{path.suffix}"
+        self._used_names.add(candidate.lower())
+        return candidate
+
+    def _flush(self):
+        """Insérer le lot courant (lignes + compteurs) dans une seule transaction"""
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        usage = defaultdict(lambda: [0, 0])
+        rows = []
+        for info in batch:
+            rows.append(models.UserFile(
+                filename=info["filename"],
+                original_filename=info["original_filename"],
+                file_path=info["file_path"],
+                title=info["title"],
+                client_id=self.user.client_id,
+                user_id=self.user.id,
+                file_size=info["file_size"],
+                content_hash=info["content_hash"],
+                storage_encoding=info["storage_encoding"],
+                stored_size=info["stored_size"],
+                mime_type=info["mime_type"],
+                is_public=info["is_public"],
+                tags=info["tags"]
+            ))
+            usage[info["mime_type"]][0] += 1
+            usage[info["mime_type"]][1] += info["file_size"]
+
+        self.db.add_all(rows)
+        for mime_type, (count, size) in usage.items():
+            storage_accounting.record_upload(self.db, self.user.client_id, self.user.id, mime_type, size, count=count)
+        try:
+            self.db.commit()
+        except Exception:
+            # Ne pas laisser de fichiers orphelins pour un lot non enregistré
+            self.db.rollback()
+            for info in batch:
+                self.storage.driver.delete(info["file_path"])
+            raise
+        for row, info in zip(rows, batch):
+            info["id"] = row.id
+        self.imported.extend(batch)
+
+    def run(self, fileobj: BinaryIO, tags: str = "", is_public: bool = False) -> Dict[str, Any]:
+        try:
+            self._import_members(fileobj, tags, is_public)
+        except BaseException:
+            # Archive tronquée, client déconnecté... : les lots déjà enregistrés sont conservés
+            for info in self._batch:
+                self.storage.driver.delete(info["file_path"])
+            self._batch = []
+            raise
+        self._flush()
+        logger.info(
+            f"[Bulk] User {self.user.id}: {len(self.imported)} fichiers importés "
+            f"({self.total_bytes} octets), {self.skipped_count} ignorés"
+        )
+        return {
+            "imported_count": len(self.imported),
+            "skipped_count": self.skipped_count,
+            "total_size_bytes": self.total_bytes,
+            "file_ids": [info["id"] for info in self.imported],
+            "skipped": self.skipped
+        }
+
+    def _import_members(self, fileobj: BinaryIO, tags: str, is_public: bool):
+        remaining_quota = storage_accounting.get_remaining_quota(self.db, self.user.client_id, self.user.id)
+        count = 0
+
+        for name, size, stream in iter_archive_members(fileobj):
+            path = PurePosixPath(name.replace("\\", "/"))
+            if any(part in IGNORED_PARTS or part.startswith("._") for part in path.parts):
+                continue
+            if stream is None:
+                self._skip(name, "membre non régulier (lien ou périphérique)")
+                continue
+            if count >= BULK_MAX_FILES:
+                self._skip(name, f"limite de {BULK_MAX_FILES} fichiers atteinte")
+                continue
+            if size > BULK_MAX_FILE_SIZE:
+                self._skip(name, "fichier trop volumineux")
+                continue
+            if remaining_quota is not None and size > remaining_quota:
+                self._skip(name, "quota de stockage dépassé")
+                continue
+            try:
+                new_file = self.storage.new_user_file_key(
+                    self.user.client_id, self.user.id, self._unique_name(path.name)
+                )
+            except HTTPException as e:
+                self._skip(name, e.detail)
+                continue
+
+            try:
+                blob = self.storage.write_user_blob(
+                    self.user.client_id, new_file["key"], _LimitedReader(stream, size), new_file["extension"]
+                )
+            except Exception as e:
+                self.storage.driver.delete(new_file["key"])
+                self._skip(name, f"lecture impossible: {e}")
+                continue
+
+            count += 1
+            self.total_bytes += blob["file_size"]
+            if remaining_quota is not None:
+                remaining_quota -= blob["file_size"]
+            self._batch.append({
+                "filename": new_file["filename"],
+                "original_filename": name,
+                "file_path": new_file["key"],
+                "title": path.stem,
+                **blob,
+                "mime_type": mimetypes.guess_type(new_file["filename"])[0] or "text/plain",
+                "is_public": is_public,
+                "tags": tags
+            })
+            if len(self._batch) >= self.batch_size:
+                self._flush()
+
+
+async def import_request_body(importer: BulkImporter, chunks, tags: str = "", is_public: bool = False) -> Dict[str, Any]:
+    """Importer une archive envoyée en corps brut : tar lu au fil de la réception, zip mis en tampon"""
+    head = await read_prefix(chunks, 4)
+    if not head.startswith(ZIP_SIGNATURES):
+        reader = BlockingBodyReader(chunks, prefix=head)
+        return await run_in_threadpool(importer.run, reader, tags, is_public)
+
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as body:
+        body.write(head)
+        received = len(head)
+        async for chunk in chunks:
+            received += len(chunk)
+            if received > BULK_MAX_SPOOLED_SIZE:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Archive zip trop volumineuse (maximum {BULK_MAX_SPOOLED_SIZE} octets, "
+                           f"envoyer un .tar.gz pour un import en flux)"
+                )
+            body.write(chunk)
+        return await run_in_threadpool(importer.run, body, tags, is_public)
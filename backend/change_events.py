@@ -0,0 +1,152 @@
+"""Bus d'invalidation entre workers : journal `change_events` relu par chaque processus.
+
+Chaque écriture ajoute, dans sa propre transaction, un événement (type, client,
+utilisateur, objet, version) : `change_tracking.touch` le fait pour toutes les
+écritures déjà suivies par les compteurs de version. Chaque worker uvicorn relit
+les événements plus récents que le dernier vu (parcours de clé primaire, vide la
+plupart du temps) :
+
+- en tâche de fond, toutes les ``CHANGE_EVENTS_POLL_SECONDS`` ;
+- à la demande, avant de servir un index RAG en cache (`poll()`), ce qui garantit
+  qu'une écriture commitée par un autre worker est vue par la requête suivante.
+
+Les abonnés (`subscribe`) reçoivent les événements par lots : cache de réponses,
+cache des API Keys, index RAG en mémoire. Les événements sont purgés après
+``CHANGE_EVENTS_RETENTION_SECONDS`` ; un worker qui démarre ne relit pas
+l'historique (ses caches sont vides).
+
+Réservé à SQLite (la base de l'application) : SQLite sérialise les écritures, les
+identifiants deviennent donc visibles dans l'ordre croissant et il suffit de suivre
+le dernier identifiant lu. Avec une base acceptant des écritures concurrentes
+(PostgreSQL...), une transaction plus lente peut commiter un identifiant inférieur
+à un identifiant déjà lu : cet événement serait perdu.
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = float(os.environ.get("CHANGE_EVENTS_POLL_SECONDS", "1"))
+RETENTION_SECONDS = int(os.environ.get("CHANGE_EVENTS_RETENTION_SECONDS", "3600"))
+PRUNE_INTERVAL_SECONDS = 600
+POLL_BATCH_SIZE = 1000
+
+# Types d'événements
+FILES = "files"          # Fichiers d'un utilisateur ajoutés, modifiés ou supprimés
+DOCUMENTS = "documents"  # Documents d'un client
+STORAGE = "storage"      # Compteurs de stockage recalculés
+API_KEY = "api_key"      # API Key désactivée
+DATA = "data"            # Modification non qualifiée : tout ce qui concerne le client / l'utilisateur
+
+_COLUMNS = (
+    models.ChangeEvent.id,
+    models.ChangeEvent.kind,
+    models.ChangeEvent.client_id,
+    models.ChangeEvent.user_id,
+    models.ChangeEvent.object_id,
+    models.ChangeEvent.version,
+)
+
+
+def publish(db: Session, kind: str, client_id: int, user_id: Optional[int] = None,
+            object_id: Optional[int] = None, version: Optional[int] = None):
+    """Ajouter un événement à la transaction de l'appelant (visible des workers après son commit)"""
+    db.add(models.ChangeEvent(
+        kind=kind,
+        client_id=client_id,
+        user_id=user_id,
+        object_id=object_id,
+        version=version
+    ))
+
+
+class ChangeEventBus:
+    """Lecture des événements commités depuis le dernier appel et distribution aux abonnés"""
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        # Session dédiée : celle d'une requête verrait ses propres événements non commités
+        self.session_factory = session_factory
+        self.last_id: Optional[int] = None
+        self.delivered = 0
+        self._subscribers: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[List[Dict[str, Any]]], None]):
+        """`callback(events)` : appelé sous le verrou du bus, doit rester rapide"""
+        self._subscribers.append(callback)
+        return callback
+
+    def poll(self) -> int:
+        """Distribuer les nouveaux événements commités ; renvoie leur nombre.
+
+        Le premier appel se contente de noter la position courante du journal.
+        """
+        with self._lock:
+            db = self.session_factory()
+            try:
+                if self.last_id is None:
+                    self.last_id = db.query(func.max(models.ChangeEvent.id)).scalar() or 0
+                    return 0
+                count = 0
+                while True:
+                    # Suffisant uniquement parce que SQLite sérialise les écritures (voir en tête)
+                    rows = db.query(*_COLUMNS).filter(
+                        models.ChangeEvent.id > self.last_id
+                    ).order_by(models.ChangeEvent.id).limit(POLL_BATCH_SIZE).all()
+                    if not rows:
+                        break
+                    self.last_id = rows[-1].id
+                    self._dispatch([row._asdict() for row in rows])
+                    count += len(rows)
+                    if len(rows) < POLL_BATCH_SIZE:
+                        break
+                self.delivered += count
+                return count
+            finally:
+                db.close()
+
+    def _dispatch(self, events: List[Dict[str, Any]]):
+        for callback in self._subscribers:
+            try:
+                callback(events)
+            except Exception as e:
+                logger.error(f"[Events] Abonné {getattr(callback, '__qualname__', callback)} en échec: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"last_id": self.last_id, "delivered": self.delivered, "subscribers": len(self._subscribers)}
+
+
+bus = ChangeEventBus()
+
+
+def prune(db: Session, retention_seconds: int = RETENTION_SECONDS) -> int:
+    """Supprimer les événements plus anciens que la rétention"""
+    cutoff = datetime.utcnow() - timedelta(seconds=retention_seconds)
+    deleted = db.query(models.ChangeEvent).filter(
+        models.ChangeEvent.created_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def run_poll_job():
+    bus.poll()
+
+
+def run_prune_job():
+    db = SessionLocal()
+    try:
+        deleted = prune(db)
+        if deleted:
+            logger.info(f"[Events] {deleted} événements purgés")
+    finally:
+        db.close()
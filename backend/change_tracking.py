@@ -0,0 +1,174 @@
+"""Versions des données par utilisateur / client, ETag faibles et cache de réponses.
+
+Chaque écriture (fichiers, documents, compteurs de stockage) incrémente, dans sa
+transaction, la version de l'utilisateur et/ou du client concernés
+(`models.ChangeCounter`). Les listes et statistiques calculent leur ETag à partir
+de ces versions : une requête avec `If-None-Match` à jour reçoit `304` sans
+exécuter la requête de liste, et les autres sont servies depuis un cache en
+mémoire indexé par (client, utilisateur, endpoint, paramètres, versions).
+
+Chaque incrément publie aussi un événement (`change_events`) : les autres workers
+retirent de leurs caches les entrées du client concerné.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import and_, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import change_events
+import metrics
+import models
+
+USER_SCOPE = "user"
+CLIENT_SCOPE = "client"
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_MB", "64")) * 1024 * 1024
+
+# Change quand le format des réponses change (nouvelle version des schémas) : ETag invalidés au déploiement
+_REVISION = hashlib.sha1(b"".join(
+    (Path(__file__).parent / name).read_bytes() for name in ("schemas.py", "projection.py")
+)).hexdigest()[:8]
+
+
+def _bump(db: Session, scope: str, scope_id: int) -> int:
+    """Incrémenter un compteur et renvoyer sa nouvelle version"""
+    statement = update(models.ChangeCounter).where(
+        models.ChangeCounter.scope == scope, models.ChangeCounter.scope_id == scope_id
+    ).values(version=models.ChangeCounter.version + 1).returning(models.ChangeCounter.version)
+    options = {"synchronize_session": False}
+    version = db.execute(statement, execution_options=options).scalar()
+    if version is not None:
+        return version
+    try:
+        with db.begin_nested():
+            db.add(models.ChangeCounter(scope=scope, scope_id=scope_id, version=1))
+        return 1
+    except IntegrityError:
+        # Compteur créé entre-temps par une autre requête
+        return db.execute(statement, execution_options=options).scalar()
+
+
+def touch(db: Session, client_id: int, user_id: Optional[int] = None, kind: str = change_events.DATA,
+          object_id: Optional[int] = None):
+    """Signaler une modification (commitée avec la transaction de l'appelant) et la publier aux workers"""
+    version = _bump(db, CLIENT_SCOPE, client_id)
+    if user_id:
+        version = _bump(db, USER_SCOPE, user_id)
+    change_events.publish(db, kind, client_id, user_id, object_id=object_id, version=version)
+
+
+def get_versions(db: Session, user: models.User, scopes: Sequence[str]) -> Tuple[int, ...]:
+    """Versions courantes des scopes demandés (une seule requête indexée)"""
+    wanted = [(scope, user.id if scope == USER_SCOPE else user.client_id) for scope in scopes]
+    rows = db.query(
+        models.ChangeCounter.scope, models.ChangeCounter.scope_id, models.ChangeCounter.version
+    ).filter(or_(*(
+        and_(models.ChangeCounter.scope == scope, models.ChangeCounter.scope_id == scope_id)
+        for scope, scope_id in wanted
+    ))).all()
+    versions = {(scope, scope_id): version for scope, scope_id, version in rows}
+    return tuple(versions.get(item, 0) for item in wanted)
+
+
+class ResponseCache:
+    """Cache LRU des corps de réponse, borné en nombre d'entrées et en octets"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, Tuple[bytes, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        metrics.record_cache("responses", entry is not None)
+        return entry
+
+    def set(self, key: Tuple, body: bytes, media_type: str):
+        if not self.max_entries or len(body) > self.max_bytes // 10:
+            return  # Réponses trop volumineuses : pas mises en cache
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[0])
+            self._entries[key] = (body, media_type)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def evict_clients(self, client_ids):
+        """Retirer les entrées des clients modifiés (plus jamais servies : leurs versions ont changé)"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in client_ids]:
+                self._bytes -= len(self._entries.pop(key)[0])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+response_cache = ResponseCache()
+
+
+@change_events.bus.subscribe
+def _evict_changed_clients(events):
+    response_cache.evict_clients({event["client_id"] for event in events if event["kind"] != change_events.API_KEY})
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Comparaison faible : le préfixe W/ est ignoré
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def cached_response(request: Request, db: Session, user: models.User, scopes: Sequence[str],
+                    build: Callable[[], Response]) -> Response:
+    """Réponse d'une liste / statistique avec ETag faible, 304 et cache serveur
+
+    `build` n'est appelé que si la réponse n'est ni à jour chez le client ni en cache ;
+    il doit renvoyer une `Response` déjà sérialisée (voir json_responses.model_response).
+    """
+    versions = get_versions(db, user, scopes)
+    key = (user.client_id, user.id, request.url.path, tuple(sorted(request.query_params.multi_items())), versions)
+    etag = 'W/"' + hashlib.sha1(repr((_REVISION, key)).encode("utf-8")).hexdigest()[:24] + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    cached = response_cache.get(key)
+    if cached is None:
+        response = build()
+        if response.status_code != 200:
+            return response
+        cached = (response.body, response.media_type)
+        response_cache.set(key, *cached)
+    body, media_type = cached
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,326 @@
+"""Import / export en masse de la table `documents` (NDJSON ou tableau JSON).
+
+L'import lit le corps en flux (une ligne NDJSON ou un élément de tableau à la fois),
+valide chaque document et l'insère par lots (``INSERT ... RETURNING`` multi-lignes),
+un commit par lot. Le résultat est donné ligne par ligne (identifiant créé ou erreur).
+L'export relit la table par pagination sur l'id et n'est jamais chargé en mémoire.
+
+Utilisable aussi en ligne de commande, par exemple pour les fichiers de `data/` :
+
+    python document_transfer.py import ../data/client_a_documents.json --user-email admin@client-a.com
+    python document_transfer.py export --client-id 1 > client_1.ndjson
+"""
+import argparse
+import codecs
+import json
+import logging
+import re
+import sys
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+import change_events
+import change_tracking
+import models
+import schemas
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 10000
+CHUNK_SIZE = 64 * 1024
+
+EXPORT_FIELDS = ("id", "title", "content", "user_id", "created_at", "updated_at")
+
+# Fin de tampon au milieu d'un nombre ou d'un littéral (``1.``, ``-``, ``tr``...)
+_TRUNCATED_TOKEN = re.compile(r"[-+.0-9eE]*|t(r(ue?)?)?|f(a(l(se?)?)?)?|n(u(ll?)?)?")
+
+
+class _TextChunks:
+    """Lecture d'un flux binaire UTF-8 (BOM toléré) par morceaux de texte"""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.eof = False
+
+    def read(self) -> str:
+        data = self.stream.read(CHUNK_SIZE)
+        if not data:
+            self.eof = True
+            return self.decoder.decode(b"", final=True)
+        return self.decoder.decode(data)
+
+
+def _iter_ndjson(chunks: _TextChunks, buffer: str) -> Iterator[Tuple[int, Any, Optional[str]]]:
+    line_number = 0
+    while True:
+        lines = buffer.split("\n")
+        buffer = lines.pop()  # Ligne incomplète, complétée au morceau suivant
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield _decode_line(line_number, line)
+        if chunks.eof:
+            break
+        buffer += chunks.read()
+    if buffer.strip():
+        yield _decode_line(line_number + 1, buffer)
+
+
+def _decode_line(line_number: int, line: str) -> Tuple[int, Any, Optional[str]]:
+    try:
+        return line_number, json.loads(line), None
+    except json.JSONDecodeError as e:
+        return line_number, None, f"JSON invalide: {e.msg} (colonne {e.colno})"
+
+
+def _needs_more_data(buffer: str, error: json.JSONDecodeError) -> bool:
+    """L'erreur vient-elle seulement de la coupure du tampon (et non d'un JSON invalide) ?"""
+    if error.msg.startswith("Unterminated string"):
+        return True  # La chaîne court jusqu'à la fin du tampon
+    tail = buffer[error.pos:]
+    if error.msg.startswith("Invalid \\uXXXX escape"):
+        return len(tail) <= len("uXXXX\\uXXXX")  # Échappement (ou paire de substitution) coupé
+    return _TRUNCATED_TOKEN.fullmatch(tail) is not None
+
+
+def _iter_json_array(chunks: _TextChunks, buffer: str) -> Iterator[Tuple[int, Any, Optional[str]]]:
+    decoder = json.JSONDecoder()
+    pos = buffer.index("[") + 1
+    index = 0
+    expect_value = True
+
+    def skip_whitespace():
+        nonlocal buffer, pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or chunks.eof:
+                return
+            buffer, pos = chunks.read(), 0
+
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError(f"tableau JSON incomplet après l'élément {index}")
+        char = buffer[pos]
+        if char == "]":
+            return
+        if not expect_value:
+            if char != ",":
+                raise ValueError(f"',' ou ']' attendu après l'élément {index}")
+            pos += 1
+            expect_value = True
+            continue
+
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+            # Un nombre peut continuer au morceau suivant
+            complete = chunks.eof or _TRUNCATED_TOKEN.fullmatch(buffer, end) is None
+        except json.JSONDecodeError as e:
+            # Erreur au milieu des données déjà reçues : inutile de lire la suite du corps
+            if chunks.eof or not _needs_more_data(buffer, e):
+                raise ValueError(f"JSON invalide à l'élément {index + 1}: {e.msg}")
+            complete = False
+        if not complete:
+            if pos > CHUNK_SIZE:
+                buffer, pos = buffer[pos:], 0
+            buffer += chunks.read()
+            continue
+
+        index += 1
+        pos = end
+        expect_value = False
+        yield index, value, None
+
+
+def iter_json_records(stream: BinaryIO) -> Iterator[Tuple[int, Any, Optional[str]]]:
+    """(numéro de ligne ou rang dans le tableau, objet décodé, erreur) de chaque enregistrement
+
+    Un tableau JSON mal formé lève ValueError (impossible de resynchroniser) ;
+    une ligne NDJSON invalide ne concerne qu'elle-même.
+    """
+    chunks = _TextChunks(stream)
+    buffer = ""
+    while not buffer.strip() and not chunks.eof:
+        buffer += chunks.read()
+    if buffer.lstrip().startswith("["):
+        yield from _iter_json_array(chunks, buffer)
+    else:
+        yield from _iter_ndjson(chunks, buffer)
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'document'}: {e['msg']}" for e in error.errors()
+    )
+
+
+class DocumentImporter:
+    """Import de documents pour le client d'un utilisateur, par lots de `batch_size` lignes"""
+
+    def __init__(self, db: Session, user: models.User, batch_size: int = DOCUMENT_BATCH_SIZE,
+                 report_errors_only: bool = False):
+        self.db = db
+        self.user = user
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        self.report_errors_only = report_errors_only
+        self.results: List[Dict[str, Any]] = []
+        self.created_count = 0
+        self.error_count = 0
+        self._batch: List[Tuple[int, Dict[str, Any]]] = []
+
+    def _error(self, line: int, message: str):
+        self.error_count += 1
+        self.results.append({"line": line, "id": None, "error": message})
+
+    def _flush(self):
+        """Insérer le lot courant en une requête multi-lignes et un commit"""
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        statement = insert(models.Document).returning(models.Document.id, sort_by_parameter_order=True)
+        try:
+            ids = self.db.execute(statement, [row for _, row in batch]).scalars().all()
+            change_tracking.touch(self.db, self.user.client_id, kind=change_events.DOCUMENTS)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"[Documents] Échec d'insertion d'un lot de {len(batch)}: {e}")
+            for line, _ in batch:
+                self._error(line, "erreur d'insertion en base")
+            return
+        self.created_count += len(ids)
+        if not self.report_errors_only:
+            self.results.extend({"line": line, "id": doc_id, "error": None} for (line, _), doc_id in zip(batch, ids))
+
+    def run(self, stream: BinaryIO) -> Dict[str, Any]:
+        aborted = None
+        now = datetime.utcnow()
+        try:
+            for line, record, error in iter_json_records(stream):
+                if error is None and not isinstance(record, dict):
+                    error = "un objet JSON est attendu"
+                if error is None:
+                    try:
+                        document = schemas.DocumentImport(**record)
+                    except ValidationError as e:
+                        error = _validation_message(e)
+                if error is not None:
+                    self._error(line, error)
+                    continue
+                self._batch.append((line, {
+                    "title": document.title,
+                    "content": document.content,
+                    "client_id": self.user.client_id,
+                    "user_id": self.user.id,
+                    "created_at": document.created_at or now,
+                    "updated_at": document.updated_at or document.created_at or now
+                }))
+                if len(self._batch) >= self.batch_size:
+                    self._flush()
+        except ValueError as e:
+            aborted = str(e)
+        self._flush()
+
+        logger.info(
+            f"[Documents] Client {self.user.client_id}: {self.created_count} documents importés, "
+            f"{self.error_count} en erreur" + (f", import interrompu ({aborted})" if aborted else "")
+        )
+        return {
+            "created_count": self.created_count,
+            "error_count": self.error_count,
+            "aborted": aborted,
+            "results": sorted(self.results, key=lambda r: r["line"])
+        }
+
+
+def _export_record(document: models.Document) -> Dict[str, Any]:
+    record = {field: getattr(document, field) for field in EXPORT_FIELDS}
+    for field in ("created_at", "updated_at"):
+        if record[field] is not None:
+            record[field] = record[field].isoformat()
+    return record
+
+
+def iter_export(client_id: int, updated_after: Optional[datetime] = None, as_array: bool = False,
+                batch_size: int = DOCUMENT_BATCH_SIZE) -> Iterator[bytes]:
+    """Documents d'un client en NDJSON (ou tableau JSON), par pages sur l'id
+
+    Utilise sa propre session : la réponse est envoyée après la fin de la requête.
+    """
+    db = SessionLocal()
+    try:
+        last_id = 0
+        first = True
+        if as_array:
+            yield b"["
+        while True:
+            query = db.query(models.Document).filter(
+                models.Document.client_id == client_id,
+                models.Document.id > last_id
+            )
+            if updated_after is not None:
+                query = query.filter(models.Document.updated_at >= updated_after)
+            page = query.order_by(models.Document.id).limit(batch_size).all()
+            if not page:
+                break
+            lines = [json.dumps(_export_record(document), ensure_ascii=False) for document in page]
+            if as_array:
+                yield (("" if first else ",") + ",".join(lines)).encode("utf-8")
+            else:
+                yield ("\n".join(lines) + "\n").encode("utf-8")
+            first = False
+            last_id = page[-1].id
+            db.expunge_all()
+        if as_array:
+            yield b"]"
+    finally:
+        db.close()
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Import / export en masse des documents")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Importer un fichier NDJSON ou un tableau JSON")
+    import_parser.add_argument("path", help="Fichier à importer (- pour l'entrée standard)")
+    import_parser.add_argument("--user-email", required=True, help="Propriétaire des documents (et donc client)")
+    import_parser.add_argument("--batch-size", type=int, default=DOCUMENT_BATCH_SIZE)
+
+    export_parser = subparsers.add_parser("export", help="Exporter les documents d'un client en NDJSON")
+    export_parser.add_argument("--client-id", type=int, required=True)
+    export_parser.add_argument("--json-array", action="store_true", help="Tableau JSON au lieu de NDJSON")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        for chunk in iter_export(args.client_id, as_array=args.json_array):
+            sys.stdout.buffer.write(chunk)
+        return None
+
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.email == args.user_email).first()
+        if user is None:
+            parser.error(f"Utilisateur inconnu: {args.user_email}")
+        importer = DocumentImporter(db, user, batch_size=args.batch_size, report_errors_only=True)
+        if args.path == "-":
+            result = importer.run(sys.stdin.buffer)
+        else:
+            with open(args.path, "rb") as f:
+                result = importer.run(f)
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return result
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,54 @@
+from typing import List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, Query
+
+import models
+
+
+class PublicFileCatalog:
+    """Catalogue des fichiers publics d'un client, servi depuis `user_files`.
+
+    Toutes les requêtes passent par l'index (client_id, is_public, created_at) :
+    aucun parcours du système de fichiers sur les chemins de requête.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _base_query(self, client_id: int, exclude_user_id: Optional[int] = None, tag: Optional[str] = None) -> Query:
+        query = self.db.query(models.UserFile).filter(
+            models.UserFile.client_id == client_id,
+            models.UserFile.is_public == True
+        )
+        if exclude_user_id is not None:
+            query = query.filter(models.UserFile.user_id != exclude_user_id)
+        if tag:
+            query = query.filter(models.UserFile.tags.contains(tag))
+        return query
+
+    def list(self, client_id: int, skip: int = 0, limit: int = 100,
+             exclude_user_id: Optional[int] = None, tag: Optional[str] = None) -> List[models.UserFile]:
+        """Lister les fichiers publics, du plus récent au plus ancien"""
+        return self._base_query(client_id, exclude_user_id, tag).order_by(
+            models.UserFile.created_at.desc(),
+            models.UserFile.id.desc()
+        ).offset(skip).limit(limit).all()
+
+    def count(self, client_id: int, exclude_user_id: Optional[int] = None, tag: Optional[str] = None) -> int:
+        """Compter les fichiers publics"""
+        return self._base_query(client_id, exclude_user_id, tag).count()
+
+    def search(self, client_id: int, query: str, skip: int = 0, limit: int = 100,
+               exclude_user_id: Optional[int] = None) -> List[models.UserFile]:
+        """Rechercher dans le titre, le nom de fichier et les tags des fichiers publics"""
+        return self._base_query(client_id, exclude_user_id).filter(
+            or_(
+                models.UserFile.title.contains(query),
+                models.UserFile.original_filename.contains(query),
+                models.UserFile.tags.contains(query)
+            )
+        ).order_by(
+            models.UserFile.created_at.desc(),
+            models.UserFile.id.desc()
+        ).offset(skip).limit(limit).all()
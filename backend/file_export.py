@@ -0,0 +1,321 @@
+"""Export zip en flux des fichiers d'un utilisateur.
+
+L'archive est produite à la volée (mémoire constante, aucun fichier temporaire) par
+un écrivain zip minimal et déterministe : pour une même sélection, les mêmes octets
+sont produits, ce qui permet la reprise d'un téléchargement interrompu (en-tête
+Range). Les formats déjà compressés (PDF, DOCX...) sont stockés tels quels ; les
+autres sont compressés (deflate). Chaque entrée utilise un descripteur de données
+(CRC et tailles après le contenu) et ZIP64 au-delà de 4 Go.
+
+La position de chaque entrée dépend de la taille compressée des entrées précédentes
+et le répertoire central contient le CRC de toutes les entrées : ces valeurs sont
+mémorisées (par clé, taille et date du blob) pendant la génération, et recalculées
+si besoin pour servir une plage.
+"""
+import hashlib
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import PurePosixPath
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Formats déjà compressés : entrées "stored", sans recompression
+STORED_EXTENSIONS = {
+    ".pdf", ".docx", ".xlsx", ".pptx", ".odt", ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst",
+    ".7z", ".rar", ".jpg", ".jpeg", ".png", ".gif", ".webp", ".mp3", ".mp4",
+}
+
+EXPORT_FORMAT_VERSION = "1"
+DEFLATE_LEVEL = 6
+CHUNK_SIZE = 64 * 1024
+ZIP64_LIMIT = 0xFFFFFFFF
+# Marge pour l'expansion possible du deflate sur des données incompressibles
+ZIP64_ENTRY_THRESHOLD = ZIP64_LIMIT - (1 << 24)
+
+METHOD_STORED = 0
+METHOD_DEFLATED = 8
+FLAGS = 0x08 | 0x800  # Descripteur de données + noms UTF-8
+
+
+class _EntryInfoCache:
+    """(CRC, taille compressée) par contenu, pour calculer les plages sans relire les blobs"""
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._items: "OrderedDict[Tuple, Tuple[int, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[Tuple[int, int]]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key: Tuple, value: Tuple[int, int]):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+
+entry_info_cache = _EntryInfoCache()
+
+
+class ZipEntry:
+    def __init__(self, name: str, size: int, modified_at: datetime, method: int,
+                 open_chunks: Callable[[], Iterator[bytes]], cache_key: Tuple):
+        self.name = name
+        self.encoded_name = name.encode("utf-8")
+        self.size = size
+        self.modified_at = modified_at
+        self.method = method
+        self.open_chunks = open_chunks
+        self.cache_key = cache_key + (method, DEFLATE_LEVEL)
+        self.zip64 = size >= ZIP64_ENTRY_THRESHOLD
+
+    def dos_datetime(self) -> Tuple[int, int]:
+        dt = self.modified_at if self.modified_at and self.modified_at.year >= 1980 else datetime(1980, 1, 1)
+        return (
+            (dt.hour << 11) | (dt.minute << 5) | (dt.second // 2),
+            ((dt.year - 1980) << 9) | (dt.month << 5) | dt.day
+        )
+
+    def iter_data(self, info: Optional[Dict[str, int]] = None) -> Iterator[bytes]:
+        """Contenu (compressé ou non) de l'entrée ; renseigne `info` (crc, csize) à la fin"""
+        crc, csize = 0, 0
+        compressor = zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -15) if self.method == METHOD_DEFLATED else None
+        for chunk in self.open_chunks():
+            crc = zlib.crc32(chunk, crc)
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                csize += len(chunk)
+                yield chunk
+        if compressor is not None:
+            chunk = compressor.flush()
+            csize += len(chunk)
+            yield chunk
+        entry_info_cache.set(self.cache_key, (crc, csize))
+        if info is not None:
+            info.update(crc=crc, csize=csize)
+
+    def local_header(self) -> bytes:
+        time, date = self.dos_datetime()
+        extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0) if self.zip64 else b""
+        sizes = ZIP64_LIMIT if self.zip64 else 0
+        return struct.pack(
+            "<IHHHHHIIIHH", 0x04034b50, 45 if self.zip64 else 20, FLAGS, self.method,
+            time, date, 0, sizes, sizes, len(self.encoded_name), len(extra)
+        ) + self.encoded_name + extra
+
+    def descriptor(self, crc: int, csize: int) -> bytes:
+        if self.zip64:
+            return struct.pack("<IIQQ", 0x08074b50, crc, csize, self.size)
+        return struct.pack("<IIII", 0x08074b50, crc, csize, self.size)
+
+    def descriptor_size(self) -> int:
+        return 24 if self.zip64 else 16
+
+    def central_header(self, offset: int, crc: int, csize: int) -> bytes:
+        time, date = self.dos_datetime()
+        zip64 = self.zip64 or offset >= ZIP64_LIMIT
+        if zip64:
+            extra = struct.pack("<HHQQQ", 0x0001, 24, self.size, csize, offset)
+            csize_field = size_field = offset_field = ZIP64_LIMIT
+        else:
+            extra = b""
+            csize_field, size_field, offset_field = csize, self.size, offset
+        return struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014b50, (3 << 8) | 45, 45 if zip64 else 20, FLAGS, self.method,
+            time, date, crc, csize_field, size_field, len(self.encoded_name), len(extra), 0, 0, 0,
+            0o100644 << 16, offset_field
+        ) + self.encoded_name + extra
+
+
+def _end_records(entry_count: int, cd_offset: int, cd_size: int) -> bytes:
+    records = b""
+    if entry_count >= 0xFFFF or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+        zip64_end_offset = cd_offset + cd_size
+        records += struct.pack(
+            "<IQHHIIQQQQ", 0x06064b50, 44, (3 << 8) | 45, 45, 0, 0,
+            entry_count, entry_count, cd_size, cd_offset
+        )
+        records += struct.pack("<IIQI", 0x07064b50, 0, zip64_end_offset, 1)
+        return records + struct.pack(
+            "<IHHHHIIH", 0x06054b50, 0, 0, 0xFFFF, 0xFFFF, ZIP64_LIMIT, ZIP64_LIMIT, 0
+        )
+    return struct.pack("<IHHHHIIH", 0x06054b50, 0, 0, entry_count, entry_count, cd_size, cd_offset, 0)
+
+
+class ZipExportStream:
+    """Archive zip déterministe d'une liste d'entrées, en flux complet ou par plage"""
+
+    def __init__(self, entries: List[ZipEntry]):
+        self.entries = entries
+
+    @property
+    def etag(self) -> str:
+        digest = hashlib.sha256(EXPORT_FORMAT_VERSION.encode())
+        for entry in self.entries:
+            digest.update(repr((entry.name, entry.modified_at, entry.cache_key)).encode("utf-8"))
+        return f'"{digest.hexdigest()[:32]}"'
+
+    def _central_directory(self, infos: List[Tuple[int, int, int]]) -> bytes:
+        """Répertoire central + fin d'archive ; `infos` = [(offset, crc, csize)]"""
+        cd = b"".join(entry.central_header(*info) for entry, info in zip(self.entries, infos))
+        return cd + _end_records(len(self.entries), self._cd_offset(infos), len(cd))
+
+    @staticmethod
+    def _entry_length(entry: ZipEntry, csize: int) -> int:
+        return len(entry.local_header()) + csize + entry.descriptor_size()
+
+    def __iter__(self) -> Iterator[bytes]:
+        """Archive complète (tailles découvertes au fil de la compression)"""
+        offset = 0
+        infos = []
+        for entry in self.entries:
+            header = entry.local_header()
+            yield header
+            info: Dict[str, int] = {}
+            yield from entry.iter_data(info)
+            yield entry.descriptor(info["crc"], info["csize"])
+            infos.append((offset, info["crc"], info["csize"]))
+            offset += len(header) + info["csize"] + entry.descriptor_size()
+        yield self._central_directory(infos)
+
+    def _layout_infos(self, compute: bool = True) -> Optional[List[Tuple[int, int, int]]]:
+        """[(offset, crc, csize)] de chaque entrée ; relit les blobs absents du cache si `compute`.
+
+        Sans `compute`, retourne None si une taille compressée est inconnue (le CRC
+        n'influe pas sur les longueurs : 0 est utilisé à sa place).
+        """
+        infos, offset = [], 0
+        for entry in self.entries:
+            cached = entry_info_cache.get(entry.cache_key)
+            if cached is None:
+                if compute:
+                    info: Dict[str, int] = {}
+                    for _ in entry.iter_data(info):
+                        pass
+                    cached = (info["crc"], info["csize"])
+                elif entry.method == METHOD_STORED:
+                    cached = (0, entry.size)
+                else:
+                    return None
+            infos.append((offset, cached[0], cached[1]))
+            offset += self._entry_length(entry, cached[1])
+        return infos
+
+    def _total_size(self, infos: List[Tuple[int, int, int]]) -> int:
+        return self._cd_offset(infos) + len(self._central_directory(infos))
+
+    def _cd_offset(self, infos: List[Tuple[int, int, int]]) -> int:
+        return infos[-1][0] + self._entry_length(self.entries[-1], infos[-1][2]) if infos else 0
+
+    def known_size(self) -> Optional[int]:
+        """Taille totale si elle est calculable sans lire les blobs (None sinon)"""
+        infos = self._layout_infos(compute=False)
+        return None if infos is None else self._total_size(infos)
+
+    def layout(self) -> Tuple[List[Tuple[int, int, int]], int]:
+        """Positions, CRC et tailles de toutes les entrées, et taille totale de l'archive"""
+        infos = self._layout_infos()
+        return infos, self._total_size(infos)
+
+    def iter_range(self, start: int, end: int, infos: List[Tuple[int, int, int]]) -> Iterator[bytes]:
+        """Octets [start, end] (inclus) ; seules les entrées touchées par la plage sont relues"""
+        def segments():
+            for entry, (offset, crc, csize) in zip(self.entries, infos):
+                header = entry.local_header()
+                yield offset, len(header), lambda h=header: iter((h,))
+                yield offset + len(header), csize, lambda e=entry: e.iter_data()
+                yield offset + len(header) + csize, entry.descriptor_size(), \
+                    lambda e=entry, c=crc, s=csize: iter((e.descriptor(c, s),))
+            cd = self._central_directory(infos)
+            yield self._cd_offset(infos), len(cd), lambda: iter((cd,))
+
+        for seg_start, seg_length, produce in segments():
+            seg_end = seg_start + seg_length - 1
+            if seg_end < start or seg_length == 0:
+                continue
+            if seg_start > end:
+                break
+            position = seg_start
+            for chunk in produce():
+                chunk_end = position + len(chunk) - 1
+                if chunk_end >= start and position <= end:
+                    yield chunk[max(0, start - position):min(len(chunk), end - position + 1)]
+                position += len(chunk)
+                if position > end:
+                    return
+
+
+def unique_entry_names(names: List[str]) -> List[str]:
+    """Noms d'entrée sûrs (relatifs, sans '..') et uniques, dans l'ordre donné"""
+    used = set()
+    result = []
+    for name in names:
+        parts = [p for p in PurePosixPath(name.replace("\\", "/")).parts if p not in ("", ".", "..", "/")]
+        candidate = "/".join(parts) or "fichier"
+        path = PurePosixPath(candidate)
+        counter = 1
+        while candidate.lower() in used:
+            counter += 1
+            candidate = str(path.with_name(f"{path.stem}_{counter}{path.suffix}"))
+        used.add(candidate.lower())
+        result.append(candidate)
+    return result
+
+
+def build_export(storage, files: List[Any]) -> ZipExportStream:
+    """Archive des `UserFile` donnés (les fichiers dont le blob a disparu sont ignorés)"""
+    blobs = []
+    for meta in files:
+        blob = storage.stat_user_file(meta.file_path)
+        if blob is not None:
+            blobs.append((meta, blob))
+
+    names = unique_entry_names([meta.original_filename or meta.filename for meta, _ in blobs])
+    entries = []
+    for name, (meta, blob) in zip(names, blobs):
+        method = METHOD_STORED if PurePosixPath(name).suffix.lower() in STORED_EXTENSIONS else METHOD_DEFLATED
+        modified = blob["modified_at"]
+        # Blob compressé au repos : l'archive contient le contenu logique (décompressé à la volée)
+        encoding = getattr(meta, "storage_encoding", None)
+        size = meta.file_size if encoding else blob["size"]
+        entries.append(ZipEntry(
+            name=name,
+            size=size,
+            modified_at=(meta.created_at or modified).replace(tzinfo=None),
+            method=method,
+            open_chunks=lambda key=blob["key"], encoding=encoding: storage.iter_blob_chunks(
+                key, encoding, chunk_size=CHUNK_SIZE
+            ),
+            cache_key=(blob["key"], blob["size"], str(modified))
+        ))
+    return ZipExportStream(entries)
+
+
+def parse_range(header: str, total: int) -> Optional[Tuple[int, int]]:
+    """Première plage d'un en-tête `Range: bytes=...` ; None si invalide ou non satisfiable"""
+    if not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].split(",")[0].strip()
+    first, _, last = spec.partition("-")
+    try:
+        if first == "":
+            length = int(last)
+            if length <= 0:
+                return None
+            return max(0, total - length), total - 1
+        start = int(first)
+        end = int(last) if last else total - 1
+    except ValueError:
+        return None
+    if start >= total or end < start:
+        return None
+    return start, min(end, total - 1)
@@ -1,54 +1,124 @@
 import os
-import shutil
 from pathlib import Path
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 import mimetypes
 from fastapi import UploadFile, HTTPException, status
+from sqlalchemy.orm import Session
+
+import metrics
+from blob_compression import BlobCodec
+from file_catalog import PublicFileCatalog
+from storage_drivers import StorageDriver, LocalStorageDriver, create_driver
+from text_extraction import PLAIN_TEXT_EXTENSIONS, TextExtractionService, decode_text
+
+# URL du backend de stockage (voir storage_drivers.create_driver) ; l'arborescence
+# répartie lit aussi les fichiers encore à plat (migration : migrate_storage.py --reshard)
+STORAGE_URL = os.environ.get("STORAGE_URL", "sharded:./user_files")
+
+ALLOWED_EXTENSIONS = ['.txt', '.pdf', '.doc', '.docx', '.md']
 
 class FileStorageManager:
-    """Gestionnaire de stockage de fichiers pour chaque utilisateur"""
+    """Gestionnaire de stockage de fichiers pour chaque utilisateur
     
-    def __init__(self, base_storage_path: str = "./user_files"):
-        self.base_storage_path = Path(base_storage_path)
-        self.base_storage_path.mkdir(exist_ok=True)
+    Les fichiers sont écrits via un driver (local, réparti, mémoire, S3) et
+    adressés par une clé logique `client_<id>/user_<id>/<nom>`, stockée dans
+    `UserFile.file_path`.
+    """
+    
+    def __init__(self, base_storage_path: str = "./user_files", driver: Optional[StorageDriver] = None):
+        self.driver = driver or LocalStorageDriver(base_storage_path)
+        self.base_storage_path = Path(getattr(self.driver, "root", base_storage_path))
+        # Texte extrait des PDF/DOCX/..., mis en cache par hash de contenu
+        self.extractor = TextExtractionService(self.driver)
+        # Compression au repos des fichiers texte (STORAGE_COMPRESSION)
+        self.codec = BlobCodec(self.driver)
+        # Préfixes des anciens `file_path` (chemins locaux complets)
+        self._legacy_roots = []
+        for root in (str(self.base_storage_path), os.path.abspath(self.base_storage_path), "user_files"):
+            root = root.replace("\\", "/").rstrip("/") + "/"
+            if root not in self._legacy_roots:
+                self._legacy_roots.append(root)
         
+    def get_user_prefix(self, client_id: int, user_id: int) -> str:
+        """Préfixe des clés de stockage d'un utilisateur"""
+        return f"client_{client_id}/user_{user_id}/"
+    
     def get_user_storage_path(self, client_id: int, user_id: int) -> Path:
-        """Obtenir le chemin de stockage pour un utilisateur spécifique"""
-        user_path = self.base_storage_path / f"client_{client_id}" / f"user_{user_id}"
-        user_path.mkdir(parents=True, exist_ok=True)
-        return user_path
+        """Obtenir le chemin de stockage pour un utilisateur spécifique (créé à la première écriture)"""
+        return self.base_storage_path / f"client_{client_id}" / f"user_{user_id}"
     
-    def save_user_file(self, client_id: int, user_id: int, file: UploadFile, title: str = None, tags: str = "") -> Dict[str, Any]:
-        """Sauvegarder un fichier pour un utilisateur spécifique"""
+    def describe_user_location(self, client_id: int, user_id: int) -> str:
+        """Emplacement lisible du stockage d'un utilisateur (chemin local ou URL)"""
+        return self.driver.describe(self.get_user_prefix(client_id, user_id))
+    
+    def resolve_key(self, file_path: str) -> str:
+        """Convertir un `UserFile.file_path` en clé de stockage
+        
+        Les anciennes lignes contiennent un chemin local (`user_files/client_1/...`,
+        parfois avec des séparateurs Windows).
+        """
+        path = file_path.replace("\\", "/")
+        if path.startswith("./"):
+            path = path[2:]
+        for root in self._legacy_roots:
+            if path.startswith(root):
+                return path[len(root):]
+        return path
+    
+    def stat_user_file(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """Taille et date du blob référencé par un `UserFile.file_path` (None si absent)"""
+        if not file_path:
+            return None
+        return self.driver.stat(self.resolve_key(file_path))
+    
+    def new_user_file_key(self, client_id: int, user_id: int, filename: str) -> Dict[str, str]:
+        """Valider l'extension et générer le nom unique et la clé d'un nouveau fichier"""
         # Valider le type de fichier
-        allowed_extensions = ['.txt', '.pdf', '.doc', '.docx', '.md']
-        file_ext = Path(file.filename).suffix.lower()
+        file_ext = Path(filename).suffix.lower()
         
-        if file_ext not in allowed_extensions:
+        if file_ext not in ALLOWED_EXTENSIONS:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Seuls les fichiers {', '.join(allowed_extensions)} sont autorisés"
+                detail=f"Seuls les fichiers {', '.join(ALLOWED_EXTENSIONS)} sont autorisés"
             )
         
-        # Obtenir le chemin utilisateur
-        user_path = self.get_user_storage_path(client_id, user_id)
-        
-        # Générer un nom de fichier unique
+        # Générer un nom de fichier unique (sans composant de chemin venant du client)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_filename = f"{timestamp}_{file.filename.replace(' ', '_')}"
-        file_path = user_path / safe_filename
+        safe_filename = f"{timestamp}_{Path(filename.replace(chr(92), '/')).name.replace(' ', '_')}"
+        return {
+            "filename": safe_filename,
+            "extension": file_ext,
+            "key": self.get_user_prefix(client_id, user_id) + safe_filename
+        }
+    
+    def write_user_blob(self, client_id: int, key: str, stream, extension: str) -> Dict[str, Any]:
+        """Écrire un blob (compressé si activé pour ce type) ; hash et taille portent sur le contenu logique"""
+        reader = self.extractor.hashing_reader(stream)
+        encoding = self.codec.choose_encoding(client_id, extension)
+        body = self.codec.compressing_reader(reader, encoding) if encoding else reader
+        stored_size = self.driver.put(key, body)
+        metrics.record_storage("write", stored_size)
+        return {
+            "file_size": reader.size,
+            "stored_size": stored_size,
+            "storage_encoding": encoding,
+            "content_hash": reader.hexdigest()
+        }
+    
+    def save_user_file(self, client_id: int, user_id: int, file: UploadFile, title: str = None, tags: str = "") -> Dict[str, Any]:
+        """Sauvegarder un fichier pour un utilisateur spécifique"""
+        new_file = self.new_user_file_key(client_id, user_id, file.filename)
+        safe_filename, file_ext, key = new_file["filename"], new_file["extension"], new_file["key"]
         
-        # Sauvegarder le fichier
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Sauvegarder le fichier (le hash du contenu est calculé pendant l'écriture)
+        blob = self.write_user_blob(client_id, key, file.file, file_ext)
         
         # Lire le contenu si c'est un fichier texte
         content = ""
         if file_ext == '.txt':
             try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
+                content = decode_text(self.read_blob(key, blob["storage_encoding"]))
             except Exception:
                 content = ""
         
@@ -56,51 +126,88 @@ class FileStorageManager:
         return {
             "filename": safe_filename,
             "original_filename": file.filename,
-            "file_path": str(file_path),
+            "file_path": key,
             "title": title or Path(file.filename).stem,
             "content": content,
-            "file_size": file_path.stat().st_size,
-            "mime_type": mimetypes.guess_type(file_path)[0] or "text/plain",
+            **blob,
+            "mime_type": mimetypes.guess_type(safe_filename)[0] or "text/plain",
             "tags": tags
         }
     
-    def read_user_file(self, client_id: int, user_id: int, file_path: str) -> str:
-        """Lire le contenu d'un fichier utilisateur"""
-        full_path = Path(file_path)
-        if not full_path.exists():
+    def open_blob(self, key: str, storage_encoding: Optional[str] = None):
+        """Flux en lecture du contenu logique d'un blob (décompressé à la volée)"""
+        stream = self.driver.open(key)
+        return self.codec.decompressing_reader(stream, storage_encoding) if storage_encoding else stream
+    
+    def read_blob(self, key: str, storage_encoding: Optional[str] = None) -> bytes:
+        with self.open_blob(key, storage_encoding) as f:
+            data = f.read()
+        metrics.record_storage("read", len(data))
+        return data
+    
+    def iter_stored_chunks(self, key: str, chunk_size: int = 1024 * 1024):
+        """Octets stockés d'un blob (sans décompression), par morceaux"""
+        return metrics.counted_chunks(self.driver.iter_chunks(key, chunk_size=chunk_size))
+    
+    def iter_blob_chunks(self, key: str, storage_encoding: Optional[str] = None, chunk_size: int = 1024 * 1024):
+        chunks = self.iter_stored_chunks(key, chunk_size=chunk_size)
+        return self.codec.iter_decompressed(chunks, storage_encoding) if storage_encoding else chunks
+    
+    def get_user_file_key(self, client_id: int, user_id: int, file_path: str) -> str:
+        """Clé de stockage d'un fichier utilisateur, après contrôle d'existence et d'accès"""
+        key = self.resolve_key(file_path)
+        if not self.driver.exists(key):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Fichier non trouvé"
             )
         
         # Vérifier que le fichier appartient au bon utilisateur
-        if not self._check_user_file_access(client_id, user_id, full_path):
+        if not self._check_user_file_access(client_id, user_id, key):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Accès non autorisé à ce fichier"
             )
+        return key
+    
+    def read_user_file(self, client_id: int, user_id: int, file_path: str, content_hash: Optional[str] = None,
+                       storage_encoding: Optional[str] = None) -> str:
+        """Lire le contenu d'un fichier utilisateur
+        
+        Les fichiers texte sont lus directement (décompressés si `storage_encoding`) ;
+        pour les autres formats, le texte extrait est servi depuis le cache
+        (`content_hash` évite de relire le blob).
+        """
+        key = self.get_user_file_key(client_id, user_id, file_path)
         
         # Lire selon le type de fichier
-        file_ext = full_path.suffix.lower()
-        if file_ext == '.txt':
-            with open(full_path, "r", encoding="utf-8") as f:
-                return f.read()
-        else:
-            # Pour les fichiers non-text, retourner le chemin seulement
-            return f"Fichier binaire: {full_path.name}"
+        file_ext = Path(key).suffix.lower()
+        if file_ext in PLAIN_TEXT_EXTENSIONS:
+            return decode_text(self.read_blob(key, storage_encoding))
+        if self.extractor.supports(file_ext):
+            return self.extractor.get_text(key, file_ext, content_hash)
+        # Format sans extracteur : retourner le nom seulement
+        return f"Fichier binaire: {Path(key).name}"
+    
+    def warm_extracted_text(self, items: List[Dict[str, Any]]):
+        """Pré-extraire le texte de fichiers fraîchement uploadés (tâche de fond)"""
+        self.extractor.warm(
+            (item["file_path"], Path(item["file_path"]).suffix, item.get("content_hash"))
+            for item in items
+        )
     
     def delete_user_file(self, client_id: int, user_id: int, file_path: str) -> bool:
         """Supprimer un fichier utilisateur"""
-        full_path = Path(file_path)
+        key = self.resolve_key(file_path)
         # If the file does not exist, return a 404 so the caller can handle it
-        if not full_path.exists():
+        if not self.driver.exists(key):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Fichier physique non trouvé"
             )
 
         # Vérifier les permissions (après avoir confirmé l'existence)
-        if not self._check_user_file_access(client_id, user_id, full_path):
+        if not self._check_user_file_access(client_id, user_id, key):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Accès non autorisé à ce fichier"
@@ -108,8 +215,7 @@ class FileStorageManager:
 
         # Supprimer le fichier
         try:
-            full_path.unlink()
-            return True
+            return self.driver.delete(key)
         except Exception as e:
             # Renvoyer une erreur claire au caller
             raise HTTPException(
@@ -119,64 +225,47 @@ class FileStorageManager:
     
     def list_user_files(self, client_id: int, user_id: int) -> List[Dict[str, Any]]:
         """Lister tous les fichiers d'un utilisateur"""
-        user_path = self.get_user_storage_path(client_id, user_id)
         files = []
         
-        for file_path in user_path.glob("*"):
-            if file_path.is_file():
-                stats = file_path.stat()
-                files.append({
-                    "filename": file_path.name,
-                    "original_filename": file_path.stem,
-                    "file_path": str(file_path),
-                    "file_size": stats.st_size,
-                    "created_at": datetime.fromtimestamp(stats.st_ctime),
-                    "updated_at": datetime.fromtimestamp(stats.st_mtime),
-                    "mime_type": mimetypes.guess_type(file_path)[0] or "application/octet-stream"
-                })
+        for blob in self.driver.list(self.get_user_prefix(client_id, user_id)):
+            name = Path(blob["key"]).name
+            files.append({
+                "filename": name,
+                "original_filename": Path(name).stem,
+                "file_path": blob["key"],
+                "file_size": blob["size"],
+                "created_at": blob["modified_at"],
+                "updated_at": blob["modified_at"],
+                "mime_type": mimetypes.guess_type(name)[0] or "application/octet-stream"
+            })
         
         return files
     
-    def list_public_files_in_client(self, client_id: int) -> List[Dict[str, Any]]:
-        """Lister les fichiers publics de tous les utilisateurs d'un client"""
-        client_path = self.base_storage_path / f"client_{client_id}"
-        public_files = []
-        
-        if not client_path.exists():
-            return []
-        
-        # Parcourir tous les dossiers utilisateurs
-        for user_dir in client_path.iterdir():
-            if user_dir.is_dir():
-                for file_path in user_dir.glob("*"):
-                    if file_path.is_file():
-                        stats = file_path.stat()
-                        public_files.append({
-                            "filename": file_path.name,
-                            "user_folder": user_dir.name,
-                            "file_path": str(file_path),
-                            "file_size": stats.st_size,
-                            "created_at": datetime.fromtimestamp(stats.st_ctime)
-                        })
-        
-        return public_files
+    def list_public_files_in_client(self, db: Session, client_id: int) -> List[Dict[str, Any]]:
+        """Lister les fichiers publics de tous les utilisateurs d'un client (depuis la base, via le catalogue)"""
+        return [
+            {
+                "filename": meta.filename,
+                "user_folder": f"user_{meta.user_id}",
+                "file_path": meta.file_path,
+                "file_size": meta.file_size,
+                "created_at": meta.created_at
+            }
+            for meta in PublicFileCatalog(db).list(client_id, limit=None)
+        ]
     
-    def _check_user_file_access(self, client_id: int, user_id: int, file_path: Path) -> bool:
+    def _check_user_file_access(self, client_id: int, user_id: int, key: str) -> bool:
         """Vérifier qu'un fichier appartient à un utilisateur spécifique"""
-        expected_path = self.get_user_storage_path(client_id, user_id)
-        return str(file_path).startswith(str(expected_path))
+        return key.startswith(self.get_user_prefix(client_id, user_id))
     
     def get_storage_stats(self, client_id: int, user_id: int) -> Dict[str, Any]:
-        """Obtenir les statistiques de stockage d'un utilisateur"""
-        user_path = self.get_user_storage_path(client_id, user_id)
-        
+        """Obtenir les statistiques de stockage d'un utilisateur (parcours complet du stockage)"""
         total_size = 0
         file_count = 0
         
-        for file_path in user_path.glob("*"):
-            if file_path.is_file():
-                total_size += file_path.stat().st_size
-                file_count += 1
+        for blob in self.driver.list(self.get_user_prefix(client_id, user_id)):
+            total_size += blob["size"]
+            file_count += 1
         
         return {
             "user_id": user_id,
@@ -184,8 +273,8 @@ class FileStorageManager:
             "file_count": file_count,
             "total_size_bytes": total_size,
             "total_size_mb": round(total_size / (1024 * 1024), 2),
-            "storage_path": str(user_path)
+            "storage_path": self.describe_user_location(client_id, user_id)
         }
 
 # Instance globale
-file_storage = FileStorageManager()
+file_storage = FileStorageManager(driver=create_driver(STORAGE_URL))
@@ -0,0 +1,404 @@
+"""Serveurs d'index RAG séparés des workers de l'API (mode optionnel).
+
+Par défaut chaque worker uvicorn garde les index de ses utilisateurs en mémoire
+(`rag_cache`) : la mémoire des index est multipliée par le nombre de workers. Avec
+``INDEX_SERVERS`` (chemins de sockets Unix séparés par des virgules), les questions RAG
+sont envoyées à un pool de processus serveurs d'index :
+
+- chaque utilisateur est affecté à un serveur par hachage cohérent (`HashRing`) : son
+  index n'existe qu'une fois, et ajouter ou retirer un serveur ne déplace qu'une part
+  des utilisateurs ;
+- un serveur garde ses index avec `rag_cache` et reste cohérent avec les écritures des
+  workers par le bus `change_events` ;
+- côté API, `IndexClient` ouvre ``INDEX_SERVER_POOL_SIZE`` connexions par serveur ;
+  chacune est servie par un thread qui envoie dans une même trame toutes les questions
+  en attente (jusqu'à ``INDEX_SERVER_BATCH_SIZE``) pendant que la précédente est traitée.
+
+Protocole : trames JSON préfixées par leur longueur (4 octets, gros-boutiste) ; une
+trame porte une liste de requêtes, la réponse la liste des résultats dans le même ordre.
+
+Lancement (depuis ``backend/``, comme l'API) :
+
+    python index_server.py --servers 4 --socket-dir /tmp/saas-index
+    INDEX_SERVERS=/tmp/saas-index/index-0.sock,... uvicorn app:app --workers 8
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import logging
+import os
+import queue
+import signal
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+import change_events
+import models
+import rag_cache
+import tracing
+from database import SessionLocal
+from scheduler import PeriodicJob
+
+# Optional orjson dependency (best-effort)
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_SERVERS = [path.strip() for path in os.environ.get("INDEX_SERVERS", "").split(",") if path.strip()]
+INDEX_SERVER_POOL_SIZE = int(os.environ.get("INDEX_SERVER_POOL_SIZE", "4"))
+INDEX_SERVER_BATCH_SIZE = int(os.environ.get("INDEX_SERVER_BATCH_SIZE", "32"))
+INDEX_SERVER_TIMEOUT_SECONDS = float(os.environ.get("INDEX_SERVER_TIMEOUT_SECONDS", "30"))
+DEFAULT_SOCKET_DIR = os.path.join(tempfile.gettempdir(), "saas-index")
+VIRTUAL_NODES = 64  # Points par serveur sur l'anneau : répartition homogène
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+_HEADER = struct.Struct(">I")
+
+
+class IndexServerError(Exception):
+    """Requête refusée ou en échec côté serveur d'index"""
+
+
+class IndexServerUnavailable(IndexServerError):
+    """Serveur d'index injoignable ou délai dépassé"""
+
+
+# ==================== Hachage cohérent ====================
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Anneau de hachage cohérent : utilisateur -> serveur"""
+
+    def __init__(self, nodes: List[str], virtual_nodes: int = VIRTUAL_NODES):
+        if not nodes:
+            raise ValueError("Au moins un serveur d'index est requis")
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(virtual_nodes))
+        self.nodes = list(nodes)
+        self._keys = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key: Any) -> str:
+        index = bisect.bisect(self._keys, _hash(str(key)))
+        return self._nodes[index % len(self._nodes)]
+
+
+# ==================== Trames ====================
+
+def _dumps(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=str)
+    return json.dumps(payload, default=str, ensure_ascii=False).encode()
+
+
+def _read_exactly(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            if buffer:
+                raise ValueError(f"Trame tronquée ({len(buffer)} / {size} octets)")
+            raise ConnectionError("Connexion fermée par le pair")
+        buffer += chunk
+    return bytes(buffer)
+
+
+def send_frame(sock: socket.socket, payload: Any):
+    body = _dumps(payload)
+    sock.sendall(_HEADER.pack(len(body)) + body)
+
+
+def receive_frame(sock: socket.socket) -> Any:
+    """Trame suivante ; ConnectionError seulement si la connexion est fermée avant le moindre octet"""
+    (size,) = _HEADER.unpack(_read_exactly(sock, _HEADER.size))
+    if size > MAX_FRAME_BYTES:
+        raise ValueError(f"Trame trop grande ({size} octets)")
+    try:
+        body = _read_exactly(sock, size)
+    except ConnectionError:
+        raise ValueError("Trame tronquée (connexion fermée après l'en-tête)")
+    return json.loads(body)
+
+
+# ==================== Serveur ====================
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class IndexServer:
+    """Processus serveur d'index : traite les lots de requêtes reçus sur une socket Unix"""
+
+    def __init__(self, socket_path: str, workers: int = 8,
+                 session_factory: Callable[[], Session] = SessionLocal,
+                 cache: Optional[rag_cache.RAGIndexCache] = None):
+        self.socket_path = socket_path
+        self.session_factory = session_factory
+        self.cache = cache or rag_cache.rag_index_cache
+        # Les requêtes d'un lot (utilisateurs différents) sont traitées en parallèle
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="index")
+        self.stats = {"batches": 0, "requests": 0, "errors": 0}
+        self._server: Optional[_UnixServer] = None
+
+    def handle_batch(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        self.stats["batches"] += 1
+        self.stats["requests"] += len(requests)
+        return list(self.executor.map(self._handle, requests))
+
+    def _handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            op = request.get("op")
+            if op == "query":
+                return {"result": self._query(request)}
+            if op == "stats":
+                return {"result": {"pid": os.getpid(), "socket": self.socket_path,
+                                   "rag_cache": self.cache.info(), **self.stats}}
+            raise IndexServerError(f"Opération inconnue: {op}")
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"[IndexServer] Requête en échec: {e}")
+            return {"error": str(e)}
+
+    def _query(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        db = self.session_factory()
+        try:
+            user = db.get(models.User, request["user_id"])
+            # Même contrôle que l'API : le worker n'envoie que l'utilisateur authentifié
+            if user is None or not user.is_active or user.client_id != request["client_id"]:
+                raise IndexServerError("Utilisateur inconnu ou inactif")
+            debug_timings = bool(request.get("debug_timings"))
+            with (tracing.record() if debug_timings else nullcontext([])) as spans:
+                with self.cache.use(user, db) as rag_system:
+                    result = rag_system.query(request["question"])
+            if debug_timings:
+                result["debug_timings"] = tracing.timings(spans)
+            return result
+        finally:
+            db.close()
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                # Connexion persistante : un lot après l'autre jusqu'à la fermeture par le client
+                while True:
+                    try:
+                        requests = receive_frame(self.request)
+                        send_frame(self.request, server.handle_batch(requests))
+                    except (OSError, ValueError):
+                        return
+
+        self._server = _UnixServer(self.socket_path, Handler)
+        os.chmod(self.socket_path, 0o660)
+        logger.info(f"[IndexServer] En écoute sur {self.socket_path} (pid {os.getpid()})")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self.executor.shutdown(wait=False)
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+
+# ==================== Client (workers de l'API) ====================
+
+class IndexClient:
+    """Pool de connexions vers les serveurs d'index, avec regroupement des requêtes"""
+
+    def __init__(self, socket_paths: List[str], pool_size: int = INDEX_SERVER_POOL_SIZE,
+                 batch_size: int = INDEX_SERVER_BATCH_SIZE, timeout: float = INDEX_SERVER_TIMEOUT_SECONDS):
+        self.ring = HashRing(socket_paths)
+        self.pool_size = max(1, pool_size)
+        self.batch_size = max(1, batch_size)
+        self.timeout = timeout
+        self._queues: Dict[str, queue.Queue] = {path: queue.Queue() for path in socket_paths}
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        # Threads démarrés à la première requête (après le fork des workers uvicorn)
+        with self._lock:
+            if self._threads:
+                return
+            for path, pending in self._queues.items():
+                for i in range(self.pool_size):
+                    thread = threading.Thread(target=self._sender, args=(path, pending),
+                                              name=f"index-client-{os.path.basename(path)}-{i}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def _connect(self, path: str) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _sender(self, path: str, pending: queue.Queue):
+        """Une connexion : envoie les requêtes en attente par lots, une trame à la fois"""
+        sock = None
+        while True:
+            item = pending.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = pending.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    pending.put(None)  # Arrêt traité après ce lot
+                    break
+                batch.append(item)
+
+            requests = [request for request, _ in batch]
+            replies = None
+            for attempt in range(2):
+                reused = sock is not None
+                try:
+                    if sock is None:
+                        sock = self._connect(path)
+                    send_frame(sock, requests)
+                    replies = receive_frame(sock)
+                    break
+                except (OSError, ValueError) as e:
+                    if sock is not None:
+                        sock.close()
+                        sock = None
+                    # Nouvelle tentative uniquement pour une connexion du pool fermée par le serveur
+                    # (redémarré) avant toute réponse. Jamais après un délai dépassé (socket.timeout) :
+                    # le lot est peut-être encore en cours de traitement et serait exécuté deux fois.
+                    if not (reused and not attempt and isinstance(e, ConnectionError)):
+                        logger.error(f"[IndexClient] Serveur {path} indisponible: {e}")
+                        break
+
+            for index, (_, future) in enumerate(batch):
+                if replies is None or index >= len(replies):
+                    future.set_exception(IndexServerUnavailable(f"Serveur d'index {path} indisponible"))
+                elif "error" in replies[index]:
+                    future.set_exception(IndexServerError(replies[index]["error"]))
+                else:
+                    future.set_result(replies[index]["result"])
+
+        if sock is not None:
+            sock.close()
+
+    def call(self, path: str, request: Dict[str, Any]) -> Any:
+        self._start()
+        future: Future = Future()
+        self._queues[path].put((request, future))
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise IndexServerUnavailable(f"Serveur d'index {path} : délai dépassé")
+
+    def query(self, user: models.User, question: str, debug_timings: bool = False) -> Dict[str, Any]:
+        return self.call(self.ring.node_for(user.id), {
+            "op": "query",
+            "user_id": user.id,
+            "client_id": user.client_id,
+            "question": question,
+            "debug_timings": debug_timings
+        })
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [self.call(path, {"op": "stats"}) for path in self.ring.nodes]
+
+    def close(self):
+        with self._lock:
+            for pending in self._queues.values():
+                pending.put(None)
+            self._threads.clear()
+
+
+client: Optional[IndexClient] = IndexClient(INDEX_SERVERS) if INDEX_SERVERS else None
+
+
+# ==================== Lancement ====================
+
+def socket_paths(socket_dir: str, servers: int) -> List[str]:
+    return [os.path.join(socket_dir, f"index-{i}.sock") for i in range(servers)]
+
+
+def serve(socket_path: str, workers: int = 8):
+    """Point d'entrée d'un processus serveur"""
+    logging.basicConfig(level=logging.INFO)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    # Relecture du bus même sans requête : les index marqués périmés sont synchronisés à la suivante
+    poll_job = None
+    if change_events.POLL_SECONDS > 0:
+        poll_job = PeriodicJob("change-events-poll", change_events.POLL_SECONDS, change_events.run_poll_job)
+        poll_job.start()
+    try:
+        IndexServer(socket_path, workers=workers).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if poll_job is not None:
+            poll_job.stop()
+
+
+def main(argv: Optional[list] = None):
+    import multiprocessing
+
+    parser = argparse.ArgumentParser(description="Serveurs d'index RAG (sockets Unix)")
+    parser.add_argument("--servers", type=int, default=2, help="Nombre de processus serveurs")
+    parser.add_argument("--socket-dir", default=DEFAULT_SOCKET_DIR)
+    parser.add_argument("--socket", help="Lancer un seul serveur sur ce chemin (superviseur externe)")
+    parser.add_argument("--workers", type=int, default=8, help="Requêtes traitées en parallèle par serveur")
+    args = parser.parse_args(argv)
+
+    if args.socket:
+        serve(args.socket, args.workers)
+        return
+
+    # SIGTERM comme Ctrl+C : les serveurs sont arrêtés avec le processus parent
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    paths = socket_paths(args.socket_dir, args.servers)
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=serve, args=(path, args.workers), name=f"index-server-{i}")
+                 for i, path in enumerate(paths)]
+    for process in processes:
+        process.start()
+    print(f"INDEX_SERVERS={','.join(paths)}", flush=True)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join(5)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 import json
-from database import SessionLocal, engine
+from database import SessionLocal, engine, upgrade_schema
 import models
 from sqlalchemy.orm import Session
 from auth import get_password_hash
@@ -9,6 +9,7 @@ def init_database():
     """Initialiser la base de données avec les données de test"""
     # Créer les tables
     models.Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
 
     db = SessionLocal()
 
@@ -49,6 +50,12 @@ def init_database():
             }
         ]
 
+        # Un hash (pbkdf2, coûteux) par mot de passe distinct
+        password_hashes = {
+            user_data["password"]: get_password_hash(user_data["password"])
+            for client_data in clients_data for user_data in client_data["users"]
+        }
+
         for client_data in clients_data:
             client = db.query(models.Client).filter(
                 models.Client.email == client_data["email"]
@@ -76,7 +83,7 @@ def init_database():
                     user = models.User(
                         email=user_data["email"],
                         full_name=user_data["full_name"],
-                        hashed_password=get_password_hash(user_data["password"]),
+                        hashed_password=password_hashes[user_data["password"]],
                         is_admin=user_data["is_admin"],
                         client_id=client.id,
                         is_active=True
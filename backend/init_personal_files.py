@@ -2,28 +2,28 @@ import os
 from pathlib import Path
 from database import SessionLocal
 import models
-from file_storage import FileStorageManager
+from file_storage import file_storage
+import storage_accounting
 
 def init_personal_files():
     """Initialiser les fichiers personnels pour chaque utilisateur"""
     db = SessionLocal()
-    file_manager = FileStorageManager()
     
     try:
         # Récupérer tous les utilisateurs
         users = db.query(models.User).all()
         
         for user in users:
-            user_path = file_manager.get_user_storage_path(user.client_id, user.id)
-            print(f"📁 Dossier de {user.email}: {user_path}")
+            user_prefix = file_storage.get_user_prefix(user.client_id, user.id)
+            print(f"📁 Dossier de {user.email}: {file_storage.describe_user_location(user.client_id, user.id)}")
             
             # Créer des fichiers d'exemple personnalisés
-            create_personal_sample_files(user, user_path, db)
+            create_personal_sample_files(user, user_prefix, db)
     
     finally:
         db.close()
 
-def create_personal_sample_files(user, user_path, db):
+def create_personal_sample_files(user, user_prefix, db):
     """Créer des fichiers .txt personnels pour un utilisateur"""
     
     # Fichiers spécifiques selon le rôle
@@ -111,27 +111,29 @@ Projet Beta :
         ]
     
     for file_info in sample_files:
-        file_path = user_path / file_info["filename"]
+        key = user_prefix + file_info["filename"]
         
         # Écrire le fichier
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(file_info["content"])
+        file_size = file_storage.driver.put_bytes(key, file_info["content"].encode("utf-8"))
         
         # Enregistrer en base
         user_file = models.UserFile(
             filename=file_info["filename"],
             original_filename=file_info["filename"],
-            file_path=str(file_path),
+            file_path=key,
             title=file_info["title"],
             client_id=user.client_id,
             user_id=user.id,
-            file_size=file_path.stat().st_size,
+            file_size=file_size,
             mime_type="text/plain",
             is_public=False,  # Par défaut privé
             tags=file_info["tags"]
         )
         
         db.add(user_file)
+        storage_accounting.record_upload(
+            db, user.client_id, user.id, user_file.mime_type, user_file.file_size
+        )
     
     db.commit()
     print(f"   ✅ Fichiers personnels créés pour {user.email}")
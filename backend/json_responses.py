@@ -0,0 +1,53 @@
+"""Sérialisation JSON rapide des réponses.
+
+- `FastJSONResponse` : classe de réponse par défaut de l'API, `orjson` s'il est
+  installé (sinon `json` compact) ;
+- `model_response` : pour les listes volumineuses, les lignes ORM sont validées
+  une fois par le schéma (`from_attributes`) puis écrites directement en JSON par
+  pydantic-core, sans passer par des dicts Python intermédiaires.
+
+``FAST_JSON_RESPONSES=0`` revient au chemin standard de FastAPI (comparaisons, benchmark).
+"""
+import json
+import os
+from functools import lru_cache
+from typing import Any
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+
+# Optional orjson dependency (best-effort)
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+FAST_JSON_RESPONSES = os.environ.get("FAST_JSON_RESPONSES", "1").lower() not in ("0", "false", "no")
+
+
+class FastJSONResponse(JSONResponse):
+    """Réponse JSON compacte (orjson si disponible)"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+@lru_cache(maxsize=None)
+def _adapter(schema_type: Any) -> TypeAdapter:
+    return TypeAdapter(schema_type)
+
+
+def model_response(schema_type: Any, content: Any, exclude_unset: bool = False, status_code: int = 200) -> Response:
+    """Réponse sérialisée par le schéma `schema_type` (ex. ``List[schemas.Document]``)
+
+    À utiliser avec le même `response_model` dans le décorateur (documentation OpenAPI).
+    """
+    adapter = _adapter(schema_type)
+    value = adapter.validate_python(content, from_attributes=True)
+    if not FAST_JSON_RESPONSES:
+        # Chemin standard de FastAPI : objets Python compatibles JSON, puis json.dumps
+        return JSONResponse(adapter.dump_python(value, mode="json", exclude_unset=exclude_unset), status_code=status_code)
+    return Response(adapter.dump_json(value, exclude_unset=exclude_unset), status_code=status_code,
+                    media_type="application/json")
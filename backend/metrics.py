@@ -0,0 +1,339 @@
+"""Métriques au format Prometheus (endpoint `/metrics`).
+
+- requêtes HTTP par route (gabarit, ex. ``/my-files/{file_id}``), méthode et statut :
+  nombre, histogramme de latence, requêtes en cours ;
+- requêtes SQL : durée et nombre par requête HTTP (relevés par sql_monitor) ;
+- durée des étapes du RAG, octets lus / écrits dans le stockage, succès des caches.
+
+Avec `prometheus_client` installé et ``PROMETHEUS_MULTIPROC_DIR`` défini (répertoire
+vide au démarrage, partagé par les workers uvicorn), les valeurs sont agrégées entre
+processus. Sans `prometheus_client`, un registre interne produit le même format
+texte, mais par processus : un avertissement est journalisé au démarrage si
+plusieurs workers sont configurés.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Optional prometheus_client dependency (best-effort)
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except Exception:
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+# En-tête Server-Timing (nombre et durée des requêtes SQL) sur chaque réponse
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "1").lower() not in ("0", "false", "no")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+UNMATCHED_ROUTE = "unmatched"
+NO_ROUTE = "-"  # Requêtes SQL hors requête HTTP (tâches périodiques, scripts)
+
+
+class _Child:
+    def __init__(self, lock: threading.Lock, buckets: Optional[Sequence[float]] = None):
+        self._lock = lock
+        self.value = 0.0
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets) if buckets else None
+        self.count = 0
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+    def observe(self, value: float):
+        with self._lock:
+            self.value += value
+            self.count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.bucket_counts[i] += 1
+                    break
+
+
+class _Metric:
+    """Métrique du registre interne (sous-ensemble de l'API de prometheus_client)"""
+
+    def __init__(self, kind: str, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Optional[Sequence[float]] = None):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) if buckets else None
+        self._children: Dict[Tuple[str, ...], _Child] = {}
+        self._lock = threading.Lock()
+        _METRICS.append(self)
+
+    def labels(self, *values, **labels) -> _Child:
+        key = tuple(str(labels[n]) for n in self.labelnames) if labels else tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, _Child(self._lock, self.buckets))
+        return child
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _label_text(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        with self._lock:
+            children = [(values, child.value, child.count, list(child.bucket_counts or ()))
+                        for values, child in self._children.items()]
+        for values, value, count, bucket_counts in children:
+            if self.kind != "histogram":
+                yield f"{self.name}{self._label_text(values)} {_number(value)}"
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % _number(bound)
+                yield f"{self.name}_bucket{self._label_text(values, le)} {cumulative}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{self._label_text(values, le)} {count}"
+            yield f"{self.name}_sum{self._label_text(values)} {_number(value)}"
+            yield f"{self.name}_count{self._label_text(values)} {count}"
+
+
+_METRICS = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else f"{int(value)}.0"
+
+
+def _counter(name: str, documentation: str, labelnames: Sequence[str] = ()):
+    if prometheus_client is not None:
+        return prometheus_client.Counter(name, documentation, labelnames)
+    return _Metric("counter", name, documentation, labelnames)
+
+
+def _gauge(name: str, documentation: str, labelnames: Sequence[str] = ()):
+    if prometheus_client is not None:
+        return prometheus_client.Gauge(name, documentation, labelnames, multiprocess_mode="livesum")
+    return _Metric("gauge", name, documentation, labelnames)
+
+
+def _histogram(name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+    if prometheus_client is not None:
+        return prometheus_client.Histogram(name, documentation, labelnames, buckets=buckets)
+    return _Metric("histogram", name, documentation, labelnames, buckets)
+
+
+HTTP_REQUESTS = _counter("http_requests_total", "Requêtes HTTP traitées", ("method", "route", "status"))
+HTTP_REQUEST_SECONDS = _histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP", ("method", "route", "status"), LATENCY_BUCKETS
+)
+HTTP_IN_PROGRESS = _gauge("http_requests_in_progress", "Requêtes HTTP en cours", ("method", "route"))
+DB_QUERY_SECONDS = _histogram("db_query_duration_seconds", "Durée des requêtes SQL", ("route",), QUERY_BUCKETS)
+DB_QUERIES_PER_REQUEST = _histogram(
+    "db_queries_per_request", "Nombre de requêtes SQL par requête HTTP", ("route",), COUNT_BUCKETS
+)
+RAG_STAGE_SECONDS = _histogram("rag_stage_duration_seconds", "Durée des étapes du RAG personnel", ("stage",),
+                               LATENCY_BUCKETS)
+STORAGE_BYTES = _counter("storage_bytes_total", "Octets lus / écrits dans le stockage", ("direction",))
+CACHE_REQUESTS = _counter("cache_requests_total", "Accès aux caches (hit / miss)", ("cache", "result"))
+
+
+class RequestStats:
+    """Compteurs de la requête HTTP en cours"""
+
+    __slots__ = ("route", "db_queries", "db_seconds", "statements")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        # Nombre d'exécutions par texte de requête (détection des N+1)
+        self.statements: Dict[str, int] = {}
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("metrics_request", default=None)
+
+
+def current_request() -> Optional[RequestStats]:
+    return _current_request.get()
+
+
+@contextmanager
+def request_scope(route: str) -> Iterator[RequestStats]:
+    """Compteurs d'une requête (HTTP, ou bloc de code dans les tests et scripts)"""
+    stats = RequestStats(route)
+    token = _current_request.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_request.reset(token)
+
+
+def server_timing(stats: RequestStats) -> bytes:
+    return f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.db_queries} queries"'.encode("latin-1")
+
+
+def route_template(scope: Scope) -> str:
+    """Gabarit de la route (chemin déclaré, pas l'URL) : cardinalité bornée"""
+    partial = None
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", UNMATCHED_ROUTE)
+        if match == Match.PARTIAL and partial is None:
+            partial = getattr(route, "path", None)
+    return partial or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Middleware ASGI : nombre, durée et requêtes en cours par route"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        route = route_template(scope)
+        status_code = 500
+        in_progress = HTTP_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        start = time.perf_counter()
+
+        with request_scope(route) as stats:
+            async def send_wrapper(message: Message):
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    if SERVER_TIMING:
+                        message["headers"] = [*message.get("headers", []), (b"server-timing", server_timing(stats))]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                elapsed = time.perf_counter() - start
+                in_progress.dec()
+                HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+                HTTP_REQUEST_SECONDS.labels(method, route, str(status_code)).observe(elapsed)
+                DB_QUERIES_PER_REQUEST.labels(route).observe(stats.db_queries)
+
+
+@contextmanager
+def timer(histogram, **labels):
+    """Mesurer la durée d'un bloc dans un histogramme"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - start)
+
+
+def record_storage(direction: str, size: int):
+    if size:
+        STORAGE_BYTES.labels(direction).inc(size)
+
+
+def counted_chunks(chunks: Iterable[bytes], direction: str = "read") -> Iterator[bytes]:
+    """Itérer sur des morceaux en comptant les octets transférés"""
+    total = 0
+    try:
+        for chunk in chunks:
+            total += len(chunk)
+            yield chunk
+    finally:
+        record_storage(direction, total)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def render() -> Tuple[bytes, str]:
+    """Exposition texte (corps, type de contenu) de toutes les métriques"""
+    if prometheus_client is not None:
+        if MULTIPROC_DIR:
+            registry = prometheus_client.CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = prometheus_client.REGISTRY
+        return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+    lines = [line for metric in _METRICS for line in metric.render()]
+    return ("\n".join(lines) + "\n").encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+
+
+def configured_workers(argv: Optional[Sequence[str]] = None, environ: Optional[Dict[str, str]] = None) -> int:
+    """Nombre de workers demandé au serveur (``--workers N`` / ``-w N`` ou ``WEB_CONCURRENCY``).
+
+    Les workers uvicorn sont lancés par `multiprocessing` : ils héritent de la ligne
+    de commande du superviseur.
+    """
+    argv = sys.argv if argv is None else argv
+    environ = os.environ if environ is None else environ
+    value = environ.get("WEB_CONCURRENCY", "1")
+    for i, arg in enumerate(argv):
+        if arg in ("--workers", "-w") and i + 1 < len(argv):
+            value = argv[i + 1]
+        elif arg.startswith("--workers="):
+            value = arg.partition("=")[2]
+    try:
+        return int(value)
+    except ValueError:
+        return 1
+
+
+def check_worker_setup():
+    """Démarrage d'un worker : signaler des métriques qui ne seraient pas agrégées"""
+    workers = configured_workers()
+    if workers <= 1:
+        return
+    if prometheus_client is None:
+        logger.warning(f"[Metrics] {workers} workers mais prometheus_client non installé : "
+                       "/metrics ne reflète que le worker qui répond")
+    elif not MULTIPROC_DIR:
+        logger.warning(f"[Metrics] {workers} workers sans PROMETHEUS_MULTIPROC_DIR : "
+                       "/metrics ne reflète que le worker qui répond")
+
+
+def shutdown():
+    """Fin d'un worker : ses jauges ne comptent plus dans l'agrégat multi-processus"""
+    if prometheus_client is not None and MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
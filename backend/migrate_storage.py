@@ -0,0 +1,229 @@
+"""Migration des blobs entre deux drivers de stockage, en parallèle.
+
+Exemples :
+
+    python migrate_storage.py --source local:./user_files --target sharded:./user_files_sharded
+    python migrate_storage.py --source local:./user_files \
+        --target "s3://saas-files/prod?endpoint=http://localhost:9000" --workers 16 --update-db
+    python migrate_storage.py --reshard ./user_files --ops-per-second 2000
+
+La copie est reprenable : un blob déjà présent côté cible avec la même taille est ignoré.
+Les clés cachées nécessaires à la lecture sont copiées aussi : dictionnaires zstd
+(``.zdict/``, toujours) et cache des textes extraits (``.extracted/``, migration
+complète uniquement). Avec ``--prefix``, les dictionnaires, partagés entre clients,
+ne sont jamais supprimés de la source.
+
+``--reshard`` passe une arborescence locale à plat dans la disposition répartie
+(``sharded:``) sur place, par renommages atomiques : l'API peut continuer à tourner
+avec ``STORAGE_URL=sharded:...`` pendant l'opération (les fichiers pas encore
+déplacés sont lus à leur ancien emplacement).
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from database import SessionLocal
+from file_storage import FileStorageManager
+from storage_drivers import ShardedLocalStorageDriver, StorageDriver, create_driver
+import models
+
+logger = logging.getLogger(__name__)
+
+
+class StorageMigrator:
+    """Copie parallèle de toutes les clés d'un driver vers un autre"""
+
+    # Clés cachées (ignorées par `list("")`) sans lesquelles la cible serait incomplète
+    DICTIONARY_PREFIX = ".zdict/"
+    EXTRACTED_TEXT_PREFIX = ".extracted/"
+
+    def __init__(self, source: StorageDriver, target: StorageDriver, workers: int = 8,
+                 verify: bool = True, delete_source: bool = False, dry_run: bool = False):
+        self.source = source
+        self.target = target
+        self.workers = workers
+        self.verify = verify
+        self.delete_source = delete_source
+        self.dry_run = dry_run
+        self._lock = threading.Lock()
+        self.stats = {"copied": 0, "skipped": 0, "failed": 0, "bytes_copied": 0}
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self.stats[name] += value
+
+    def _migrate_one(self, blob: Dict[str, Any], delete_source: bool):
+        key = blob["key"]
+        try:
+            existing = self.target.stat(key)
+            if existing is not None and existing["size"] == blob["size"]:
+                self._count("skipped")
+            elif not self.dry_run:
+                with self.source.open(key) as stream:
+                    written = self.target.put(key, stream)
+                if self.verify and written != blob["size"]:
+                    raise IOError(f"taille copiée {written} != {blob['size']}")
+                self._count("copied")
+                self._count("bytes_copied", written)
+            else:
+                self._count("copied")
+
+            if delete_source and not self.dry_run:
+                self.source.delete(key)
+        except Exception as e:
+            self._count("failed")
+            logger.error(f"[Migration] Échec pour {key}: {e}")
+
+    def _listings(self, prefix: str) -> Iterator[Tuple[str, bool]]:
+        """(préfixe à lister, suppression à la source permise)"""
+        yield prefix, self.delete_source
+        # Les blobs `zstd:<id>` sont illisibles sans leur dictionnaire
+        yield self.DICTIONARY_PREFIX, self.delete_source and not prefix
+        if not prefix:
+            yield self.EXTRACTED_TEXT_PREFIX, self.delete_source
+
+    def run(self, prefix: str = "") -> Dict[str, Any]:
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # Fenêtre de tâches bornée : la liste des clés est consommée au fil de l'eau
+            pending = set()
+            for listed_prefix, delete_source in self._listings(prefix):
+                for blob in self.source.list(listed_prefix):
+                    pending.add(executor.submit(self._migrate_one, blob, delete_source))
+                    if len(pending) >= self.workers * 4:
+                        _, pending = wait(pending, return_when=FIRST_COMPLETED)
+            wait(pending)
+        return {**self.stats, "elapsed_seconds": round(time.monotonic() - started, 2)}
+
+
+class InPlaceResharder:
+    """Déplacement sur place des fichiers à plat vers la disposition répartie"""
+
+    # Fichiers de travail d'upload multipart (adressés par identifiant, pas par clé)
+    SKIPPED_DIRS = {".uploads"}
+
+    def __init__(self, driver: ShardedLocalStorageDriver, ops_per_second: float = 0.0, dry_run: bool = False):
+        self.driver = driver
+        self.ops_per_second = ops_per_second
+        self.dry_run = dry_run
+        self.stats = {"moved": 0, "already_sharded": 0, "superseded": 0, "failed": 0}
+
+    def _reshard_one(self, parts: tuple):
+        key = "/".join(parts)
+        source = self.driver.root.joinpath(*parts)
+        target = self.driver._path(key)
+        try:
+            if target.exists():
+                # Version plus récente écrite par l'API depuis le passage en `sharded:`
+                self.stats["superseded"] += 1
+                if not self.dry_run:
+                    source.unlink()
+            else:
+                self.stats["moved"] += 1
+                if not self.dry_run:
+                    self.driver._replace(source, target)
+        except FileNotFoundError:
+            pass  # Supprimé ou déplacé entre-temps
+        except OSError as e:
+            self.stats["failed"] += 1
+            logger.error(f"[Reshard] Échec pour {key}: {e}")
+
+    def run(self) -> Dict[str, Any]:
+        started = time.monotonic()
+        operations = 0
+        root = self.driver.root
+        for directory, dirnames, filenames in os.walk(root):
+            relative = Path(directory).relative_to(root).parts
+            if not relative:
+                dirnames[:] = [d for d in dirnames if d not in self.SKIPPED_DIRS]
+            for filename in filenames:
+                if filename.startswith(".") and filename.endswith(".tmp"):
+                    continue  # Écriture en cours
+                parts = relative + (filename,)
+                if self.driver.is_sharded(parts):
+                    self.stats["already_sharded"] += 1
+                    continue
+                self._reshard_one(parts)
+                operations += 1
+                if self.ops_per_second > 0:
+                    remaining = operations / self.ops_per_second - (time.monotonic() - started)
+                    if remaining > 0:
+                        time.sleep(remaining)
+        return {**self.stats, "elapsed_seconds": round(time.monotonic() - started, 2)}
+
+
+def normalize_file_paths(storage: FileStorageManager, dry_run: bool = False) -> int:
+    """Réécrire les anciens `UserFile.file_path` (chemins locaux) en clés de stockage"""
+    db = SessionLocal()
+    updated = 0
+    try:
+        for row in db.query(models.UserFile).yield_per(1000):
+            if not row.file_path:
+                continue
+            key = storage.resolve_key(row.file_path)
+            if key != row.file_path:
+                updated += 1
+                if not dry_run:
+                    row.file_path = key
+        if not dry_run:
+            db.commit()
+    finally:
+        db.close()
+    return updated
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Migration des fichiers entre drivers de stockage")
+    parser.add_argument("--source", help="URL du stockage source (ex. local:./user_files)")
+    parser.add_argument("--target", help="URL du stockage cible (ex. s3://bucket/prefix)")
+    parser.add_argument("--reshard", metavar="ROOT",
+                        help="Répartir sur place une arborescence locale à plat (sans --source/--target)")
+    parser.add_argument("--levels", type=int, default=2, help="Niveaux de répartition (--reshard)")
+    parser.add_argument("--width", type=int, default=2, help="Caractères par niveau (--reshard)")
+    parser.add_argument("--ops-per-second", type=float, default=0.0,
+                        help="Limiter le rythme des renommages (--reshard, 0 = sans limite)")
+    parser.add_argument("--prefix", default="", help="Limiter à un préfixe (ex. client_1/)")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--no-verify", action="store_true")
+    parser.add_argument("--delete-source", action="store_true")
+    parser.add_argument("--update-db", action="store_true",
+                        help="Normaliser les file_path en clés de stockage indépendantes du driver")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.reshard:
+        driver = ShardedLocalStorageDriver(args.reshard, levels=args.levels, width=args.width)
+        result = InPlaceResharder(driver, ops_per_second=args.ops_per_second, dry_run=args.dry_run).run()
+        print(json.dumps(result, indent=2))
+        return result
+    if not args.source or not args.target:
+        parser.error("--source et --target sont requis (ou --reshard ROOT)")
+
+    source = create_driver(args.source)
+    target = create_driver(args.target)
+
+    result = {}
+    if args.update_db:
+        result["normalized_rows"] = normalize_file_paths(FileStorageManager(driver=source), args.dry_run)
+
+    migrator = StorageMigrator(
+        source, target,
+        workers=args.workers,
+        verify=not args.no_verify,
+        delete_source=args.delete_source,
+        dry_run=args.dry_run
+    )
+    result.update(migrator.run(args.prefix))
+    print(json.dumps(result, indent=2))
+    return result
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
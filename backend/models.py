@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Boolean, UniqueConstraint, Index, func
+from sqlalchemy.orm import column_property, relationship
 from datetime import datetime
 from database import Base
 
@@ -12,6 +12,7 @@ class Client(Base):
     email = Column(String, unique=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     is_active = Column(Boolean, default=True)
+    storage_quota_bytes = Column(BigInteger, nullable=True)  # None : quota par défaut (STORAGE_CLIENT_QUOTA_MB)
     
     users = relationship("User", back_populates="client")
     documents = relationship("Document", back_populates="client")
@@ -25,7 +26,7 @@ class User(Base):
     full_name = Column(String)
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
-    client_id = Column(Integer, ForeignKey("clients.id"))
+    client_id = Column(Integer, ForeignKey("clients.id"), index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     last_login = Column(DateTime, nullable=True)
     
@@ -37,7 +38,9 @@ class ApiKey(Base):
     __tablename__ = "api_keys"
     
     id = Column(Integer, primary_key=True, index=True)
-    key = Column(String, unique=True, index=True)
+    key = Column(String, unique=True, index=True, nullable=True)  # Ancien stockage en clair (vidé à la migration)
+    key_prefix = Column(String, index=True)  # Partie publique de la clé, utilisée pour la recherche
+    key_hash = Column(String)  # HMAC-SHA256 de la clé complète
     name = Column(String)
     user_id = Column(Integer, ForeignKey("users.id"))
     client_id = Column(Integer, ForeignKey("clients.id"))
@@ -53,16 +56,26 @@ class Document(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     content = Column(Text)
-    client_id = Column(Integer, ForeignKey("clients.id"))
+    client_id = Column(Integer, ForeignKey("clients.id"), index=True)  # Toutes les listes filtrent par client
     user_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Calculés en SQL, chargés seulement à la demande (vues résumées : `fields=`)
+    size = column_property(func.length(content), deferred=True)
+    snippet = column_property(func.substr(content, 1, 200), deferred=True)
+    
     client = relationship("Client", back_populates="documents")
 
 
 class UserFile(Base):
     __tablename__ = "user_files"
+    __table_args__ = (
+        # Catalogue des fichiers publics d'un client (filtre + tri par date)
+        Index("ix_user_files_client_public_created", "client_id", "is_public", "created_at"),
+        # Listes "mes fichiers"
+        Index("ix_user_files_user_created", "user_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, index=True)
@@ -74,9 +87,100 @@ class UserFile(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     file_size = Column(Integer)  # Taille en octets
+    content_hash = Column(String, nullable=True, index=True)  # SHA-256 du contenu (clé du cache de texte extrait)
+    storage_encoding = Column(String, nullable=True)  # Compression au repos (gzip, zstd, zstd:<dict_id>) ; None = brut
+    stored_size = Column(BigInteger, nullable=True)  # Taille physique si compressé (file_size = taille logique)
     mime_type = Column(String, default="text/plain")
     is_public = Column(Boolean, default=False)  # Si le fichier est visible par les autres utilisateurs du même client
     tags = Column(String)  # Tags pour catégoriser les fichiers
     
     client = relationship("Client")
     user = relationship("User", back_populates="files")  # Relation avec l'utilisateur propriétaire
+
+
+class StorageUsage(Base):
+    """Compteurs d'usage du stockage, maintenus à chaque upload/suppression.
+
+    Une ligne par (client, utilisateur, type MIME) ; user_id = 0 porte le total du client.
+    """
+    __tablename__ = "storage_usage"
+    __table_args__ = (
+        UniqueConstraint("client_id", "user_id", "mime_type", name="uq_storage_usage_scope"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    client_id = Column(Integer, ForeignKey("clients.id"))
+    user_id = Column(Integer)  # 0 = agrégat du client
+    mime_type = Column(String)
+    file_count = Column(Integer, default=0, server_default="0")
+    total_bytes = Column(BigInteger, default=0, server_default="0")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ChangeCounter(Base):
+    """Version des données d'un utilisateur ou d'un client, incrémentée à chaque écriture.
+
+    Sert aux ETag des listes et au cache de réponses (scope "user" ou "client").
+    """
+    __tablename__ = "change_counters"
+    __table_args__ = (
+        UniqueConstraint("scope", "scope_id", name="uq_change_counters_scope"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String, nullable=False)
+    scope_id = Column(Integer, nullable=False)
+    version = Column(BigInteger, default=0, server_default="0", nullable=False)
+
+
+class ChangeEvent(Base):
+    """Journal des modifications, relu par chaque worker pour mettre à jour ses caches (change_events.py)"""
+    __tablename__ = "change_events"
+    # AUTOINCREMENT : pas de réutilisation d'identifiants après la purge (les workers suivent le dernier lu)
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # files, documents, storage, api_key
+    client_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=True)
+    object_id = Column(Integer, nullable=True)  # Fichier ou API Key concerné, si connu
+    version = Column(BigInteger, nullable=True)  # Version (ChangeCounter) de l'utilisateur, sinon du client
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class UploadSession(Base):
+    """Upload multipart en cours : parties envoyées séparément puis assemblées"""
+    __tablename__ = "upload_sessions"
+    
+    id = Column(String, primary_key=True)  # Jeton opaque de la session
+    client_id = Column(Integer, ForeignKey("clients.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    original_filename = Column(String)
+    filename = Column(String)
+    storage_key = Column(String)  # Clé du blob final
+    driver_upload_id = Column(String)  # Identifiant d'upload côté driver de stockage
+    title = Column(String)
+    tags = Column(String)
+    is_public = Column(Boolean, default=False)
+    total_size = Column(BigInteger)
+    part_size = Column(Integer)
+    part_count = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True)
+    
+    parts = relationship("UploadPart", cascade="all, delete-orphan", order_by="UploadPart.part_number")
+
+
+class UploadPart(Base):
+    __tablename__ = "upload_parts"
+    __table_args__ = (
+        UniqueConstraint("session_id", "part_number", name="uq_upload_parts_session_part"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String, ForeignKey("upload_sessions.id"), index=True)
+    part_number = Column(Integer)
+    size = Column(Integer)
+    sha256 = Column(String)
+    etag = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
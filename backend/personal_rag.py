@@ -4,13 +4,16 @@ import os
 import re
 import json
 import pickle
+from contextlib import contextmanager
 from datetime import datetime
 from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 from pathlib import Path
 
 from file_storage import file_storage
+import metrics
 import models
+import tracing
 
 # Optional BM25 dependency (best-effort)
 try:
@@ -22,6 +25,26 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger(__name__)
 
 
+@contextmanager
+def _stage(stage: str, **attributes):
+    """Étape du RAG : span de trace `rag.<stage>` et histogramme rag_stage_duration_seconds"""
+    with metrics.timer(metrics.RAG_STAGE_SECONDS, stage=stage), tracing.span(f"rag.{stage}", **attributes) as span:
+        yield span
+
+
+# Fichiers d'exemple à IGNORER COMPLÈTEMENT
+EXAMPLE_FILES_TO_IGNORE = [
+    "Mes Notes Administratives",
+    "Procédures Internes", 
+    "Mes Documents Personnels",
+    "Suivi de Mes Projets",
+    "mes_notes_admin.txt",
+    "procédures_internes.txt",
+    "mes_documents_personnels.txt",
+    "suivi_projets.txt"
+]
+
+
 class Document:
     """Classe Document simplifiée pour remplacer langchain.schema.Document"""
     def __init__(self, page_content: str, metadata: dict = None):
@@ -29,6 +52,59 @@ class Document:
         self.metadata = metadata or {}
 
 
+def rank_documents(documents: List[Document], query: str, k: int = 5) -> List[Tuple[Document, int]]:
+    """Recherche simple par mot-clé : documents pertinents (score >= 10) et leur score, du meilleur au moins bon"""
+    query_lower = query.lower()
+    query_words = set(re.findall(r'\w+', query_lower))
+    
+    scored_docs = []
+    
+    for doc in documents:
+        content_lower = doc.page_content.lower()
+        title_lower = doc.metadata.get("title", "").lower()
+        
+        # Score basé sur la pertinence GÉNÉRALE
+        score = 0
+        
+        # 1. Correspondance EXACTE avec le titre (très important)
+        for q_word in query_words:
+            if len(q_word) > 2 and q_word in title_lower:
+                score += 20
+        
+        # 2. Correspondance dans le contenu
+        for q_word in query_words:
+            if len(q_word) > 3 and q_word in content_lower:
+                score += 5
+        
+        # 3. Nombre de correspondances totales
+        total_matches = sum(1 for word in query_words if len(word) > 2 and word in content_lower)
+        score += total_matches * 3
+        
+        # 4. BONUS pour les phrases complètes dans le contenu
+        # Vérifier si des groupes de mots sont présents
+        if len(query_words) >= 2:
+            # Chercher des paires de mots
+            query_word_list = list(query_words)
+            for i in range(len(query_word_list)):
+                for j in range(i+1, len(query_word_list)):
+                    word1 = query_word_list[i]
+                    word2 = query_word_list[j]
+                    if len(word1) > 2 and len(word2) > 2:
+                        if word1 in content_lower and word2 in content_lower:
+                            score += 15  # Bonus pour plusieurs mots trouvés
+        
+        # 5. BONUS pour documents récents (si date disponible)
+        # Pas de pénalités - on accepte tous les documents pertinents
+        
+        # SEUIL MODÉRÉ pour être considéré pertinent
+        if score >= 10:  # Seuil modéré pour questions générales
+            scored_docs.append((doc, score))
+    
+    # Trier par score
+    scored_docs.sort(key=lambda x: x[1], reverse=True)
+    return scored_docs[:k]
+
+
 class PersonalRAGSystem:
     """
     Système RAG personnel pour TOUTES les questions générales
@@ -49,19 +125,15 @@ class PersonalRAGSystem:
         self.vector_store = None
         self.bm25_index = None
         self.ingested_file_ids = set()
+        # updated_at de chaque fichier lu (exemples ignorés compris) : base de `sync`
+        self.file_versions: Dict[int, Any] = {}
+        # Taille (caractères) du texte indexé : volume parcouru par une recherche
+        self.indexed_chars = 0
         self.index_path = f"./rag_index/user_{user_id}"
+        # Index partagé du client (fichiers publics, documents), fusionné aux résultats : voir `shared_rag`
+        self.shared_index = None
         
-        # Fichiers d'exemple à IGNORER COMPLÈTEMENT
-        self.EXAMPLE_FILES_TO_IGNORE = [
-            "Mes Notes Administratives",
-            "Procédures Internes", 
-            "Mes Documents Personnels",
-            "Suivi de Mes Projets",
-            "mes_notes_admin.txt",
-            "procédures_internes.txt",
-            "mes_documents_personnels.txt",
-            "suivi_projets.txt"
-        ]
+        self.EXAMPLE_FILES_TO_IGNORE = EXAMPLE_FILES_TO_IGNORE
         
         # Charger ou créer l'index
         self._initialize_system()
@@ -79,6 +151,7 @@ class PersonalRAGSystem:
             # Réinitialiser l'index existant
             self.ingested_file_ids = set()
             self.all_documents = []
+            self.indexed_chars = 0
             self._build_index()
             logger.info(f"[User {self.user_id}] Index reconstruit avec {len(self.user_files)} fichiers utilisateur")
         else:
@@ -87,14 +160,25 @@ class PersonalRAGSystem:
                 # Construire un nouvel index vide
                 self._build_index()
     
-    def _load_user_files(self) -> List[Dict]:
-        """Charger les fichiers de l'utilisateur depuis la base - IGNORER LES FICHIERS D'EXEMPLE"""
-        files_meta = self.db.query(models.UserFile).filter(
+    def _load_user_files(self, file_ids: Optional[List[int]] = None) -> List[Dict]:
+        """Charger les fichiers de l'utilisateur (tous, ou seulement `file_ids`) - IGNORER LES FICHIERS D'EXEMPLE"""
+        with _stage("load_files", user_id=self.user_id) as span:
+            files = self._read_user_files(file_ids)
+            span.set_attribute("files", len(files))
+            span.set_attribute("chars_read", sum(len(f["content"]) for f in files))
+        return files
+    
+    def _read_user_files(self, file_ids: Optional[List[int]] = None) -> List[Dict]:
+        query = self.db.query(models.UserFile).filter(
             models.UserFile.user_id == self.user_id
-        ).all()
+        )
+        if file_ids is not None:
+            query = query.filter(models.UserFile.id.in_(file_ids))
+        files_meta = query.all()
         
         files = []
         for meta in files_meta:
+            self.file_versions[meta.id] = meta.updated_at
             # FILTRER : ignorer COMPLÈTEMENT les fichiers d'exemple
             if (meta.title in self.EXAMPLE_FILES_TO_IGNORE or 
                 meta.filename in self.EXAMPLE_FILES_TO_IGNORE or
@@ -106,7 +190,9 @@ class PersonalRAGSystem:
                 content = self.file_manager.read_user_file(
                     self.client_id,
                     self.user_id,
-                    meta.file_path
+                    meta.file_path,
+                    content_hash=meta.content_hash,
+                    storage_encoding=meta.storage_encoding
                 )
                 
                 files.append({
@@ -138,6 +224,7 @@ class PersonalRAGSystem:
             # Charger les documents
             with open(index_file, 'rb') as f:
                 self.all_documents = pickle.load(f)
+            self.indexed_chars = sum(len(doc.page_content) for doc in self.all_documents)
             
             # Charger les métadonnées
             with open(meta_file, 'r', encoding='utf-8') as f:
@@ -186,10 +273,14 @@ class PersonalRAGSystem:
             return
         
         # Ajouter aux documents existants
-        self.all_documents.extend(new_documents)
-        
-        # Sauvegarder
-        self._save_index()
+        with _stage("build_index", user_id=self.user_id, documents_added=len(new_documents)) as span:
+            self.all_documents.extend(new_documents)
+            self.indexed_chars += sum(len(doc.page_content) for doc in new_documents)
+            
+            # Sauvegarder
+            self._save_index()
+            span.set_attribute("documents", len(self.all_documents))
+            span.set_attribute("indexed_chars", self.indexed_chars)
         
         logger.info(f"[User {self.user_id}] Index mis à jour: {len(new_documents)} nouveaux documents utilisateur")
     
@@ -275,78 +366,32 @@ class PersonalRAGSystem:
     
     def _search_simple(self, query: str, k: int = 5) -> List[Document]:
         """Recherche simple par mot-clé - POUR TOUTES LES QUESTIONS"""
+        return [doc for doc, score in self._search_scored(query, k)]
+    
+    def _search_scored(self, query: str, k: int = 5) -> List[Tuple[Document, int]]:
         if not self.all_documents:
             return []
         
-        query_lower = query.lower()
-        query_words = set(re.findall(r'\w+', query_lower))
-        
-        scored_docs = []
-        
-        for doc in self.all_documents:
-            # VÉRIFIER que ce n'est pas un fichier d'exemple
-            title = doc.metadata.get("title", "")
-            filename = doc.metadata.get("filename", "")
-            
-            if (title in self.EXAMPLE_FILES_TO_IGNORE or 
-                filename in self.EXAMPLE_FILES_TO_IGNORE):
-                continue  # IGNORER COMPLÈTEMENT
-            
-            content_lower = doc.page_content.lower()
-            title_lower = title.lower()
-            
-            # Score basé sur la pertinence GÉNÉRALE
-            score = 0
-            
-            # 1. Correspondance EXACTE avec le titre (très important)
-            for q_word in query_words:
-                if len(q_word) > 2 and q_word in title_lower:
-                    score += 20
-            
-            # 2. Correspondance dans le contenu
-            for q_word in query_words:
-                if len(q_word) > 3 and q_word in content_lower:
-                    score += 5
-            
-            # 3. Nombre de correspondances totales
-            total_matches = sum(1 for word in query_words if len(word) > 2 and word in content_lower)
-            score += total_matches * 3
-            
-            # 4. BONUS pour les phrases complètes dans le contenu
-            # Vérifier si des groupes de mots sont présents
-            if len(query_words) >= 2:
-                # Chercher des paires de mots
-                query_word_list = list(query_words)
-                for i in range(len(query_word_list)):
-                    for j in range(i+1, len(query_word_list)):
-                        word1 = query_word_list[i]
-                        word2 = query_word_list[j]
-                        if len(word1) > 2 and len(word2) > 2:
-                            if word1 in content_lower and word2 in content_lower:
-                                score += 15  # Bonus pour plusieurs mots trouvés
-            
-            # 5. BONUS pour documents récents (si date disponible)
-            # Pas de pénalités - on accepte tous les documents pertinents
-            
-            # SEUIL MODÉRÉ pour être considéré pertinent
-            if score >= 10:  # Seuil modéré pour questions générales
-                scored_docs.append((doc, score))
+        # VÉRIFIER que ce ne sont pas des fichiers d'exemple
+        documents = [
+            doc for doc in self.all_documents
+            if doc.metadata.get("title", "") not in self.EXAMPLE_FILES_TO_IGNORE
+            and doc.metadata.get("filename", "") not in self.EXAMPLE_FILES_TO_IGNORE
+        ]
+        scored_docs = rank_documents(documents, query, k)
         
         # Si pas de résultats PERTINENTS, retourner liste VIDE
         if not scored_docs:
             logger.info(f"[User {self.user_id}] Aucun document pertinent pour: '{query}'")
             return []
         
-        # Trier par score
-        scored_docs.sort(key=lambda x: x[1], reverse=True)
-        
         # Debug détaillé
         logger.info(f"[User {self.user_id}] Recherche: '{query}' - {len(scored_docs)} documents pertinents")
         for i, (doc, score) in enumerate(scored_docs[:3]):
             title = doc.metadata.get("title", "Sans titre")
             logger.info(f"  {i+1}. '{title}' - Score: {score}")
         
-        return [doc for doc, score in scored_docs[:k]]
+        return scored_docs
     
     def _extract_best_response(self, question: str, docs: List[Document]) -> Optional[str]:
         """Extraire la meilleure réponse des documents - POUR TOUTES LES QUESTIONS"""
@@ -464,12 +509,22 @@ class PersonalRAGSystem:
     
     def query(self, question: str) -> Dict[str, Any]:
         """Traiter une question utilisateur - POUR TOUTES LES QUESTIONS"""
+        with tracing.span("rag.query", user_id=self.user_id, question_chars=len(question)) as span:
+            result = self._answer(question)
+            span.set_attribute("has_results", result["has_results"])
+            span.set_attribute("quality", result["quality"])
+        return result
+    
+    def _answer(self, question: str) -> Dict[str, Any]:
         logger.info(f"[User {self.user_id}] Question: '{question}'")
         
-        # Vérifier si l'utilisateur a des documents (après filtrage des exemples)
-        user_files = self._load_user_files()
+        # Vérifier si l'utilisateur a des documents (après filtrage des exemples) ; chargés à la
+        # construction, tenus à jour par `sync` quand l'index est en cache
+        user_files = self.user_files
+        shared = self.shared_index
+        has_shared = shared is not None and bool(shared.documents)
         
-        if not user_files:
+        if not user_files and not has_shared:
             return {
                 "question": question,
                 "answer": "❌ Vous n'avez pas encore uploadé de documents personnels.",
@@ -480,7 +535,7 @@ class PersonalRAGSystem:
                 "quality": "vide"
             }
         
-        if not self.all_documents:
+        if not self.all_documents and not has_shared:
             return {
                 "question": question,
                 "answer": "❌ Aucun document indexé. Veuillez rafraîchir l'index RAG avec /my-files/rag/refresh",
@@ -492,12 +547,33 @@ class PersonalRAGSystem:
             }
         
         # Rechercher les documents pertinents
-        hybrid_results = self._hybrid_search(question, k=10)
-        relevant_docs = [doc for doc, _ in hybrid_results] if hybrid_results else []
+        with _stage("hybrid_search", chunks=len(self.all_chunks or self.all_documents),
+                    chars_scanned=self.indexed_chars, bm25=self.bm25_index is not None) as span:
+            hybrid_results = self._hybrid_search(question, k=10)
+            relevant_docs = [doc for doc, _ in hybrid_results] if hybrid_results else []
+            span.set_attribute("results", len(relevant_docs))
 
         # Si hybrid_search ne donne rien, fallback à la recherche simple
+        scored_docs = None
         if not relevant_docs:
-            relevant_docs = self._search_simple(question, k=5)
+            with _stage("search_simple", documents=len(self.all_documents), chars_scanned=self.indexed_chars) as span:
+                scored_docs = self._search_scored(question, k=5)
+                relevant_docs = [doc for doc, score in scored_docs]
+                span.set_attribute("results", len(relevant_docs))
+        
+        # Contenu partagé du client, filtré selon les droits de l'utilisateur
+        if has_shared:
+            with _stage("shared_search", client_id=self.client_id, documents=len(shared.documents),
+                        chars_scanned=shared.indexed_chars) as span:
+                shared_docs = shared.search(question, self.user_id, self.client_id, k=5)
+                span.set_attribute("results", len(shared_docs))
+            if scored_docs is not None:
+                # Même score par mot-clé des deux côtés : classement commun (fichiers personnels d'abord à égalité)
+                merged = sorted(scored_docs + shared_docs, key=lambda x: x[1], reverse=True)
+                relevant_docs = [doc for doc, score in merged[:5]]
+            else:
+                # Scores hybrides non comparables : le contenu partagé complète les résultats personnels
+                relevant_docs = (relevant_docs + [doc for doc, score in shared_docs])[:10]
         
         logger.info(f"[User {self.user_id}] Documents trouvés: {len(relevant_docs)}")
 
@@ -517,7 +593,10 @@ class PersonalRAGSystem:
             }
         
         # Générer une réponse
-        answer = self._extract_best_response(question, relevant_docs)
+        with _stage("extract_answer", documents=len(relevant_docs),
+                    chars_scanned=sum(len(doc.page_content) for doc in relevant_docs)) as span:
+            answer = self._extract_best_response(question, relevant_docs)
+            span.set_attribute("found", answer is not None)
 
         # Si pas de réponse pertinente
         if not answer:
@@ -587,6 +666,35 @@ class PersonalRAGSystem:
             "quality": quality
         }
     
+    def sync(self, db: Session) -> Dict[str, int]:
+        """Mise à jour incrémentale : seuls les fichiers ajoutés, modifiés ou supprimés sont relus"""
+        self.db = db
+        current = dict(db.query(models.UserFile.id, models.UserFile.updated_at).filter(
+            models.UserFile.user_id == self.user_id
+        ).all())
+        changed = {
+            file_id for file_id, updated_at in current.items()
+            if file_id not in self.file_versions or self.file_versions[file_id] != updated_at
+        }
+        indexed = {doc.metadata.get("file_id") for doc in self.all_documents}
+        removed = (indexed - current.keys()) | (indexed & changed)
+        
+        self.file_versions = {file_id: version for file_id, version in self.file_versions.items() if file_id in current}
+        self.ingested_file_ids -= removed | changed
+        if removed:
+            self.all_documents = [doc for doc in self.all_documents if doc.metadata.get("file_id") not in removed]
+            self.indexed_chars = sum(len(doc.page_content) for doc in self.all_documents)
+        
+        new_files = self._load_user_files(sorted(changed)) if changed else []
+        self.user_files = [f for f in self.user_files if f["id"] in current and f["id"] not in changed] + new_files
+        if new_files:
+            self._build_index()
+        elif removed:
+            self._save_index()
+        
+        logger.info(f"[User {self.user_id}] Index synchronisé: {len(new_files)} fichiers relus, {len(removed)} retirés")
+        return {"loaded": len(new_files), "removed": len(removed)}
+    
     def refresh(self):
         """Rafraîchir l'index avec les nouveaux fichiers"""
         # Recharger les fichiers
@@ -0,0 +1,271 @@
+"""Profilage à la demande (administrateurs) et instantanés mémoire `tracemalloc`.
+
+- Une requête envoyée par un administrateur avec l'en-tête ``X-Profile`` est
+  exécutée sous un profileur par échantillonnage : toutes les
+  ``PROFILE_INTERVAL_MS`` ms, les piles des threads qui exécutent l'endpoint sont
+  relevées. La réponse est remplacée par le profil : ``X-Profile: collapsed``
+  renvoie les piles repliées (format flamegraph.pl / speedscope), toute autre
+  valeur un JSON (fonctions les plus coûteuses + piles repliées).
+- `tracemalloc` n'est démarré que sur demande ; les instantanés donnent les plus
+  gros allocateurs et la différence avec l'instantané de référence.
+
+Sans en-tête ``X-Profile`` le middleware ne fait qu'un test sur les en-têtes ;
+``PROFILING=0`` le retire complètement. L'état `tracemalloc` est propre à chaque worker.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from database import SessionLocal
+import auth
+
+PROFILING = os.environ.get("PROFILING", "1").lower() not in ("0", "false", "no")
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "2"))
+PROFILE_TOP_FUNCTIONS = 30
+
+PROFILE_HEADER = b"x-profile"
+
+
+def _frame_name(code) -> str:
+    return f"{Path(code.co_filename).name}:{code.co_name}"
+
+
+class StackSampler:
+    """Échantillonnage des piles des threads qui exécutent l'endpoint de la requête
+
+    L'endpoint n'est connu qu'après le routage (``scope["endpoint"]``) : il est relu
+    à chaque relevé, et seules les piles qui le contiennent sont gardées (à partir de
+    son cadre).
+    """
+
+    def __init__(self, scope: Scope, interval: float):
+        self.scope = scope
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            endpoint = self.scope.get("endpoint")
+            target = getattr(endpoint, "__code__", None)
+            if target is None:
+                continue
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    if frame.f_code is target:
+                        self.stacks[tuple(reversed(stack))] += 1
+                        break
+                    frame = frame.f_back
+
+    def collapsed(self) -> str:
+        """Une ligne par pile : ``cadre;cadre;...;feuille nombre``"""
+        lines = Counter()
+        for stack, count in self.stacks.items():
+            lines[";".join(_frame_name(code) for code in stack)] += count
+        return "".join(f"{stack} {count}\n" for stack, count in lines.most_common())
+
+    def top_functions(self, limit: int = PROFILE_TOP_FUNCTIONS) -> List[Dict[str, Any]]:
+        """Échantillons propres (fonction en bout de pile) et cumulés par fonction"""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for code in set(stack):
+                total[code] += count
+        return [
+            {
+                "function": f"{_frame_name(code)} (ligne {code.co_firstlineno})",
+                "self_samples": own[code],
+                "total_samples": count,
+                "total_ms": round(count * self.interval * 1000, 1)
+            }
+            for code, count in total.most_common(limit)
+        ]
+
+
+def _profile_mode(scope: Scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return value.decode("latin-1").strip().lower() or "json"
+    return None
+
+
+def _is_admin(scope: Scope) -> bool:
+    """Jeton JWT / API Key d'un administrateur actif (vérifié seulement si X-Profile est présent)"""
+    authorization = dict(scope["headers"]).get(b"authorization", b"").decode("latin-1")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    with SessionLocal() as db:
+        try:
+            user = auth.get_current_user(HTTPAuthorizationCredentials(scheme=scheme, credentials=token), db)
+        except HTTPException:
+            return False
+        return bool(user.is_active and user.is_admin)
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI : profil d'une requête si un administrateur le demande (en-tête X-Profile)"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        mode = _profile_mode(scope) if scope["type"] == "http" else None
+        if mode is None or not await run_in_threadpool(_is_admin, scope):
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        body_size = 0
+
+        async def capture(message: Message):
+            nonlocal status_code, body_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                body_size += len(message.get("body", b""))
+
+        sampler = StackSampler(scope, PROFILE_INTERVAL_MS / 1000)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            sampler.stop()
+        duration = time.perf_counter() - start
+
+        if mode == "collapsed":
+            body = sampler.collapsed().encode("utf-8")
+            content_type = b"text/plain; charset=utf-8"
+        else:
+            body = json.dumps({
+                "method": scope["method"],
+                "path": scope["path"],
+                "status_code": status_code,
+                "response_bytes": body_size,
+                "duration_ms": round(duration * 1000, 1),
+                "interval_ms": PROFILE_INTERVAL_MS,
+                "samples": sampler.samples,
+                "top_functions": sampler.top_functions(),
+                "collapsed": sampler.collapsed()
+            }, ensure_ascii=False).encode("utf-8")
+            content_type = b"application/json"
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", content_type),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"x-profiled-status", str(status_code).encode("latin-1"))
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+# ==================== tracemalloc ====================
+
+_baseline: Optional[tracemalloc.Snapshot] = None
+_baseline_taken_at: Optional[float] = None
+
+TRACEMALLOC_GROUPS = ("filename", "lineno", "traceback")
+
+
+def start_tracemalloc(frames: int = 1) -> Dict[str, Any]:
+    global _baseline, _baseline_taken_at
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(max(1, min(frames, 50)))
+        _baseline, _baseline_taken_at = None, None
+    return tracemalloc_status()
+
+
+def stop_tracemalloc() -> Dict[str, Any]:
+    global _baseline, _baseline_taken_at
+    tracemalloc.stop()
+    _baseline, _baseline_taken_at = None, None
+    return tracemalloc_status()
+
+
+def tracemalloc_status() -> Dict[str, Any]:
+    tracing = tracemalloc.is_tracing()
+    current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+    return {
+        "tracing": tracing,
+        "frames": tracemalloc.get_traceback_limit() if tracing else None,
+        "traced_kb": round(current / 1024, 1),
+        "peak_kb": round(peak / 1024, 1),
+        "baseline_age_seconds": round(time.time() - _baseline_taken_at, 1) if _baseline_taken_at else None
+    }
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    if not tracemalloc.is_tracing():
+        raise HTTPException(status_code=409, detail="tracemalloc n'est pas démarré (POST /admin/debug/tracemalloc/start)")
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+
+
+def _location(stat, group_by: str) -> Any:
+    if group_by == "traceback":
+        return [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+    frame = stat.traceback[0]
+    return frame.filename if group_by == "filename" else f"{frame.filename}:{frame.lineno}"
+
+
+def top_allocations(group_by: str = "lineno", limit: int = 20, compare: bool = False,
+                    set_baseline: bool = False) -> Dict[str, Any]:
+    """Plus gros allocateurs ; avec `compare`, croissance depuis l'instantané de référence"""
+    global _baseline, _baseline_taken_at
+    if group_by not in TRACEMALLOC_GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by: {', '.join(TRACEMALLOC_GROUPS)}")
+    snapshot = _take_snapshot()
+    if compare:
+        if _baseline is None:
+            raise HTTPException(status_code=409, detail="Aucun instantané de référence (POST .../snapshot)")
+        stats = snapshot.compare_to(_baseline, group_by)
+        top = [{
+            "location": _location(stat, group_by),
+            "size_kb": round(stat.size / 1024, 1),
+            "size_diff_kb": round(stat.size_diff / 1024, 1),
+            "count": stat.count,
+            "count_diff": stat.count_diff
+        } for stat in stats[:limit]]
+    else:
+        stats = snapshot.statistics(group_by)
+        top = [{
+            "location": _location(stat, group_by),
+            "size_kb": round(stat.size / 1024, 1),
+            "count": stat.count
+        } for stat in stats[:limit]]
+    if set_baseline:
+        _baseline, _baseline_taken_at = snapshot, time.time()
+    return {**tracemalloc_status(), "group_by": group_by, "compared_to_baseline": compare, "top": top}
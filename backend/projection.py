@@ -0,0 +1,80 @@
+"""Projection des listes (`fields=`) : seules les colonnes demandées sont lues en base.
+
+``fields`` est une liste de champs séparés par des virgules, ou le nom d'une vue
+prédéfinie (``summary``). Sans ``fields``, les endpoints renvoient l'objet complet.
+
+Les lignes ORM partielles (``load_only``) sont validées directement par un schéma
+réduit aux champs demandés (`view_schema`), puis écrites en JSON par pydantic-core.
+"""
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+from pydantic import BaseModel, ConfigDict, create_model
+from sqlalchemy.orm import Query, load_only
+
+import models
+import schemas
+from json_responses import model_response
+
+DOCUMENT_FIELDS = ("id", "title", "content", "client_id", "user_id", "created_at", "updated_at", "size", "snippet")
+# Objet complet (sans les champs calculés, différés)
+DOCUMENT_DEFAULT_FIELDS = DOCUMENT_FIELDS[:7]
+DOCUMENT_VIEWS = {"summary": ("id", "title", "size", "updated_at", "snippet")}
+
+USER_FILE_FIELDS = (
+    "id", "title", "tags", "is_public", "filename", "original_filename", "client_id", "user_id",
+    "created_at", "updated_at", "file_size", "mime_type"
+)
+USER_FILE_VIEWS = {"summary": ("id", "title", "file_size", "mime_type", "updated_at")}
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str], views: Dict[str, Sequence[str]]) -> Optional[List[str]]:
+    """Liste ordonnée des champs demandés ; None pour l'objet complet"""
+    if not fields:
+        return None
+    if fields in views:
+        return list(views[fields])
+    requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in allowed]
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Champs inconnus: {', '.join(unknown) or fields}. "
+                   f"Disponibles: {', '.join(allowed)} (ou: {', '.join(views)})"
+        )
+    return requested
+
+
+def apply(query: Query, model, fields: Optional[List[str]]) -> Query:
+    """Ne charger que les colonnes demandées (la clé primaire est toujours lue)"""
+    if fields is None:
+        return query
+    return query.options(load_only(*(getattr(model, f) for f in fields), raiseload=True))
+
+
+@lru_cache(maxsize=256)
+def view_schema(view: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """Schéma `view` réduit à `fields` (dans cet ordre).
+
+    La validation `from_attributes` lit chaque champ du schéma : avec le schéma
+    complet, les colonnes non chargées lèveraient l'erreur de ``raiseload``.
+    """
+    return create_model(
+        f"{view.__name__}Projection",
+        __config__=ConfigDict(from_attributes=True),
+        **{f: (view.model_fields[f].annotation, None) for f in fields}
+    )
+
+
+def documents(query: Query, fields: Optional[List[str]]) -> Response:
+    fields = tuple(fields or DOCUMENT_DEFAULT_FIELDS)
+    rows = apply(query, models.Document, list(fields)).all()
+    return model_response(List[view_schema(schemas.DocumentView, fields)], rows)
+
+
+def user_files(query: Query, fields: Optional[List[str]]) -> Response:
+    fields = tuple(fields or USER_FILE_FIELDS)
+    rows = apply(query, models.UserFile, list(fields)).all()
+    return model_response(List[view_schema(schemas.UserFileView, fields)], rows)
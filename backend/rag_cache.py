@@ -0,0 +1,192 @@
+"""Index RAG personnels gardés en mémoire entre les requêtes, cohérents entre workers.
+
+Un `PersonalRAGSystem` est construit au premier appel d'un utilisateur puis réutilisé
+(LRU de ``RAG_CACHE_MAX_USERS`` utilisateurs). Avant de le servir, le worker relit le
+bus `change_events` : un événement sur les fichiers de l'utilisateur, publié par
+n'importe quel worker, marque l'index à synchroniser, et `PersonalRAGSystem.sync` ne
+relit que les fichiers ajoutés ou modifiés (et retire les supprimés).
+
+L'index partagé de chaque client (`shared_rag`, fichiers publics et documents) est gardé
+de la même façon (``RAG_SHARED_CACHE_MAX_CLIENTS`` clients) et rattaché à l'index
+personnel servi ; ``RAG_SHARED_INDEX=0`` le désactive.
+
+``RAG_CACHE_MAX_USERS=0`` désactive le cache : les index sont reconstruits à chaque requête.
+"""
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from sqlalchemy.orm import Session
+
+import change_events
+import metrics
+import models
+from personal_rag import PersonalRAGSystem
+from shared_rag import SharedKnowledgeIndex
+
+RAG_CACHE_MAX_USERS = int(os.environ.get("RAG_CACHE_MAX_USERS", "200"))
+RAG_SHARED_INDEX = os.environ.get("RAG_SHARED_INDEX", "1").lower() not in ("0", "false", "no")
+RAG_SHARED_CACHE_MAX_CLIENTS = int(os.environ.get("RAG_SHARED_CACHE_MAX_CLIENTS", "50"))
+
+# Événements qui peuvent modifier les fichiers d'un utilisateur
+_FILE_EVENTS = (change_events.FILES, change_events.DATA)
+# Événements qui peuvent modifier les fichiers publics ou les documents d'un client
+_SHARED_EVENTS = (change_events.FILES, change_events.DOCUMENTS, change_events.DATA)
+
+
+class _Entry:
+    __slots__ = ("system", "lock", "stale")
+
+    def __init__(self):
+        self.system = None
+        self.lock = threading.Lock()
+        self.stale = False
+
+
+class SharedIndexCache:
+    """Un index partagé par client ; verrou par entrée pendant la construction ou la synchronisation"""
+
+    def __init__(self, max_clients: int = RAG_SHARED_CACHE_MAX_CLIENTS):
+        self.max_clients = max_clients
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "syncs": 0, "evictions": 0}
+
+    def on_events(self, events):
+        with self._lock:
+            for event in events:
+                if event["kind"] not in _SHARED_EVENTS:
+                    continue
+                entry = self._entries.get(event["client_id"])
+                if entry is not None:
+                    entry.stale = True
+
+    def _entry(self, client_id: int) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(client_id)
+            if entry is None:
+                entry = self._entries[client_id] = _Entry()
+                while len(self._entries) > self.max_clients:
+                    self._entries.popitem(last=False)
+                    self.stats["evictions"] += 1
+            else:
+                self._entries.move_to_end(client_id)
+            return entry
+
+    def get(self, client_id: int, db: Session) -> SharedKnowledgeIndex:
+        """Index à jour du client (le bus `change_events` a été relu par l'appelant)"""
+        if not self.max_clients:
+            return SharedKnowledgeIndex(client_id, db)
+        entry = self._entry(client_id)
+        with entry.lock:
+            hit = entry.system is not None and not entry.stale
+            stale, entry.stale = entry.stale, False
+            if entry.system is None:
+                self.stats["misses"] += 1
+                entry.system = SharedKnowledgeIndex(client_id, db)
+            elif stale:
+                self.stats["syncs"] += 1
+                entry.system.sync(db)
+            else:
+                self.stats["hits"] += 1
+            metrics.record_cache("rag_shared_index", hit)
+            # Les recherches se font hors verrou, sur la liste de documents du moment
+            return entry.system
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"clients": len(self._entries), "max_clients": self.max_clients, **self.stats}
+
+
+class RAGIndexCache:
+    """Un index par utilisateur ; une requête à la fois par index (verrou par entrée)"""
+
+    def __init__(self, max_users: int = RAG_CACHE_MAX_USERS,
+                 shared: Optional[SharedIndexCache] = None):
+        self.max_users = max_users
+        self.shared = shared
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "syncs": 0, "evictions": 0}
+
+    def on_events(self, events):
+        with self._lock:
+            for event in events:
+                if event["kind"] not in _FILE_EVENTS:
+                    continue
+                entry = self._entries.get(event["user_id"])
+                if entry is not None:
+                    entry.stale = True
+
+    def _entry(self, user_id: int) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                entry = self._entries[user_id] = _Entry()
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+                    self.stats["evictions"] += 1
+            else:
+                self._entries.move_to_end(user_id)
+            return entry
+
+    @contextmanager
+    def use(self, user: models.User, db: Session) -> Iterator[PersonalRAGSystem]:
+        """Index à jour de l'utilisateur, réservé à l'appelant pendant le bloc"""
+        if not self.max_users:
+            system = PersonalRAGSystem(user.id, user.client_id, db)
+            system.shared_index = SharedKnowledgeIndex(user.client_id, db) if self.shared is not None else None
+            yield system
+            return
+
+        # Écritures commitées par ce worker ou par un autre depuis la dernière lecture
+        change_events.bus.poll()
+        entry = self._entry(user.id)
+        with entry.lock:
+            hit = entry.system is not None and not entry.stale
+            # Baissé avant la lecture des fichiers : un événement reçu pendant la lecture sera rejoué
+            stale, entry.stale = entry.stale, False
+            if entry.system is None:
+                self.stats["misses"] += 1
+                entry.system = PersonalRAGSystem(user.id, user.client_id, db)
+            elif stale:
+                self.stats["syncs"] += 1
+                entry.system.sync(db)
+            else:
+                self.stats["hits"] += 1
+                entry.system.db = db
+            metrics.record_cache("rag_index", hit)
+            entry.system.shared_index = self.shared.get(user.client_id, db) if self.shared is not None else None
+            try:
+                yield entry.system
+            finally:
+                entry.system.db = None
+                entry.system.shared_index = None
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            info = {"users": len(self._entries), "max_users": self.max_users, **self.stats}
+        if self.shared is not None:
+            info["shared"] = self.shared.info()
+        return info
+
+
+shared_index_cache = SharedIndexCache() if RAG_SHARED_INDEX else None
+rag_index_cache = RAGIndexCache(shared=shared_index_cache)
+change_events.bus.subscribe(rag_index_cache.on_events)
+if shared_index_cache is not None:
+    change_events.bus.subscribe(shared_index_cache.on_events)
@@ -0,0 +1,64 @@
+import logging
+import threading
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """Tâche de fond exécutée dans un thread daemon à intervalle régulier"""
+
+    def __init__(self, name: str, interval_seconds: float, func: Callable[[], object], run_at_start: bool = True):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.func = func
+        self.run_at_start = run_at_start
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=f"job-{self.name}", daemon=True)
+        self._thread.start()
+        logger.info(f"[Scheduler] Tâche '{self.name}' démarrée (toutes les {self.interval_seconds}s)")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        if not self.run_at_start and self._stop_event.wait(self.interval_seconds):
+            return
+        while not self._stop_event.is_set():
+            try:
+                self.func()
+            except Exception as e:
+                logger.error(f"[Scheduler] Échec de la tâche '{self.name}': {e}")
+            if self._stop_event.wait(self.interval_seconds):
+                return
+
+
+class JobRegistry:
+    """Registre des tâches périodiques démarrées avec l'application"""
+
+    def __init__(self):
+        self.jobs: Dict[str, PeriodicJob] = {}
+
+    def register(self, job: PeriodicJob) -> PeriodicJob:
+        self.jobs[job.name] = job
+        return job
+
+    def start_all(self):
+        for job in self.jobs.values():
+            job.start()
+
+    def stop_all(self):
+        for job in self.jobs.values():
+            job.stop()
+
+
+# Instance globale
+scheduler = JobRegistry()
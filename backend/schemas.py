@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 # Auth Schemas
 class UserBase(BaseModel):
@@ -39,7 +39,7 @@ class ApiKeyCreate(ApiKeyBase):
 
 class ApiKey(ApiKeyBase):
     id: int
-    key: str
+    key_prefix: str
     user_id: int
     client_id: int
     created_at: datetime
@@ -49,6 +49,9 @@ class ApiKey(ApiKeyBase):
     class Config:
         from_attributes = True
 
+class ApiKeyCreated(ApiKey):
+    key: str  # Clé complète, retournée une seule fois à la création
+
 # Client Schemas
 class ClientBase(BaseModel):
     name: str
@@ -84,6 +87,37 @@ class Document(DocumentBase):
     class Config:
         from_attributes = True
 
+class DocumentView(BaseModel):
+    """Document projeté (`fields=`) : seuls les champs demandés sont renvoyés"""
+    id: Optional[int] = None
+    title: Optional[str] = None
+    content: Optional[str] = None
+    client_id: Optional[int] = None
+    user_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    size: Optional[int] = None  # Longueur du contenu (caractères)
+    snippet: Optional[str] = None  # Début du contenu
+    
+    class Config:
+        from_attributes = True
+
+class DocumentImport(DocumentCreate):
+    """Ligne d'import en masse (dates conservées lors d'une migration)"""
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class DocumentBulkLine(BaseModel):
+    line: int
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class DocumentBulkResult(BaseModel):
+    created_count: int
+    error_count: int
+    aborted: Optional[str] = None
+    results: List[DocumentBulkLine]
+
 
 # ---- User file schemas ----
 class UserFileBase(BaseModel):
@@ -109,7 +143,6 @@ class UserFileMetadata(UserFileBase):
     id: int
     filename: str
     original_filename: Optional[str] = None
-    file_path: str
     client_id: int
     user_id: int
     created_at: datetime
@@ -121,6 +154,64 @@ class UserFileMetadata(UserFileBase):
         from_attributes = True
 
 
+class UserFileView(BaseModel):
+    """Fichier projeté (`fields=`) : seuls les champs demandés sont renvoyés"""
+    id: Optional[int] = None
+    title: Optional[str] = None
+    tags: Optional[str] = None
+    is_public: Optional[bool] = None
+    filename: Optional[str] = None
+    original_filename: Optional[str] = None
+    client_id: Optional[int] = None
+    user_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    file_size: Optional[int] = None
+    mime_type: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    total_size: int
+    title: Optional[str] = None
+    tags: Optional[str] = None
+    is_public: bool = False
+    part_size: Optional[int] = None  # Octets ; défaut côté serveur (UPLOAD_PART_SIZE_MB)
+
+
+class UploadSession(BaseModel):
+    id: str
+    filename: str
+    total_size: int
+    part_size: int
+    part_count: int
+    received_parts: List[int] = []
+    created_at: datetime
+    expires_at: datetime
+
+
+class UploadPartReceipt(BaseModel):
+    part_number: int
+    size: int
+    sha256: str
+
+
+class BulkUploadSkipped(BaseModel):
+    name: str
+    reason: str
+
+
+class BulkUploadResult(BaseModel):
+    imported_count: int
+    skipped_count: int
+    total_size_bytes: int
+    file_ids: List[int] = []
+    skipped: List[BulkUploadSkipped] = []
+
+
 class UserFileContent(BaseModel):
     id: int
     title: str
@@ -141,3 +232,7 @@ class UserStorageStats(BaseModel):
     total_size_bytes: int
     total_size_mb: float
     storage_path: str
+    by_mime_type: Dict[str, Dict[str, int]] = {}
+    quota_bytes: Optional[int] = None
+    client_total_size_bytes: int = 0
+    client_quota_bytes: Optional[int] = None
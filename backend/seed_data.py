@@ -0,0 +1,443 @@
+"""Génération de données synthétiques en volume (clients, utilisateurs, documents, fichiers).
+
+Exemples :
+
+    python seed_data.py --clients 20 --users-per-client 10 --documents-per-client 200 --files-per-user 5
+    python seed_data.py --clients 1000 --users-per-client 50 --documents-per-client 1000 \
+        --files-per-user 20 --workers 16
+
+Pour reproduire localement des volumes de production (benchmarks) :
+
+- insertions en masse (une requête multi-lignes par lot, un commit par groupe de
+  clients), sans requête par ligne ;
+- un seul hash de mot de passe par mot de passe distinct (tous les comptes
+  générés partagent `--password`), au lieu d'un hash pbkdf2 complet par utilisateur ;
+- fichiers écrits en parallèle par le driver de stockage configuré (``STORAGE_URL``),
+  avec la même compression et les mêmes empreintes qu'un upload ;
+- compteurs de stockage (`storage_usage`) et versions (`change_counters`) insérés
+  directement, déjà cohérents.
+
+Le contenu (texte français, titres, tags) est tiré d'un générateur initialisé par
+``--seed`` et par client : deux exécutions avec les mêmes paramètres produisent les
+mêmes données, quel que soit ``--workers``. Les clients générés s'appellent
+``<prefix>_000001``… ; une relance complète les clients manquants sans toucher aux
+existants.
+"""
+import argparse
+import io
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+import change_tracking
+import models
+import storage_accounting
+from auth import get_password_hash
+from database import SessionLocal, engine, upgrade_schema
+from file_storage import file_storage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREFIX = "seed"
+DEFAULT_PASSWORD = "password123"
+CLIENTS_PER_TRANSACTION = 20
+INSERT_BATCH_SIZE = 1000
+HISTORY_DAYS = 365
+
+# ==================== Texte ====================
+
+TOPICS = [
+    ("sinistre", "sinistres"), ("résiliation", "résiliations"), ("RC Pro", "rc-pro"),
+    ("contrat", "contrats"), ("facturation", "facturation"), ("recouvrement", "recouvrement"),
+    ("conformité", "conformité"), ("prévoyance", "prévoyance"), ("flotte automobile", "flotte"),
+    ("multirisque habitation", "habitation"), ("santé collective", "santé"), ("cyber-risques", "cyber"),
+    ("souscription", "souscription"), ("audit interne", "audit"), ("formation", "formation"),
+    ("relation client", "crm"), ("protection des données", "rgpd"), ("télétravail", "rh"),
+]
+DOCUMENT_KINDS = [
+    "Procédure", "Note interne", "Compte rendu", "Fiche produit", "Guide", "Checklist",
+    "Rapport", "Politique", "Mode opératoire", "FAQ",
+]
+SUBJECTS = [
+    "Le gestionnaire", "L'équipe gestion", "Le responsable conformité", "Le service client",
+    "L'assuré", "Le courtier", "La direction financière", "Le comité de pilotage",
+    "Le chargé de clientèle", "L'expert mandaté", "Le support technique", "Chaque collaborateur",
+]
+VERBS = [
+    "vérifie", "enregistre", "transmet", "valide", "archive", "met à jour", "contrôle",
+    "analyse", "signale", "complète", "relance", "documente", "planifie", "clôture",
+]
+OBJECTS = [
+    "le dossier", "la déclaration", "l'avenant", "la demande de résiliation", "le devis",
+    "la pièce justificative", "le rapport d'expertise", "l'échéancier", "la fiche client",
+    "le bordereau", "la réclamation", "le questionnaire de risque", "l'attestation",
+    "le procès-verbal", "la convention",
+]
+COMPLEMENTS = [
+    "dans le CRM", "sous 48h", "dans les 5 jours ouvrés", "avant la fin du mois",
+    "auprès de l'assureur", "dans l'espace documentaire", "selon la grille de délégation",
+    "après accord du responsable", "en cas de dossier sensible", "chaque semaine",
+    "lors du comité mensuel", "pour les contrats de plus de 10 000 €",
+    "conformément au RGPD", "avec copie au service juridique",
+]
+TOPIC_LINKS = ["pour le volet", "au titre du volet", "dans le cadre du volet"]
+CONNECTORS = ["Ensuite,", "En cas de doute,", "Par ailleurs,", "À défaut,", "Si nécessaire,", "De plus,"]
+FIRST_NAMES = [
+    "Camille", "Léa", "Hugo", "Lucas", "Manon", "Chloé", "Louis", "Emma", "Jules", "Inès",
+    "Arthur", "Sarah", "Nathan", "Julie", "Théo", "Claire", "Paul", "Alice", "Marc", "Zoé",
+]
+LAST_NAMES = [
+    "Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand", "Leroy",
+    "Moreau", "Simon", "Laurent", "Lefebvre", "Michel", "Garcia", "David", "Bertrand", "Roux",
+]
+COMPANY_WORDS = [
+    "Assurances", "Courtage", "Conseil", "Mutuelle", "Prévoyance", "Gestion", "Patrimoine",
+    "Services", "Risques", "Partenaires",
+]
+CITIES = ["Lyon", "Nantes", "Lille", "Bordeaux", "Rennes", "Toulouse", "Grenoble", "Dijon", "Reims", "Nice"]
+FILE_EXTENSIONS = [(".txt", "text/plain"), (".md", "text/markdown")]
+
+
+class FrenchTextGenerator:
+    """Texte français plausible (domaine assurance / gestion), reproductible à graine égale"""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    def sentence(self) -> str:
+        rng = self.rng
+        parts = [rng.choice(SUBJECTS), rng.choice(VERBS), rng.choice(OBJECTS)]
+        if rng.random() < 0.3:
+            parts.append(f"{rng.choice(TOPIC_LINKS)} {rng.choice(TOPICS)[0]}")
+        parts.append(rng.choice(COMPLEMENTS))
+        sentence = " ".join(parts) + "."
+        if rng.random() < 0.2:
+            connector = rng.choice(CONNECTORS)
+            sentence = f"{connector} {sentence[0].lower()}{sentence[1:]}"
+        return sentence
+
+    def paragraph(self, sentences: int) -> str:
+        return " ".join(self.sentence() for _ in range(max(1, sentences)))
+
+    def topic(self):
+        return self.rng.choice(TOPICS)
+
+    def title(self, topic: str) -> str:
+        return f"{self.rng.choice(DOCUMENT_KINDS)} {topic}"
+
+    def body(self, title: str, sentences: int) -> str:
+        """Titre puis paragraphes (et parfois une liste à puces), comme les documents fournis"""
+        rng = self.rng
+        lines = [title]
+        remaining = max(1, sentences)
+        while remaining > 0:
+            size = min(remaining, rng.randint(2, 5))
+            if rng.random() < 0.25:
+                lines.append("\n".join(f"• {self.sentence()}" for _ in range(size)))
+            else:
+                lines.append(self.paragraph(size))
+            remaining -= size
+        return "\n".join(lines)
+
+    def tags(self, topic_tag: str) -> str:
+        extra = self.rng.sample(TOPICS, k=self.rng.randint(0, 2))
+        return ",".join(dict.fromkeys([topic_tag] + [tag for _, tag in extra]))
+
+    def person(self) -> str:
+        return f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+
+    def company(self) -> str:
+        return f"{self.rng.choice(LAST_NAMES)} {self.rng.choice(COMPANY_WORDS)} {self.rng.choice(CITIES)}"
+
+    def date(self, now: datetime, days: int = HISTORY_DAYS) -> datetime:
+        return now - timedelta(seconds=self.rng.randint(0, days * 86400))
+
+
+def slugify(text: str) -> str:
+    table = str.maketrans("àâäçéèêëîïôöùûüœ", "aaaceeeeiioouuuo")
+    slug = "".join(c if c.isalnum() else "_" for c in text.lower().translate(table))
+    return "_".join(part for part in slug.split("_") if part)
+
+
+# ==================== Génération ====================
+
+class Seeder:
+    """Insertion des données synthétiques, par groupes de clients"""
+
+    def __init__(self, db: Session, clients: int, users_per_client: int = 10, admins_per_client: int = 1,
+                 documents_per_client: int = 100, files_per_user: int = 5, sentences: int = 12,
+                 public_ratio: float = 0.2, password: str = DEFAULT_PASSWORD, prefix: str = DEFAULT_PREFIX,
+                 seed: int = 0, workers: int = 8, batch_size: int = INSERT_BATCH_SIZE):
+        self.db = db
+        self.clients = clients
+        self.users_per_client = max(1, users_per_client)
+        self.admins_per_client = max(0, min(admins_per_client, self.users_per_client))
+        self.documents_per_client = max(0, documents_per_client)
+        self.files_per_user = max(0, files_per_user)
+        self.sentences = max(1, sentences)
+        self.public_ratio = public_ratio
+        self.prefix = prefix
+        self.seed = seed
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        # Un seul hash pour tous les comptes générés
+        self.hashed_password = get_password_hash(password)
+        self.now = datetime.utcnow()
+        self.stats = {
+            "clients": 0, "clients_skipped": 0, "users": 0, "documents": 0,
+            "files": 0, "file_bytes": 0, "stored_bytes": 0
+        }
+
+    def client_name(self, index: int) -> str:
+        return f"{self.prefix}_{index:06d}"
+
+    def _sentences(self, text: FrenchTextGenerator) -> int:
+        return text.rng.randint(max(1, self.sentences // 2), self.sentences * 3 // 2)
+
+    def _insert(self, model, rows: List[Dict[str, Any]], returning: bool = False) -> List[int]:
+        """Insertion multi-lignes par lots ; avec `returning`, identifiants dans l'ordre des lignes"""
+        ids: List[int] = []
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            if returning:
+                statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+                ids.extend(self.db.execute(statement, batch).scalars().all())
+            else:
+                self.db.execute(insert(model), batch)
+        return ids
+
+    # -- Plan d'un client (déterministe) --
+
+    def _plan_client(self, index: int) -> Dict[str, Any]:
+        text = FrenchTextGenerator(random.Random(f"{self.seed}-client-{index}"))
+        name = self.client_name(index)
+        domain = f"{name.replace('_', '-')}.example"
+        created_at = text.date(self.now, HISTORY_DAYS * 2)
+        users = []
+        for position in range(self.users_per_client):
+            is_admin = position < self.admins_per_client
+            users.append({
+                "email": f"{'admin' if is_admin else 'user'}{position:04d}@{domain}",
+                "full_name": text.person(),
+                "hashed_password": self.hashed_password,
+                "is_active": True,
+                "is_admin": is_admin,
+                "created_at": created_at + timedelta(minutes=position)
+            })
+        documents = []
+        for _ in range(self.documents_per_client):
+            topic, _ = text.topic()
+            title = text.title(topic)
+            when = text.date(self.now)
+            documents.append({
+                "title": title,
+                "content": text.body(title, self._sentences(text)),
+                "created_at": when,
+                "updated_at": when,
+                "user_position": text.rng.randrange(self.users_per_client)
+            })
+        files = []
+        for position in range(self.users_per_client):
+            for number in range(self.files_per_user):
+                topic, topic_tag = text.topic()
+                title = text.title(topic)
+                extension, mime_type = text.rng.choice(FILE_EXTENSIONS)
+                when = text.date(self.now)
+                files.append({
+                    "user_position": position,
+                    "filename": f"{number + 1:04d}_{slugify(title)}{extension}",
+                    "extension": extension,
+                    "title": title,
+                    "mime_type": mime_type,
+                    "tags": text.tags(topic_tag),
+                    "is_public": text.rng.random() < self.public_ratio,
+                    "created_at": when,
+                    "content": text.body(title.upper(), self._sentences(text)).encode("utf-8")
+                })
+        return {
+            "client": {
+                "name": name,
+                "company_name": text.company(),
+                "email": f"contact@{domain}",
+                "is_active": True,
+                "created_at": created_at
+            },
+            "users": users,
+            "documents": documents,
+            "files": files
+        }
+
+    # -- Écriture --
+
+    def _write_file(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        return file_storage.write_user_blob(item["client_id"], item["key"], io.BytesIO(item["content"]), item["extension"])
+
+    def _seed_group(self, plans: List[Dict[str, Any]], executor: ThreadPoolExecutor):
+        client_ids = self._insert(models.Client, [plan["client"] for plan in plans], returning=True)
+
+        user_rows = []
+        for plan, client_id in zip(plans, client_ids):
+            for user in plan["users"]:
+                user["client_id"] = client_id
+                user_rows.append(user)
+        user_ids = iter(self._insert(models.User, user_rows, returning=True))
+        for plan in plans:
+            plan["user_ids"] = [next(user_ids) for _ in plan["users"]]
+
+        document_rows = []
+        for plan, client_id in zip(plans, client_ids):
+            for document in plan["documents"]:
+                document_rows.append({
+                    "title": document["title"],
+                    "content": document["content"],
+                    "client_id": client_id,
+                    "user_id": plan["user_ids"][document["user_position"]],
+                    "created_at": document["created_at"],
+                    "updated_at": document["updated_at"]
+                })
+        self._insert(models.Document, document_rows)
+
+        # Fichiers : écriture parallèle des blobs, puis une insertion par lot
+        pending = []
+        for plan, client_id in zip(plans, client_ids):
+            for item in plan["files"]:
+                user_id = plan["user_ids"][item["user_position"]]
+                item["client_id"] = client_id
+                item["user_id"] = user_id
+                item["key"] = file_storage.get_user_prefix(client_id, user_id) + item["filename"]
+                pending.append(item)
+        file_rows = []
+        usage = defaultdict(lambda: [0, 0])
+        for item, blob in zip(pending, executor.map(self._write_file, pending)):
+            file_rows.append({
+                "filename": item["filename"],
+                "original_filename": item["filename"],
+                "file_path": item["key"],
+                "title": item["title"],
+                "client_id": item["client_id"],
+                "user_id": item["user_id"],
+                "created_at": item["created_at"],
+                "updated_at": item["created_at"],
+                "file_size": blob["file_size"],
+                "content_hash": blob["content_hash"],
+                "storage_encoding": blob["storage_encoding"],
+                "stored_size": blob["stored_size"] if blob["storage_encoding"] else None,
+                "mime_type": item["mime_type"],
+                "is_public": item["is_public"],
+                "tags": item["tags"]
+            })
+            for scope in (item["user_id"], storage_accounting.CLIENT_SCOPE):
+                counters = usage[(item["client_id"], scope, item["mime_type"])]
+                counters[0] += 1
+                counters[1] += blob["file_size"]
+            self.stats["file_bytes"] += blob["file_size"]
+            self.stats["stored_bytes"] += blob["stored_size"]
+            item["content"] = None
+        self._insert(models.UserFile, file_rows)
+
+        # Clients neufs : compteurs de stockage et versions créés directement
+        self._insert(models.StorageUsage, [
+            {"client_id": client_id, "user_id": user_id, "mime_type": mime_type,
+             "file_count": file_count, "total_bytes": total_bytes}
+            for (client_id, user_id, mime_type), (file_count, total_bytes) in usage.items()
+        ])
+        self._insert(models.ChangeCounter, [
+            {"scope": change_tracking.CLIENT_SCOPE, "scope_id": client_id, "version": 1}
+            for client_id in client_ids
+        ])
+        self.db.commit()
+
+        self.stats["clients"] += len(plans)
+        self.stats["users"] += len(user_rows)
+        self.stats["documents"] += len(document_rows)
+        self.stats["files"] += len(file_rows)
+
+    def run(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        names = [self.client_name(index) for index in range(1, self.clients + 1)]
+        existing = {
+            name for (name,) in self.db.query(models.Client.name).filter(
+                models.Client.name.like(f"{self.prefix}\\_%", escape="\\")
+            )
+        }
+        indexes = [index for index, name in enumerate(names, start=1) if name not in existing]
+        self.stats["clients_skipped"] = len(names) - len(indexes)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="seed") as executor:
+            for start_position in range(0, len(indexes), CLIENTS_PER_TRANSACTION):
+                group = indexes[start_position:start_position + CLIENTS_PER_TRANSACTION]
+                try:
+                    self._seed_group([self._plan_client(index) for index in group], executor)
+                except Exception:
+                    self.db.rollback()
+                    raise
+                logger.info(
+                    f"[Seed] {self.stats['clients']}/{len(indexes)} clients, {self.stats['users']} utilisateurs, "
+                    f"{self.stats['documents']} documents, {self.stats['files']} fichiers"
+                )
+
+        elapsed = time.perf_counter() - start
+        return {
+            **self.stats,
+            "seconds": round(elapsed, 1),
+            "rows_per_second": round(
+                (self.stats["clients"] + self.stats["users"] + self.stats["documents"] + self.stats["files"])
+                / elapsed if elapsed else 0.0
+            )
+        }
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Génération de données synthétiques en volume")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--users-per-client", type=int, default=10)
+    parser.add_argument("--admins-per-client", type=int, default=1)
+    parser.add_argument("--documents-per-client", type=int, default=100)
+    parser.add_argument("--files-per-user", type=int, default=5)
+    parser.add_argument("--sentences", type=int, default=12,
+                        help="Nombre moyen de phrases par document / fichier")
+    parser.add_argument("--public-ratio", type=float, default=0.2, help="Part des fichiers publics")
+    parser.add_argument("--password", default=DEFAULT_PASSWORD, help="Mot de passe de tous les comptes générés")
+    parser.add_argument("--prefix", default=DEFAULT_PREFIX, help="Préfixe des noms de clients générés")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=8, help="Écritures de fichiers en parallèle")
+    parser.add_argument("--batch-size", type=int, default=INSERT_BATCH_SIZE, help="Lignes par insertion")
+    args = parser.parse_args(argv)
+
+    models.Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+
+    db = SessionLocal()
+    try:
+        result = Seeder(
+            db,
+            clients=args.clients,
+            users_per_client=args.users_per_client,
+            admins_per_client=args.admins_per_client,
+            documents_per_client=args.documents_per_client,
+            files_per_user=args.files_per_user,
+            sentences=args.sentences,
+            public_ratio=args.public_ratio,
+            password=args.password,
+            prefix=args.prefix,
+            seed=args.seed,
+            workers=args.workers,
+            batch_size=args.batch_size
+        ).run()
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
+    return result
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
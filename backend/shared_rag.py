@@ -0,0 +1,154 @@
+"""Index RAG partagé d'un client : fichiers publics et documents du client.
+
+Le contenu commun à tous les utilisateurs d'un client n'est indexé qu'une fois par
+client (et par processus), au lieu d'une fois par index personnel. `PersonalRAGSystem`
+interroge cet index en plus du sien et fusionne les résultats.
+
+Droits appliqués à la recherche (`search`), comme pour les listes de l'API :
+
+- seuls les fichiers publics (``is_public``) et les documents du client sont indexés ;
+- les fichiers de l'utilisateur qui interroge sont exclus : ils sont dans son index
+  personnel, qui fait foi.
+
+`sync` ne relit que les fichiers et documents ajoutés ou modifiés depuis la dernière
+lecture (``updated_at``) ; un fichier redevenu privé ou supprimé est retiré.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import models
+from file_storage import file_storage
+from personal_rag import EXAMPLE_FILES_TO_IGNORE, Document, rank_documents
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_FILE = "public_file"
+CLIENT_DOCUMENT = "document"
+LOAD_BATCH_SIZE = 500  # Identifiants par requête IN (limite de variables SQLite)
+
+
+class SharedKnowledgeIndex:
+    """Documents partagés d'un client, recherchés par mot-clé comme l'index personnel"""
+
+    def __init__(self, client_id: int, db: Session, file_manager=file_storage):
+        self.client_id = client_id
+        self.file_manager = file_manager
+        # Remplacée d'un bloc à chaque `sync` : une recherche en cours garde la liste qu'elle parcourt
+        self.documents: List[Document] = []
+        self.versions: Dict[Tuple[str, int], Any] = {}
+        self.indexed_chars = 0
+        self.sync(db)
+
+    def _current_versions(self, db: Session) -> Dict[Tuple[str, int], Any]:
+        versions = {
+            (PUBLIC_FILE, file_id): updated_at
+            for file_id, updated_at in db.query(models.UserFile.id, models.UserFile.updated_at).filter(
+                models.UserFile.client_id == self.client_id,
+                models.UserFile.is_public == True
+            )
+        }
+        versions.update(
+            ((CLIENT_DOCUMENT, document_id), updated_at)
+            for document_id, updated_at in db.query(models.Document.id, models.Document.updated_at).filter(
+                models.Document.client_id == self.client_id
+            )
+        )
+        return versions
+
+    def sync(self, db: Session) -> Dict[str, int]:
+        """Mise à jour incrémentale depuis la base"""
+        current = self._current_versions(db)
+        changed = {key for key, updated_at in current.items() if self.versions.get(key) != updated_at}
+        kept = [
+            doc for doc in self.documents
+            if doc.metadata["key"] in current and doc.metadata["key"] not in changed
+        ]
+        removed = len(self.documents) - len(kept)
+        loaded = self._load_documents(db, changed)
+
+        self.documents = kept + loaded
+        self.versions = current
+        self.indexed_chars = sum(len(doc.page_content) for doc in self.documents)
+        if loaded or removed:
+            logger.info(f"[Client {self.client_id}] Index partagé synchronisé: "
+                        f"{len(loaded)} relus, {removed} retirés, {len(self.documents)} au total")
+        return {"loaded": len(loaded), "removed": removed}
+
+    def _load_documents(self, db: Session, keys) -> List[Document]:
+        file_ids = sorted(item_id for source, item_id in keys if source == PUBLIC_FILE)
+        document_ids = sorted(item_id for source, item_id in keys if source == CLIENT_DOCUMENT)
+        documents = []
+        for start in range(0, len(document_ids), LOAD_BATCH_SIZE):
+            batch = document_ids[start:start + LOAD_BATCH_SIZE]
+            for row in db.query(models.Document).filter(models.Document.id.in_(batch)):
+                documents.append(Document(
+                    page_content=row.content or "",
+                    metadata={
+                        "key": (CLIENT_DOCUMENT, row.id),
+                        "source": CLIENT_DOCUMENT,
+                        "document_id": row.id,
+                        "client_id": row.client_id,
+                        "owner_id": row.user_id,
+                        "title": row.title or "Document"
+                    }
+                ))
+        for start in range(0, len(file_ids), LOAD_BATCH_SIZE):
+            batch = file_ids[start:start + LOAD_BATCH_SIZE]
+            for meta in db.query(models.UserFile).filter(models.UserFile.id.in_(batch)):
+                document = self._read_public_file(meta)
+                if document is not None:
+                    documents.append(document)
+        return documents
+
+    def _read_public_file(self, meta: models.UserFile) -> Optional[Document]:
+        if (meta.title in EXAMPLE_FILES_TO_IGNORE or
+                meta.filename in EXAMPLE_FILES_TO_IGNORE or
+                (meta.original_filename and meta.original_filename in EXAMPLE_FILES_TO_IGNORE)):
+            return None
+        try:
+            content = self.file_manager.read_user_file(
+                meta.client_id,
+                meta.user_id,
+                meta.file_path,
+                content_hash=meta.content_hash,
+                storage_encoding=meta.storage_encoding
+            )
+        except Exception as e:
+            logger.error(f"[Client {self.client_id}] Erreur lecture fichier public {meta.filename}: {e}")
+            return None
+        return Document(
+            page_content=content,
+            metadata={
+                "key": (PUBLIC_FILE, meta.id),
+                "source": PUBLIC_FILE,
+                "file_id": meta.id,
+                "client_id": meta.client_id,
+                "owner_id": meta.user_id,
+                "title": meta.title,
+                "filename": meta.filename,
+                "tags": meta.tags
+            }
+        )
+
+    @staticmethod
+    def visible_to(doc: Document, user_id: int, client_id: int) -> bool:
+        if doc.metadata["client_id"] != client_id:
+            return False
+        # Mes fichiers publics sont déjà dans mon index personnel
+        return not (doc.metadata["source"] == PUBLIC_FILE and doc.metadata["owner_id"] == user_id)
+
+    def search(self, question: str, user_id: int, client_id: int, k: int = 5) -> List[Tuple[Document, int]]:
+        """Documents partagés pertinents visibles par l'utilisateur, avec leur score"""
+        documents = [doc for doc in self.documents if self.visible_to(doc, user_id, client_id)]
+        return rank_documents(documents, question, k)
+
+    def info(self) -> Dict[str, Any]:
+        sources = [doc.metadata["source"] for doc in self.documents]
+        return {
+            "client_id": self.client_id,
+            "public_files": sources.count(PUBLIC_FILE),
+            "documents": sources.count(CLIENT_DOCUMENT),
+            "indexed_chars": self.indexed_chars
+        }
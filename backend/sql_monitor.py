@@ -0,0 +1,131 @@
+"""Surveillance des requêtes SQL du moteur SQLAlchemy.
+
+- durée et nombre de requêtes par requête HTTP (métriques, en-tête ``Server-Timing``) ;
+- requêtes lentes (``SLOW_QUERY_MS``) journalisées avec leur plan
+  (``EXPLAIN QUERY PLAN`` sous SQLite, ``EXPLAIN`` ailleurs) ;
+- N+1 : une même requête (au texte près, paramètres liés) exécutée
+  ``N_PLUS_ONE_THRESHOLD`` fois dans une requête HTTP est signalée ;
+- budgets pour les tests : `assert_max_queries(n)` échoue si le bloc exécute plus
+  de `n` requêtes.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from sqlalchemy import event
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "100"))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("N_PLUS_ONE_THRESHOLD", "10"))
+EXPLAIN_SLOW_QUERIES = os.environ.get("EXPLAIN_SLOW_QUERIES", "1").lower() not in ("0", "false", "no")
+
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+_recorders: List[List[str]] = []
+_recorders_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _shape(statement: str) -> str:
+    return " ".join(statement.split())
+
+
+def explain(conn, statement: str, parameters) -> List[str]:
+    """Plan d'exécution d'une requête SELECT, sur la même connexion"""
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    if conn.dialect.name == "sqlite":
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    return [" ".join(str(value) for value in row) for row in rows]
+
+
+def _log_slow_query(conn, statement: str, parameters, executemany: bool, elapsed: float, route: str):
+    plan = []
+    if EXPLAIN_SLOW_QUERIES and not executemany and _EXPLAINABLE.match(statement):
+        try:
+            plan = explain(conn, statement, parameters)
+        except Exception as e:
+            plan = [f"EXPLAIN impossible: {e}"]
+    logger.warning(
+        f"[SQL] Requête lente ({elapsed * 1000:.1f} ms, {route}): {_shape(statement)}"
+        + "".join(f"\n    plan: {line}" for line in plan)
+    )
+
+
+def instrument_engine(engine):
+    """Installer la surveillance sur un moteur (une fois au démarrage)"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        # Sur le contexte d'exécution, jeté avec la requête : `after_cursor_execute`
+        # n'est pas appelé en cas d'erreur, rien ne doit rester sur la connexion
+        if context is not None:
+            context._sql_monitor_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_sql_monitor_start", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        stats = metrics.current_request()
+        route = stats.route if stats is not None else metrics.NO_ROUTE
+        metrics.DB_QUERY_SECONDS.labels(route).observe(elapsed)
+
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_seconds += elapsed
+            count = stats.statements.get(statement, 0) + 1
+            stats.statements[statement] = count
+            if count == N_PLUS_ONE_THRESHOLD:
+                logger.warning(
+                    f"[SQL] N+1 probable sur {route}: requête exécutée {count} fois "
+                    f"dans la même requête HTTP: {_shape(statement)}"
+                )
+        if _recorders:
+            with _recorders_lock:
+                for recorder in _recorders:
+                    recorder.append(statement)
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            _log_slow_query(conn, statement, parameters, executemany, elapsed, route)
+
+
+@contextmanager
+def record_queries() -> Iterator[List[str]]:
+    """Requêtes exécutées pendant le bloc, tous threads confondus (tests)"""
+    recorded: List[str] = []
+    with _recorders_lock:
+        _recorders.append(recorded)
+    try:
+        yield recorded
+    finally:
+        with _recorders_lock:
+            _recorders.remove(recorded)
+
+
+@contextmanager
+def assert_max_queries(max_queries: int) -> Iterator[List[str]]:
+    """Échouer (QueryBudgetExceeded) si le bloc exécute plus de `max_queries` requêtes"""
+    with record_queries() as recorded:
+        yield recorded
+    if len(recorded) > max_queries:
+        raise QueryBudgetExceeded(
+            f"{len(recorded)} requêtes SQL (budget: {max_queries}):\n"
+            + "\n".join(f"  {_shape(statement)}" for statement in recorded)
+        )
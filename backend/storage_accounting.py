@@ -0,0 +1,280 @@
+import logging
+import os
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import change_events
+import change_tracking
+import models
+from database import SessionLocal
+from file_storage import file_storage
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# user_id réservé à la ligne agrégée d'un client
+CLIENT_SCOPE = 0
+
+# Quotas par défaut (0 = illimité) ; Client.storage_quota_bytes surcharge le quota client
+USER_QUOTA_BYTES = int(os.environ.get("STORAGE_USER_QUOTA_MB", "0")) * 1024 * 1024
+CLIENT_QUOTA_BYTES = int(os.environ.get("STORAGE_CLIENT_QUOTA_MB", "0")) * 1024 * 1024
+
+# Intervalle de la réconciliation avec le disque (0 = désactivée)
+RECONCILE_INTERVAL_SECONDS = int(os.environ.get("STORAGE_RECONCILE_INTERVAL_SECONDS", "3600"))
+# Verrou partagé par les workers du nœud ; contient la date de la dernière réconciliation
+RECONCILE_LOCK_PATH = Path(tempfile.gettempdir()) / "storage_usage_reconcile.lock"
+
+
+def _apply_delta(db: Session, client_id: int, user_id: int, mime_type: str, files_delta: int, bytes_delta: int):
+    """Incrémenter (atomiquement, en SQL) les compteurs d'un scope ; créer la ligne si besoin"""
+    filters = (
+        models.StorageUsage.client_id == client_id,
+        models.StorageUsage.user_id == user_id,
+        models.StorageUsage.mime_type == mime_type,
+    )
+    values = {
+        models.StorageUsage.file_count: models.StorageUsage.file_count + files_delta,
+        models.StorageUsage.total_bytes: models.StorageUsage.total_bytes + bytes_delta,
+    }
+    if db.query(models.StorageUsage).filter(*filters).update(values, synchronize_session=False):
+        return
+
+    try:
+        with db.begin_nested():
+            db.add(models.StorageUsage(
+                client_id=client_id,
+                user_id=user_id,
+                mime_type=mime_type,
+                file_count=files_delta,
+                total_bytes=bytes_delta
+            ))
+    except IntegrityError:
+        # Ligne créée entre-temps par une autre requête
+        db.query(models.StorageUsage).filter(*filters).update(values, synchronize_session=False)
+
+
+def record_upload(db: Session, client_id: int, user_id: int, mime_type: str, size: int, count: int = 1):
+    """Comptabiliser un (ou plusieurs) fichier(s) ajouté(s) ; commité avec la ligne UserFile par l'appelant"""
+    for scope in (user_id, CLIENT_SCOPE):
+        _apply_delta(db, client_id, scope, mime_type or "application/octet-stream", count, size)
+    change_tracking.touch(db, client_id, user_id, change_events.FILES)
+
+
+def record_delete(db: Session, client_id: int, user_id: int, mime_type: str, size: int,
+                  file_id: Optional[int] = None):
+    """Décompter un fichier supprimé ; commité avec la suppression de la ligne UserFile par l'appelant"""
+    for scope in (user_id, CLIENT_SCOPE):
+        _apply_delta(db, client_id, scope, mime_type or "application/octet-stream", -1, -(size or 0))
+    change_tracking.touch(db, client_id, user_id, change_events.FILES, object_id=file_id)
+
+
+def record_resize(db: Session, client_id: int, user_id: int, mime_type: str, bytes_delta: int,
+                  file_id: Optional[int] = None):
+    """Corriger la taille comptabilisée d'un fichier existant"""
+    for scope in (user_id, CLIENT_SCOPE):
+        _apply_delta(db, client_id, scope, mime_type or "application/octet-stream", 0, bytes_delta)
+    change_tracking.touch(db, client_id, user_id, change_events.FILES, object_id=file_id)
+
+
+def _usage_totals(db: Session, client_id: int, user_id: int) -> Tuple[int, int, Dict[str, Dict[str, int]]]:
+    rows = db.query(models.StorageUsage).filter(
+        models.StorageUsage.client_id == client_id,
+        models.StorageUsage.user_id == user_id
+    ).all()
+    by_mime_type = {
+        row.mime_type: {"file_count": row.file_count, "total_size_bytes": row.total_bytes}
+        for row in rows if row.file_count
+    }
+    return (
+        sum(row.file_count for row in rows),
+        sum(row.total_bytes for row in rows),
+        by_mime_type
+    )
+
+
+def get_quotas(db: Session, client_id: int) -> Tuple[int, int]:
+    """Quotas (utilisateur, client) en octets ; 0 = illimité"""
+    client_quota = db.query(models.Client.storage_quota_bytes).filter(
+        models.Client.id == client_id
+    ).scalar()
+    return USER_QUOTA_BYTES, client_quota if client_quota is not None else CLIENT_QUOTA_BYTES
+
+
+def _used_bytes(db: Session, client_id: int, scope: int) -> int:
+    return db.query(func.coalesce(func.sum(models.StorageUsage.total_bytes), 0)).filter(
+        models.StorageUsage.client_id == client_id,
+        models.StorageUsage.user_id == scope
+    ).scalar()
+
+
+def check_quota(db: Session, client_id: int, user_id: int, incoming_bytes: int):
+    """Refuser un ajout qui dépasserait le quota utilisateur ou client"""
+    user_quota, client_quota = get_quotas(db, client_id)
+    for scope, quota, label in ((user_id, user_quota, "utilisateur"), (CLIENT_SCOPE, client_quota, "client")):
+        if not quota:
+            continue
+        used = _used_bytes(db, client_id, scope)
+        if used + incoming_bytes > quota:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Quota de stockage {label} dépassé ({used + incoming_bytes} / {quota} octets)"
+            )
+
+
+def check_quota_for_blob(db: Session, client_id: int, user_id: int, file_info: Dict[str, Any],
+                         storage=file_storage):
+    """`check_quota` pour un fichier déjà écrit : le blob est supprimé s'il est refusé"""
+    try:
+        check_quota(db, client_id, user_id, file_info["file_size"])
+    except HTTPException:
+        storage.delete_user_file(client_id, user_id, file_info["file_path"])
+        raise
+
+
+def get_remaining_quota(db: Session, client_id: int, user_id: int) -> Optional[int]:
+    """Octets encore disponibles pour un utilisateur (minimum des quotas utilisateur et client ; None = illimité)"""
+    user_quota, client_quota = get_quotas(db, client_id)
+    remaining = [
+        quota - _used_bytes(db, client_id, scope)
+        for scope, quota in ((user_id, user_quota), (CLIENT_SCOPE, client_quota))
+        if quota
+    ]
+    return max(0, min(remaining)) if remaining else None
+
+
+def get_usage_stats(db: Session, client_id: int, user_id: int) -> Dict[str, Any]:
+    """Statistiques de stockage lues depuis les compteurs (indépendant du nombre de fichiers)"""
+    file_count, total_size, by_mime_type = _usage_totals(db, client_id, user_id)
+    _, client_total_size, _ = _usage_totals(db, client_id, CLIENT_SCOPE)
+    user_quota, client_quota = get_quotas(db, client_id)
+
+    return {
+        "user_id": user_id,
+        "client_id": client_id,
+        "file_count": file_count,
+        "total_size_bytes": total_size,
+        "total_size_mb": round(total_size / (1024 * 1024), 2),
+        "storage_path": file_storage.describe_user_location(client_id, user_id),
+        "by_mime_type": by_mime_type,
+        "quota_bytes": user_quota or None,
+        "client_total_size_bytes": client_total_size,
+        "client_quota_bytes": client_quota or None
+    }
+
+
+def reconcile_usage(db: Session, client_id: Optional[int] = None, storage=file_storage) -> Dict[str, int]:
+    """Recalculer les compteurs à partir de `user_files` et des tailles réelles sur disque.
+
+    Les fichiers absents du disque ne sont pas comptés. Un upload concurrent peut être
+    écrasé par le recalcul ; il sera corrigé au passage suivant.
+    """
+    expected = defaultdict(lambda: [0, 0])
+
+    query = db.query(
+        models.UserFile.client_id,
+        models.UserFile.user_id,
+        models.UserFile.mime_type,
+        models.UserFile.file_path,
+        models.UserFile.file_size,
+        models.UserFile.storage_encoding
+    )
+    if client_id is not None:
+        query = query.filter(models.UserFile.client_id == client_id)
+
+    for row_client_id, row_user_id, mime_type, file_path, file_size, storage_encoding in query.yield_per(1000):
+        blob = storage.stat_user_file(file_path)
+        if blob is None:
+            continue
+        # Les quotas portent sur la taille logique (celle du fichier envoyé), même compressé
+        size = file_size if storage_encoding else blob["size"]
+        mime_type = mime_type or "application/octet-stream"
+        for scope in (row_user_id, CLIENT_SCOPE):
+            counters = expected[(row_client_id, scope, mime_type)]
+            counters[0] += 1
+            counters[1] += size
+
+    existing_query = db.query(models.StorageUsage)
+    if client_id is not None:
+        existing_query = existing_query.filter(models.StorageUsage.client_id == client_id)
+
+    corrected = 0
+    changed_scopes = set()
+    for usage in existing_query.all():
+        file_count, total_bytes = expected.pop((usage.client_id, usage.user_id, usage.mime_type), (0, 0))
+        if (usage.file_count, usage.total_bytes) != (file_count, total_bytes):
+            usage.file_count = file_count
+            usage.total_bytes = total_bytes
+            changed_scopes.add((usage.client_id, usage.user_id))
+            corrected += 1
+
+    for (row_client_id, scope, mime_type), (file_count, total_bytes) in expected.items():
+        db.add(models.StorageUsage(
+            client_id=row_client_id,
+            user_id=scope,
+            mime_type=mime_type,
+            file_count=file_count,
+            total_bytes=total_bytes
+        ))
+        changed_scopes.add((row_client_id, scope))
+        corrected += 1
+
+    # Statistiques modifiées : invalider les ETag correspondants
+    for row_client_id, scope in changed_scopes:
+        change_tracking.touch(db, row_client_id, scope if scope != CLIENT_SCOPE else None, change_events.STORAGE)
+
+    db.commit()
+    if corrected:
+        logger.info(f"[Storage] Réconciliation des compteurs : {corrected} ligne(s) corrigée(s)")
+    return {"corrected_rows": corrected}
+
+
+def counters_match_rows(db: Session) -> bool:
+    """Contrôle rapide (SQL seul) : nombre de fichiers des compteurs clients = lignes `user_files`"""
+    counted = db.query(func.coalesce(func.sum(models.StorageUsage.file_count), 0)).filter(
+        models.StorageUsage.user_id == CLIENT_SCOPE
+    ).scalar()
+    return counted == db.query(func.count(models.UserFile.id)).scalar()
+
+
+def run_reconciliation_job(lock_path: Path = RECONCILE_LOCK_PATH) -> Optional[Dict[str, int]]:
+    """Point d'entrée de la tâche périodique.
+
+    Chaque worker uvicorn enregistre la tâche : un seul à la fois la lance (verrou de
+    fichier), et une passe récente du nœud (moins d'un demi-intervalle) dispense les
+    autres du parcours du stockage tant que les compteurs sont cohérents avec `user_files`.
+    Les workers démarrés ensemble ne font ainsi qu'une passe.
+    """
+    with open(lock_path, "a+") as lock_file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return None  # Un autre worker réconcilie déjà
+        lock_file.seek(0)
+        try:
+            last_run = float(lock_file.read().strip() or 0)
+        except ValueError:
+            last_run = 0
+        db = SessionLocal()
+        try:
+            if time.time() - last_run < RECONCILE_INTERVAL_SECONDS / 2 and counters_match_rows(db):
+                return None
+            result = reconcile_usage(db)
+        finally:
+            db.close()
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(time.time()))
+        return result
@@ -0,0 +1,310 @@
+"""Réconciliation stockage / base et ramasse-miettes des fichiers orphelins.
+
+Deux phases, traitées par lots bornés et reprenables (point de reprise dans le stockage) :
+
+1. ``storage`` : parcours trié des clés du driver ; les fichiers sans ligne `user_files`
+   sont mis en quarantaine (ou supprimés), les tailles divergentes sont corrigées.
+2. ``rows`` : parcours de `user_files` par id ; les lignes dont le fichier a disparu
+   sont signalées (et supprimées avec ``delete_dangling_rows``).
+
+Utilisation en ligne de commande :
+
+    python storage_gc.py --mode report
+    python storage_gc.py --mode quarantine --batch-size 200 --ops-per-second 500
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+import models
+import storage_accounting
+from database import SessionLocal
+from file_storage import file_storage
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MODES = ("report", "quarantine", "delete")
+
+# Configuration de la tâche de fond
+GC_INTERVAL_SECONDS = int(os.environ.get("STORAGE_GC_INTERVAL_SECONDS", "900"))
+GC_MODE = os.environ.get("STORAGE_GC_MODE", "quarantine")
+GC_BATCHES_PER_RUN = int(os.environ.get("STORAGE_GC_BATCHES_PER_RUN", "20"))
+GC_OPS_PER_SECOND = float(os.environ.get("STORAGE_GC_OPS_PER_SECOND", "200"))
+
+
+class StorageReconciler:
+    """Réconciliateur incrémental entre l'arborescence de stockage et `user_files`"""
+
+    def __init__(
+        self,
+        storage=file_storage,
+        batch_size: int = 500,
+        mode: str = "quarantine",
+        grace_seconds: int = 3600,
+        ops_per_second: float = 0.0,
+        delete_dangling_rows: bool = False,
+        repair_sizes: bool = True,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Mode inconnu: {mode} (attendu: {', '.join(MODES)})")
+        self.storage = storage
+        self.driver = storage.driver
+        self.batch_size = batch_size
+        self.mode = mode
+        self.grace_seconds = grace_seconds
+        self.ops_per_second = ops_per_second
+        self.delete_dangling_rows = delete_dangling_rows
+        self.repair_sizes = repair_sizes
+
+        # Point de reprise partagé via le stockage ; verrou inter-processus local au nœud
+        self.state_key = ".gc/state.json"
+        self.lock_path = Path(tempfile.gettempdir()) / "storage_gc.lock"
+        self.quarantine_prefix = ".quarantine/"
+        self._lock = threading.Lock()
+
+        self.state = self._load_state()
+        self.metrics: Dict[str, Any] = {
+            "running": False,
+            "phase": self.state["phase"],
+            "passes_completed": 0,
+            "batches": 0,
+            "files_scanned": 0,
+            "rows_scanned": 0,
+            "orphan_files": 0,
+            "orphan_bytes": 0,
+            "quarantined_files": 0,
+            "deleted_files": 0,
+            "dangling_rows": 0,
+            "deleted_rows": 0,
+            "repaired_sizes": 0,
+            "last_batch_at": None,
+            "last_pass_completed_at": None,
+        }
+
+    # ---- point de reprise ----
+
+    def _initial_state(self) -> Dict[str, Any]:
+        return {"phase": "storage", "last_key": None, "last_row_id": 0,
+                "pass_started_at": datetime.utcnow().isoformat()}
+
+    def _load_state(self) -> Dict[str, Any]:
+        try:
+            return json.loads(self.driver.read_bytes(self.state_key))
+        except (OSError, ValueError):
+            return self._initial_state()
+
+    def _save_state(self):
+        self.driver.put_bytes(self.state_key, json.dumps(self.state).encode("utf-8"))
+
+    # ---- parcours du stockage ----
+
+    def _next_storage_batch(self) -> List[Dict[str, Any]]:
+        return list(itertools.islice(
+            self.driver.list("", start_after=self.state["last_key"]),
+            self.batch_size
+        ))
+
+    def _age_seconds(self, modified_at: datetime) -> float:
+        now = datetime.now(timezone.utc) if modified_at.tzinfo else datetime.now()
+        return (now - modified_at).total_seconds()
+
+    def _handle_orphan(self, blob: Dict[str, Any]):
+        key = blob["key"]
+        self.metrics["orphan_files"] += 1
+        self.metrics["orphan_bytes"] += blob["size"]
+        if self.mode == "quarantine":
+            self.driver.move(key, self.quarantine_prefix + key)
+            self.metrics["quarantined_files"] += 1
+            logger.info(f"[GC] Fichier orphelin mis en quarantaine: {key}")
+        elif self.mode == "delete":
+            self.driver.delete(key)
+            self.metrics["deleted_files"] += 1
+            logger.info(f"[GC] Fichier orphelin supprimé: {key}")
+        else:
+            logger.info(f"[GC] Fichier orphelin détecté: {key}")
+
+    def _process_storage_batch(self, db: Session, batch: List[Dict[str, Any]]) -> int:
+        names = {blob["key"].rsplit("/", 1)[-1] for blob in batch}
+        rows_by_key: Dict[str, List[models.UserFile]] = {}
+        for row in db.query(models.UserFile).filter(models.UserFile.filename.in_(names)).all():
+            if row.file_path:
+                rows_by_key.setdefault(self.storage.resolve_key(row.file_path), []).append(row)
+
+        for blob in batch:
+            self.metrics["files_scanned"] += 1
+            rows = rows_by_key.get(blob["key"])
+
+            if not rows:
+                if self._age_seconds(blob["modified_at"]) >= self.grace_seconds:
+                    self._handle_orphan(blob)
+                continue
+
+            if self.repair_sizes:
+                for row in rows:
+                    if row.storage_encoding:
+                        # Blob compressé : la taille physique est `stored_size`, `file_size` reste logique
+                        if row.stored_size != blob["size"]:
+                            row.stored_size = blob["size"]
+                            self.metrics["repaired_sizes"] += 1
+                        continue
+                    if row.file_size != blob["size"]:
+                        storage_accounting.record_resize(
+                            db, row.client_id, row.user_id, row.mime_type,
+                            blob["size"] - (row.file_size or 0), file_id=row.id
+                        )
+                        row.file_size = blob["size"]
+                        self.metrics["repaired_sizes"] += 1
+
+        db.commit()
+        self.state["last_key"] = batch[-1]["key"]
+        return len(batch)
+
+    # ---- parcours de la base ----
+
+    def _process_rows_batch(self, db: Session) -> int:
+        rows = db.query(models.UserFile).filter(
+            models.UserFile.id > self.state["last_row_id"]
+        ).order_by(models.UserFile.id).limit(self.batch_size).all()
+        if not rows:
+            return 0
+
+        for row in rows:
+            self.metrics["rows_scanned"] += 1
+            if self.storage.stat_user_file(row.file_path) is not None:
+                continue
+            self.metrics["dangling_rows"] += 1
+            logger.info(f"[GC] Ligne user_files {row.id} sans fichier physique: {row.file_path}")
+            if self.delete_dangling_rows:
+                storage_accounting.record_delete(db, row.client_id, row.user_id, row.mime_type, row.file_size, file_id=row.id)
+                db.delete(row)
+                self.metrics["deleted_rows"] += 1
+
+        db.commit()
+        self.state["last_row_id"] = rows[-1].id
+        return len(rows)
+
+    # ---- exécution ----
+
+    def _throttle(self, operations: int, started: float):
+        if self.ops_per_second <= 0 or not operations:
+            return
+        remaining = operations / self.ops_per_second - (time.monotonic() - started)
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def run_batch(self, db: Session) -> bool:
+        """Traiter un lot ; retourne True quand une passe complète vient de se terminer"""
+        started = time.monotonic()
+        if self.state["phase"] == "storage":
+            batch = self._next_storage_batch()
+            processed = self._process_storage_batch(db, batch) if batch else 0
+            if not batch:
+                self.state["phase"] = "rows"
+        else:
+            processed = self._process_rows_batch(db)
+            if not processed:
+                self.state = self._initial_state()
+                self.metrics["passes_completed"] += 1
+                self.metrics["last_pass_completed_at"] = datetime.utcnow().isoformat()
+
+        self.metrics["batches"] += 1
+        self.metrics["phase"] = self.state["phase"]
+        self.metrics["last_batch_at"] = datetime.utcnow().isoformat()
+        self._save_state()
+        self._throttle(processed, started)
+        return processed == 0 and self.state["phase"] == "storage" and self.state["last_key"] is None
+
+    def run(self, db: Session, max_batches: Optional[int] = None) -> Dict[str, Any]:
+        """Traiter des lots jusqu'à la fin de la passe (ou `max_batches`), sous verrou"""
+        if not self._lock.acquire(blocking=False):
+            return self.get_metrics()
+        lock_file = open(self.lock_path, "w")
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return self.get_metrics()  # Un autre processus réconcilie déjà
+            self.state = self._load_state()
+            self.metrics["running"] = True
+            batches = 0
+            while max_batches is None or batches < max_batches:
+                batches += 1
+                if self.run_batch(db):
+                    break
+        finally:
+            self.metrics["running"] = False
+            lock_file.close()
+            self._lock.release()
+        return self.get_metrics()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {**self.metrics, "mode": self.mode, "checkpoint": dict(self.state)}
+
+
+# Instance utilisée par la tâche de fond et l'administration
+reconciler = StorageReconciler(
+    mode=GC_MODE if GC_MODE in MODES else "report",
+    ops_per_second=GC_OPS_PER_SECOND
+)
+
+
+def run_gc_job():
+    """Point d'entrée de la tâche périodique : quelques lots par exécution"""
+    db = SessionLocal()
+    try:
+        return reconciler.run(db, max_batches=GC_BATCHES_PER_RUN)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Réconciliation stockage / base et nettoyage des orphelins")
+    parser.add_argument("--mode", choices=MODES, default="report")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--max-batches", type=int, default=None)
+    parser.add_argument("--grace-seconds", type=int, default=3600,
+                        help="Âge minimal d'un fichier orphelin avant traitement (uploads en cours)")
+    parser.add_argument("--ops-per-second", type=float, default=0.0, help="Limite d'opérations d'E/S (0 = illimité)")
+    parser.add_argument("--delete-dangling-rows", action="store_true")
+    parser.add_argument("--no-repair-sizes", action="store_true")
+    parser.add_argument("--reset", action="store_true", help="Ignorer le point de reprise et repartir du début")
+    args = parser.parse_args()
+
+    gc = StorageReconciler(
+        batch_size=args.batch_size,
+        mode=args.mode,
+        grace_seconds=args.grace_seconds,
+        ops_per_second=args.ops_per_second,
+        delete_dangling_rows=args.delete_dangling_rows,
+        repair_sizes=not args.no_repair_sizes,
+    )
+    if args.reset:
+        gc.state = gc._initial_state()
+        gc._save_state()
+
+    db = SessionLocal()
+    try:
+        metrics = gc.run(db, max_batches=args.max_batches)
+    finally:
+        db.close()
+    print(json.dumps(metrics, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
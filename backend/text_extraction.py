@@ -0,0 +1,266 @@
+import gzip
+import hashlib
+import logging
+import os
+import re
+import threading
+import unicodedata
+import zipfile
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import BinaryIO, Callable, Dict, Optional
+
+import metrics
+
+# Optional PDF dependency (best-effort)
+try:
+    from pypdf import PdfReader
+except Exception:
+    PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_WORKERS = int(os.environ.get("TEXT_EXTRACTION_WORKERS", "2"))
+EXTRACTION_TIMEOUT_SECONDS = int(os.environ.get("TEXT_EXTRACTION_TIMEOUT_SECONDS", "120"))
+
+# Extensions lues directement (pas de cache : le décodage coûte moins qu'une lecture de cache)
+PLAIN_TEXT_EXTENSIONS = {".txt", ".md"}
+
+_EXTRACTORS: Dict[str, Callable[[bytes], str]] = {}
+
+
+def register_extractor(*extensions: str):
+    """Enregistrer un extracteur `bytes -> texte` pour une ou plusieurs extensions"""
+    def decorator(func: Callable[[bytes], str]):
+        for extension in extensions:
+            _EXTRACTORS[extension.lower()] = func
+        return func
+    return decorator
+
+
+def decode_text(data: bytes) -> str:
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("cp1252", errors="replace")
+
+
+def normalize_text(text: str) -> str:
+    """Normalisation commune : NFC, espaces compactés, lignes vides fusionnées"""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    lines = [re.sub(r"[ \t ]+", " ", line).strip() for line in text.split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+@register_extractor(".txt", ".md")
+def extract_plain_text(data: bytes) -> str:
+    return decode_text(data)
+
+
+@register_extractor(".docx")
+def extract_docx(data: bytes) -> str:
+    """DOCX : archive zip ; le texte est dans word/document.xml (<w:t>, un paragraphe par <w:p>)"""
+    with zipfile.ZipFile(BytesIO(data)) as archive:
+        xml = archive.read("word/document.xml").decode("utf-8")
+    paragraphs = []
+    for paragraph in re.findall(r"<w:p[ >].*?</w:p>", xml, flags=re.S):
+        runs = re.findall(r"<w:t(?: [^>]*)?>([^<]*)</w:t>", paragraph)
+        paragraphs.append("".join(runs))
+    text = "\n".join(paragraphs)
+    for entity, char in (("&lt;", "<"), ("&gt;", ">"), ("&quot;", '"'), ("&apos;", "'"), ("&amp;", "&")):
+        text = text.replace(entity, char)
+    return text
+
+
+def _pdf_text_operators(content: bytes) -> str:
+    """Extraction minimale des chaînes des opérateurs Tj/TJ d'un flux de contenu PDF"""
+    pieces = []
+    for block in re.findall(rb"BT(.*?)ET", content, flags=re.S):
+        for string in re.findall(rb"\(((?:\\.|[^\\)])*)\)", block):
+            string = re.sub(rb"\\([nrtbf()\\])", lambda m: {b"n": b"\n", b"r": b"", b"t": b"\t"}.get(m.group(1), m.group(1)), string)
+            pieces.append(string.decode("latin-1"))
+        pieces.append("\n")
+    return "".join(pieces)
+
+
+@register_extractor(".pdf")
+def extract_pdf(data: bytes) -> str:
+    if PdfReader is not None:
+        reader = PdfReader(BytesIO(data))
+        return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+
+    # Sans pypdf : décompresser les flux FlateDecode et lire les opérateurs texte
+    texts = []
+    for stream in re.findall(rb"stream\r?\n(.*?)\r?\nendstream", data, flags=re.S):
+        try:
+            stream = zlib.decompress(stream)
+        except zlib.error:
+            pass
+        texts.append(_pdf_text_operators(stream))
+    return "\n".join(t for t in texts if t.strip())
+
+
+@register_extractor(".doc")
+def extract_legacy_doc(data: bytes) -> str:
+    """Word 97-2003 : meilleure approximation sans dépendance (séquences de texte UTF-16LE)"""
+    runs = re.findall(rb"(?:[\x20-\x7e\xa0-\xff]\x00|\n\x00|\r\x00){4,}", data)
+    return "\n".join(run.decode("utf-16-le", errors="ignore") for run in runs)
+
+
+def _run_extractor(extension: str, data: bytes) -> str:
+    """Exécuté dans un processus du pool"""
+    extractor = _EXTRACTORS.get(extension)
+    if extractor is None:
+        return ""
+    return normalize_text(extractor(data))
+
+
+class _HashingReader:
+    """Flux en lecture qui calcule le SHA-256 de ce qui le traverse (hachage pendant l'upload)"""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self.sha256.hexdigest()
+
+
+class TextExtractionService:
+    """Extraction de texte une seule fois par contenu (SHA-256), dans un pool de processus.
+
+    Le texte normalisé est stocké compressé à côté des blobs, sous
+    ``.extracted/<h[:2]>/<hash>.txt.gz`` (clé cachée : ignorée par les listes et le GC).
+    """
+
+    def __init__(self, driver, workers: int = EXTRACTION_WORKERS):
+        self.driver = driver
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"cache_hits": 0, "cache_misses": 0, "extractions": 0, "failures": 0}
+
+    @staticmethod
+    def hashing_reader(stream: BinaryIO) -> _HashingReader:
+        return _HashingReader(stream)
+
+    @staticmethod
+    def supports(extension: str) -> bool:
+        return extension.lower() in _EXTRACTORS
+
+    def cache_key(self, content_hash: str) -> str:
+        return f".extracted/{content_hash[:2]}/{content_hash}.txt.gz"
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._pool is None:
+                try:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                except (OSError, NotImplementedError) as e:
+                    # Environnement sans multiprocessing : extraction dans le processus courant
+                    logger.warning(f"[Extraction] Pool de processus indisponible: {e}")
+                    self.workers = 0
+            return self._pool
+
+    def _extract(self, extension: str, data: bytes) -> str:
+        pool = self._get_pool()
+        if pool is None:
+            return _run_extractor(extension, data)
+        try:
+            return pool.submit(_run_extractor, extension, data).result(timeout=EXTRACTION_TIMEOUT_SECONDS)
+        except BrokenProcessPool:
+            # Un processus du pool est mort (fichier piégé, OOM) : recréer le pool au prochain appel
+            self._discard_pool(pool)
+            raise
+        except FutureTimeoutError:
+            # L'extracteur bloqué continuerait d'occuper son processus : arrêter le pool
+            logger.warning(f"[Extraction] Délai de {EXTRACTION_TIMEOUT_SECONDS}s dépassé, pool de processus redémarré")
+            self._discard_pool(pool, terminate=True)
+            raise
+
+    def _discard_pool(self, pool: ProcessPoolExecutor, terminate: bool = False):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        if terminate:
+            # Pas d'API publique avant Python 3.14 (`terminate_workers`)
+            for process in list((pool._processes or {}).values()):
+                process.terminate()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def read_cached(self, content_hash: str) -> Optional[str]:
+        try:
+            return gzip.decompress(self.driver.read_bytes(self.cache_key(content_hash))).decode("utf-8")
+        except (OSError, EOFError):
+            return None
+
+    def get_text(self, key: str, extension: str, content_hash: Optional[str] = None) -> str:
+        """Texte normalisé d'un blob ; extrait puis mis en cache au premier accès"""
+        extension = extension.lower()
+        data = None
+        if content_hash is None:
+            data = self.driver.read_bytes(key)
+            content_hash = hashlib.sha256(data).hexdigest()
+
+        cached = self.read_cached(content_hash)
+        metrics.record_cache("extracted_text", cached is not None)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+        self.stats["cache_misses"] += 1
+
+        # Une seule extraction à la fois par contenu, même pour des requêtes concurrentes
+        with self._lock:
+            future = self._inflight.get(content_hash)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[content_hash] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            if data is None:
+                data = self.driver.read_bytes(key)
+            text = self._extract(extension, data)
+            self.driver.put_bytes(self.cache_key(content_hash), gzip.compress(text.encode("utf-8")))
+            self.stats["extractions"] += 1
+            future.set_result(text)
+            return text
+        except Exception as e:
+            self.stats["failures"] += 1
+            logger.error(f"[Extraction] Échec pour {key}: {e}")
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(content_hash, None)
+
+    def warm(self, items):
+        """Pré-extraire un lot de (clé, extension, hash) (tâche de fond après upload)"""
+        for key, extension, content_hash in items:
+            if extension.lower() in PLAIN_TEXT_EXTENSIONS:
+                continue
+            try:
+                self.get_text(key, extension, content_hash)
+            except Exception:
+                continue
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,170 @@
+"""Spans de trace des étapes coûteuses (RAG), compatibles OpenTelemetry.
+
+``TRACE_EXPORTER`` choisit l'export : vide (désactivé), ``console`` (logs) ou
+``file:<chemin>`` (une ligne JSON par span). Si le SDK `opentelemetry` est installé,
+les spans sont créés par son tracer et exportés par ses exporters ; sinon un export
+interne écrit le même contenu (nom, identifiants de trace / span / parent, dates,
+attributs).
+
+`record()` collecte en plus les spans d'un bloc pour les renvoyer dans la réponse
+(``debug_timings``). Sans export ni collecte, `span()` ne fait rien.
+"""
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+# Optional OpenTelemetry SDK dependency (best-effort)
+try:
+    from opentelemetry import trace as otel_trace
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter, SimpleSpanProcessor
+except Exception:
+    otel_trace = None
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "").strip()
+SERVICE_NAME = "multi-tenant-saas-api"
+
+
+class Span:
+    """Span en cours ; `set_attribute` suit l'API OpenTelemetry"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start", "start_time", "duration", "_otel")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.start_time = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self._otel = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+        if self._otel is not None:
+            self._otel.set_attribute(key, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "context": {"trace_id": self.trace_id, "span_id": self.span_id},
+            "parent_id": self.parent_id,
+            "start_time": self.start_time.isoformat(),
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "resource": {"service.name": SERVICE_NAME}
+        }
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+_recorder: ContextVar[Optional[List[Span]]] = ContextVar("trace_recorder", default=None)
+
+
+class _Exporter:
+    """Export interne (sans SDK OpenTelemetry) : logs ou fichier JSON lines"""
+
+    def __init__(self, target: str):
+        self.path = target[len("file:"):] if target.startswith("file:") else None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        if self.path is None:
+            logger.info(f"[Trace] {line}")
+            return
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _otel_tracer(target: str):
+    if target.startswith("file:"):
+        out = open(target[len("file:"):], "a", encoding="utf-8")
+        exporter = ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+    else:
+        exporter = ConsoleSpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    return provider.get_tracer(__name__)
+
+
+_tracer = None
+_exporter: Optional[_Exporter] = None
+if TRACE_EXPORTER:
+    if otel_trace is not None:
+        _tracer = _otel_tracer(TRACE_EXPORTER)
+    else:
+        _exporter = _Exporter(TRACE_EXPORTER)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Any]:
+    """Span d'une étape ; enfant du span courant s'il y en a un"""
+    recorder = _recorder.get()
+    if recorder is None and _tracer is None and _exporter is None:
+        yield _NOOP_SPAN
+        return
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    otel_context = _tracer.start_as_current_span(name, attributes=attributes) if _tracer is not None else None
+    try:
+        if otel_context is not None:
+            current._otel = otel_context.__enter__()
+        yield current
+    finally:
+        current.duration = time.perf_counter() - current.start
+        if otel_context is not None:
+            otel_context.__exit__(None, None, None)
+        _current_span.reset(token)
+        if recorder is not None:
+            recorder.append(current)
+        if _exporter is not None:
+            _exporter.export(current)
+
+
+@contextmanager
+def record() -> Iterator[List[Span]]:
+    """Collecter les spans terminés dans le bloc (ordre de fin)"""
+    spans: List[Span] = []
+    token = _recorder.set(spans)
+    try:
+        yield spans
+    finally:
+        _recorder.reset(token)
+
+
+def timings(spans: List[Span]) -> Dict[str, Any]:
+    """Résumé des spans collectés, dans l'ordre de début, avec leur profondeur"""
+    depth: Dict[str, int] = {}
+    ordered = sorted(spans, key=lambda s: s.start)
+    stages = []
+    for item in ordered:
+        depth[item.span_id] = depth.get(item.parent_id, -1) + 1 if item.parent_id else 0
+        stages.append({
+            "name": item.name,
+            "depth": depth[item.span_id],
+            "duration_ms": round(item.duration * 1000, 3),
+            **item.attributes
+        })
+    roots = [item for item in ordered if depth[item.span_id] == 0]
+    return {
+        "trace_id": ordered[0].trace_id if ordered else None,
+        "total_ms": round(sum(item.duration for item in roots) * 1000, 3),
+        "stages": stages
+    }
@@ -0,0 +1,288 @@
+"""Uploads multipart reprenables.
+
+Le client crée une session (taille totale, taille de partie), envoie les parties
+numérotées dans n'importe quel ordre (éventuellement en parallèle, avec une somme
+SHA-256 par partie), puis termine ou abandonne la session. Une partie en échec est
+simplement renvoyée ; la liste des parties reçues permet de reprendre un upload
+interrompu. L'assemblage est délégué au driver (écriture à l'offset puis renommage
+en local, multipart natif sur S3). Les sessions inactives expirent.
+"""
+import hashlib
+import logging
+import math
+import mimetypes
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import Any, BinaryIO, Dict, List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import metrics
+import models
+import storage_accounting
+from database import SessionLocal
+from file_storage import file_storage
+
+logger = logging.getLogger(__name__)
+
+SESSION_TTL_SECONDS = int(os.environ.get("UPLOAD_SESSION_TTL_SECONDS", "86400"))
+DEFAULT_PART_SIZE = int(os.environ.get("UPLOAD_PART_SIZE_MB", "8")) * 1024 * 1024
+MAX_PART_SIZE = 64 * 1024 * 1024
+MAX_PARTS = 10000
+EXPIRY_INTERVAL_SECONDS = int(os.environ.get("UPLOAD_EXPIRY_INTERVAL_SECONDS", "600"))
+
+
+def describe_session(session: models.UploadSession) -> Dict[str, Any]:
+    return {
+        "id": session.id,
+        "filename": session.original_filename,
+        "total_size": session.total_size,
+        "part_size": session.part_size,
+        "part_count": session.part_count,
+        "received_parts": [part.part_number for part in session.parts],
+        "created_at": session.created_at,
+        "expires_at": session.expires_at
+    }
+
+
+def create_session(
+    db: Session,
+    user: models.User,
+    filename: str,
+    total_size: int,
+    title: Optional[str] = None,
+    tags: str = "",
+    is_public: bool = False,
+    part_size: Optional[int] = None
+) -> models.UploadSession:
+    """Ouvrir une session d'upload (extension et quota vérifiés dès maintenant)"""
+    driver = file_storage.driver
+    if total_size <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Taille totale invalide")
+    part_size = min(part_size or DEFAULT_PART_SIZE, total_size)
+    if part_size > MAX_PART_SIZE or (part_size < driver.min_part_size and part_size < total_size):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Taille de partie invalide (entre {driver.min_part_size} et {MAX_PART_SIZE} octets)"
+        )
+    part_count = math.ceil(total_size / part_size)
+    if part_count > MAX_PARTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Trop de parties ({part_count} > {MAX_PARTS}) : augmenter la taille de partie"
+        )
+
+    new_file = file_storage.new_user_file_key(user.client_id, user.id, filename)
+    storage_accounting.check_quota(db, user.client_id, user.id, total_size)
+
+    now = datetime.utcnow()
+    session = models.UploadSession(
+        id=secrets.token_hex(16),
+        client_id=user.client_id,
+        user_id=user.id,
+        original_filename=filename,
+        filename=new_file["filename"],
+        storage_key=new_file["key"],
+        driver_upload_id=driver.create_multipart(new_file["key"], total_size),
+        title=title or os.path.splitext(filename)[0],
+        tags=tags or "",
+        is_public=is_public,
+        total_size=total_size,
+        part_size=part_size,
+        part_count=part_count,
+        created_at=now,
+        expires_at=now + timedelta(seconds=SESSION_TTL_SECONDS)
+    )
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+    return session
+
+
+def get_session(db: Session, user: models.User, session_id: str) -> models.UploadSession:
+    session = db.query(models.UploadSession).filter(
+        models.UploadSession.id == session_id,
+        models.UploadSession.user_id == user.id
+    ).first()
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session d'upload non trouvée")
+    if session.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Session d'upload expirée")
+    return session
+
+
+def expected_part_size(session: models.UploadSession, part_number: int) -> int:
+    if not 1 <= part_number <= session.part_count:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Numéro de partie invalide (1 à {session.part_count})"
+        )
+    if part_number < session.part_count:
+        return session.part_size
+    return session.total_size - session.part_size * (session.part_count - 1)
+
+
+def write_part(
+    db: Session,
+    session: models.UploadSession,
+    part_number: int,
+    stream: BinaryIO,
+    sha256: Optional[str] = None
+) -> Dict[str, Any]:
+    """Écrire une partie (flux positionnable) à sa place dans le blob final ; une partie déjà reçue est remplacée"""
+    expected = expected_part_size(session, part_number)
+    filters = (models.UploadPart.session_id == session.id, models.UploadPart.part_number == part_number)
+
+    # Taille contrôlée avant écriture : une partie trop longue déborderait sur la suivante
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    if size != expected:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Taille de la partie {part_number} incorrecte ({size} au lieu de {expected} octets)"
+        )
+
+    reader = file_storage.extractor.hashing_reader(stream)
+    result = file_storage.driver.put_part(
+        session.storage_key, session.driver_upload_id, part_number,
+        (part_number - 1) * session.part_size, reader
+    )
+    digest = reader.hexdigest()
+    metrics.record_storage("write", result["size"])
+
+    # Partie invalide : plus considérée comme reçue (les octets écrits seront écrasés par le renvoi)
+    error = None
+    if result["size"] != expected:
+        error = f"Partie {part_number} incomplète ({result['size']} au lieu de {expected} octets)"
+    elif sha256 and sha256.lower() != digest:
+        error = f"Somme SHA-256 de la partie {part_number} incorrecte"
+    if error:
+        db.query(models.UploadPart).filter(*filters).delete(synchronize_session=False)
+        db.commit()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+
+    values = {"size": result["size"], "sha256": digest, "etag": result["etag"], "created_at": datetime.utcnow()}
+    if not db.query(models.UploadPart).filter(*filters).update(values, synchronize_session=False):
+        try:
+            with db.begin_nested():
+                db.add(models.UploadPart(session_id=session.id, part_number=part_number, **values))
+        except IntegrityError:
+            # Même partie renvoyée en parallèle
+            db.query(models.UploadPart).filter(*filters).update(values, synchronize_session=False)
+
+    # Expiration glissante : une session active n'expire pas en cours d'envoi
+    session.expires_at = datetime.utcnow() + timedelta(seconds=SESSION_TTL_SECONDS)
+    db.commit()
+    return {"part_number": part_number, "size": result["size"], "sha256": digest}
+
+
+def complete_session(db: Session, session: models.UploadSession) -> Dict[str, Any]:
+    """Assembler le fichier final ; retourne ses métadonnées (comme `save_user_file`).
+
+    Parties manquantes (400) ou quota dépassé (413) : la session est conservée, le
+    client peut compléter l'envoi ou libérer de l'espace puis réessayer. Au-delà, la
+    session est supprimée dans sa propre transaction avant l'assemblage : une seconde
+    finalisation concurrente reçoit 409, une nouvelle tentative après un échec 404.
+    """
+    db.refresh(session)
+    parts = [
+        {"part_number": part.part_number, "size": part.size, "etag": part.etag}
+        for part in session.parts
+    ]
+    received = {part["part_number"] for part in parts}
+    missing = [n for n in range(1, session.part_count + 1) if n not in received]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Parties manquantes: {', '.join(map(str, missing[:20]))}{'...' if len(missing) > 20 else ''}"
+        )
+
+    # D'autres fichiers ont pu être ajoutés depuis l'ouverture de la session
+    storage_accounting.check_quota(db, session.client_id, session.user_id, session.total_size)
+
+    file_info = {
+        "filename": session.filename,
+        "original_filename": session.original_filename,
+        "file_path": session.storage_key,
+        "title": session.title,
+        "content_hash": None,  # Calculé en tâche de fond (voir finalize_uploaded_file)
+        "mime_type": mimetypes.guess_type(session.filename)[0] or "text/plain",
+        "tags": session.tags,
+        "is_public": session.is_public
+    }
+    session_id, upload_id = session.id, session.driver_upload_id
+
+    # Réserver la session : une seule finalisation la supprime effectivement
+    db.query(models.UploadPart).filter(models.UploadPart.session_id == session_id).delete(synchronize_session=False)
+    claimed = db.query(models.UploadSession).filter(
+        models.UploadSession.id == session_id
+    ).delete(synchronize_session=False)
+    db.expunge(session)  # Attributs conservés, la ligne n'existe plus
+    db.commit()
+    if not claimed:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload déjà en cours de finalisation")
+
+    try:
+        file_info["file_size"] = file_storage.driver.complete_multipart(file_info["file_path"], upload_id, parts)
+    except Exception:
+        logger.error(f"[Upload] Échec de l'assemblage de la session {session_id}")
+        try:
+            file_storage.driver.abort_multipart(file_info["file_path"], upload_id, parts)
+        except Exception as e:
+            logger.error(f"[Upload] Échec du nettoyage de la session {session_id}: {e}")
+        raise
+    return file_info
+
+
+def abort_session(db: Session, session: models.UploadSession):
+    parts = [{"part_number": part.part_number} for part in session.parts]
+    try:
+        file_storage.driver.abort_multipart(session.storage_key, session.driver_upload_id, parts)
+    except Exception as e:
+        logger.error(f"[Upload] Échec du nettoyage de la session {session.id}: {e}")
+    db.delete(session)
+    db.commit()
+
+
+def finalize_uploaded_file(file_id: int):
+    """Tâche de fond : hash du fichier assemblé puis extraction du texte"""
+    db = SessionLocal()
+    try:
+        row = db.get(models.UserFile, file_id)
+        if row is None:
+            return
+        sha256 = hashlib.sha256()
+        for chunk in file_storage.driver.iter_chunks(row.file_path):
+            sha256.update(chunk)
+        row.content_hash = sha256.hexdigest()
+        db.commit()
+        file_storage.warm_extracted_text([{"file_path": row.file_path, "content_hash": row.content_hash}])
+    except Exception as e:
+        logger.error(f"[Upload] Finalisation du fichier {file_id} impossible: {e}")
+    finally:
+        db.close()
+
+
+def expire_sessions(db: Session, now: Optional[datetime] = None) -> int:
+    """Abandonner les sessions expirées (et libérer leurs parties)"""
+    now = now or datetime.utcnow()
+    expired: List[models.UploadSession] = db.query(models.UploadSession).filter(
+        models.UploadSession.expires_at < now
+    ).all()
+    for session in expired:
+        logger.info(f"[Upload] Session expirée: {session.id} ({session.original_filename})")
+        abort_session(db, session)
+    return len(expired)
+
+
+def run_expiry_job():
+    """Point d'entrée de la tâche périodique d'expiration"""
+    db = SessionLocal()
+    try:
+        return expire_sessions(db)
+    finally:
+        db.close()
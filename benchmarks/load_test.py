@@ -0,0 +1,419 @@
+"""Test de charge reproductible de l'API : débit et latences p50 / p95 / p99 par endpoint.
+
+L'application est démarrée dans le processus (client ASGI, sans réseau), sous
+uvicorn (``--uvicorn``, plusieurs workers possibles) ou visée à une URL existante
+(``--url``). Sauf avec ``--url``, elle tourne sur une base et un stockage vides dans
+un répertoire temporaire : `backend/` n'est pas modifié.
+
+Le jeu de données (clients, utilisateurs, fichiers, documents) est créé par l'API à
+partir d'une graine ; le mélange de requêtes (connexion, listes, upload, recherches,
+RAG) est tiré avec la même graine, par ``--concurrency`` clients simultanés :
+
+    python benchmarks/load_test.py --tenants 5 --users 4 --files 10 --duration 30 --output run.json
+    python benchmarks/load_test.py --uvicorn --workers 4 --concurrency 32 --output run.json
+    python benchmarks/load_test.py ... --compare baseline.json --threshold 0.25
+
+Avec ``--compare``, le code de sortie est 1 si une latence p50 / p95 d'un endpoint ou
+le débit global se dégrade de plus de ``--threshold`` (et de plus de ``--min-delta-ms``).
+Un percentile n'est comparé que si les deux exécutions ont assez de requêtes pour
+l'endpoint (`MIN_SAMPLES`) : sur quelques dizaines de valeurs, le p95 varie de plus
+de 50 % d'une exécution identique à l'autre.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+BACKEND_DIR = REPO_DIR / "backend"
+
+PASSWORD = "bench-password-123"
+
+WORDS = (
+    "procédure", "contrat", "facture", "client", "projet", "réunion", "budget", "rapport", "stratégie",
+    "marché", "fournisseur", "livraison", "qualité", "sécurité", "assurance", "sinistre", "déclaration",
+    "planning", "équipe", "objectif", "analyse", "risque", "audit", "conformité", "formation", "recrutement",
+    "trésorerie", "investissement", "partenariat", "innovation", "logistique", "commande", "stock", "relance"
+)
+
+# Paramètres qui doivent être identiques pour comparer deux exécutions
+COMPARABLE_SETTINGS = ("mode", "workers", "concurrency", "tenants", "users_per_tenant", "files_per_user",
+                       "documents_per_tenant", "mix")
+
+# Requêtes minimales (dans chaque exécution) pour comparer un percentile
+MIN_SAMPLES = {"p50_ms": 20, "p95_ms": 100}
+
+DEFAULT_MIX = {
+    "login": 1,
+    "list_files": 6,
+    "list_documents": 4,
+    "storage_stats": 2,
+    "upload": 2,
+    "search_documents": 3,
+    "search_files": 2,
+    "rag_query": 2,
+}
+
+
+def sentence(rng: random.Random, words: int = 12) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def paragraph(rng: random.Random, sentences: int = 8) -> str:
+    return " ".join(sentence(rng, rng.randint(6, 16)) for _ in range(sentences))
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Percentile au rang le plus proche (valeurs triées)"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+# ==================== Démarrage de l'application ====================
+
+def prepare_workdir() -> Path:
+    workdir = Path(tempfile.mkdtemp(prefix="bench_load_"))
+    (workdir / "user_files").mkdir()
+    return workdir
+
+
+def app_environment(workdir: Path) -> Dict[str, str]:
+    return {
+        "STORAGE_URL": f"sharded:{workdir / 'user_files'}",
+        # Tâches périodiques hors mesure
+        "STORAGE_RECONCILE_INTERVAL_SECONDS": "0",
+        "STORAGE_GC_INTERVAL_SECONDS": "0",
+    }
+
+
+def inprocess_client(workdir: Path) -> httpx.AsyncClient:
+    os.chdir(workdir)
+    os.environ.update(app_environment(workdir))
+    sys.path.insert(0, str(BACKEND_DIR))
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    from app import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120)
+
+
+def start_uvicorn(workdir: Path, port: int, workers: int) -> subprocess.Popen:
+    env = {**os.environ, **app_environment(workdir), "PYTHONPATH": str(BACKEND_DIR)}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=workdir, env=env
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"uvicorn s'est arrêté (code {process.returncode})")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("uvicorn ne répond pas sur /health")
+
+
+# ==================== Jeu de données ====================
+
+async def seed(client: httpx.AsyncClient, args, rng: random.Random) -> List[Dict[str, Any]]:
+    """Créer clients, utilisateurs, fichiers et documents ; renvoie les comptes (email, jeton)"""
+    run_id = f"{args.seed}-{int(time.time())}"
+    accounts = []
+    for tenant in range(args.tenants):
+        admin_email = f"admin{tenant}-{run_id}@tenant{tenant}.example.com"
+        response = await client.post("/auth/register", json={
+            "email": admin_email, "password": PASSWORD, "full_name": f"Admin {tenant}",
+            "company_name": f"Entreprise {tenant}"
+        })
+        response.raise_for_status()
+        admin = {"email": admin_email, "token": response.json()["access_token"]}
+        accounts.append(admin)
+        for user in range(1, args.users):
+            email = f"user{tenant}-{user}-{run_id}@tenant{tenant}.example.com"
+            response = await client.post("/admin/users", headers=auth_headers(admin), json={
+                "email": email, "password": PASSWORD, "full_name": f"Utilisateur {tenant}-{user}",
+                "company_name": f"Entreprise {tenant}"
+            })
+            response.raise_for_status()
+            login = await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+            accounts.append({"email": email, "token": login.json()["access_token"]})
+
+        documents = "".join(
+            json.dumps({"title": f"{sentence(rng, 4)[:-1]} {i}", "content": paragraph(rng, 12)}, ensure_ascii=False) + "\n"
+            for i in range(args.documents)
+        )
+        response = await client.post("/documents/bulk?report=errors", headers=auth_headers(admin),
+                                     content=documents.encode("utf-8"))
+        response.raise_for_status()
+
+    semaphore = asyncio.Semaphore(8)
+
+    async def upload_files(index: int, account):
+        # Un générateur par compte : contenu identique quel que soit l'ordre des uploads
+        account_rng = random.Random(f"{args.seed}-files-{index}")
+        for i in range(args.files):
+            async with semaphore:
+                await upload(client, account, account_rng, i)
+
+    await asyncio.gather(*(upload_files(index, account) for index, account in enumerate(accounts)))
+    return accounts
+
+
+def auth_headers(account: Dict[str, Any]) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {account['token']}"}
+
+
+async def upload(client: httpx.AsyncClient, account, rng: random.Random, index: int) -> httpx.Response:
+    content = paragraph(rng, rng.randint(5, 40)).encode("utf-8")
+    response = await client.post(
+        "/my-files/upload", headers=auth_headers(account),
+        files={"file": (f"note_{index}.txt", content, "text/plain")},
+        data={"title": sentence(rng, 3)[:-1], "tags": ",".join(rng.sample(WORDS, 2))}
+    )
+    response.raise_for_status()
+    return response
+
+
+# ==================== Charge ====================
+
+def operations() -> Dict[str, Callable]:
+    async def login(client, account, rng):
+        return await client.post("/auth/login", json={"email": account["email"], "password": PASSWORD})
+
+    async def list_files(client, account, rng):
+        return await client.get("/my-files/", headers=auth_headers(account))
+
+    async def list_documents(client, account, rng):
+        return await client.get("/documents/", params={"limit": 50}, headers=auth_headers(account))
+
+    async def storage_stats(client, account, rng):
+        return await client.get("/my-files/stats", headers=auth_headers(account))
+
+    async def upload_file(client, account, rng):
+        return await upload(client, account, rng, rng.randint(0, 10 ** 9))
+
+    async def search_documents(client, account, rng):
+        return await client.get("/search/", params={"query": rng.choice(WORDS)}, headers=auth_headers(account))
+
+    async def search_files(client, account, rng):
+        return await client.get("/my-files/search/", params={"query": rng.choice(WORDS)}, headers=auth_headers(account))
+
+    async def rag_query(client, account, rng):
+        question = f"Quelle est la {rng.choice(WORDS)} pour le {rng.choice(WORDS)} ?"
+        return await client.post("/my-files/rag/query", json={"question": question}, headers=auth_headers(account))
+
+    return {
+        "login": login, "list_files": list_files, "list_documents": list_documents,
+        "storage_stats": storage_stats, "upload": upload_file, "search_documents": search_documents,
+        "search_files": search_files, "rag_query": rag_query,
+    }
+
+
+async def run_load(client: httpx.AsyncClient, accounts, args, mix: Dict[str, int]) -> Dict[str, Any]:
+    ops = operations()
+    names = [name for name in mix if mix[name] > 0]
+    weights = [mix[name] for name in names]
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Dict[str, int] = {name: 0 for name in names}
+    issued = 0
+    deadline = time.perf_counter() + args.duration
+
+    async def worker(worker_id: int):
+        nonlocal issued
+        rng = random.Random(f"{args.seed}-{worker_id}")
+        while time.perf_counter() < deadline and (not args.requests or issued < args.requests):
+            issued += 1
+            name = rng.choices(names, weights)[0]
+            account = rng.choice(accounts)
+            start = time.perf_counter()
+            try:
+                response = await ops[name](client, account, rng)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            elapsed = time.perf_counter() - start
+            if failed:
+                errors[name] += 1
+            else:
+                latencies[name].append(elapsed)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+    wall = time.perf_counter() - start
+
+    endpoints = {}
+    for name in names:
+        values = sorted(latencies[name])
+        endpoints[name] = {
+            "count": len(values),
+            "errors": errors[name],
+            "rps": round(len(values) / wall, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+        }
+    total = sum(e["count"] for e in endpoints.values())
+    return {
+        "duration_s": round(wall, 2),
+        "requests": total,
+        "errors": sum(errors.values()),
+        "rps": round(total / wall, 2),
+        "endpoints": endpoints,
+    }
+
+
+# ==================== Rapport et comparaison ====================
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_report(report: Dict[str, Any]):
+    results = report["results"]
+    print(f"\n{results['requests']} requêtes en {results['duration_s']} s "
+          f"({results['rps']} req/s, {results['errors']} erreurs)")
+    print(f"{'endpoint':<18}{'req':>7}{'err':>5}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for name, e in results["endpoints"].items():
+        print(f"{name:<18}{e['count']:>7}{e['errors']:>5}{e['rps']:>9}{e['p50_ms']:>9}{e['p95_ms']:>9}"
+              f"{e['p99_ms']:>9}{e['max_ms']:>9}")
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float, min_delta_ms: float) -> List[str]:
+    """Régressions par rapport à une exécution de référence"""
+    regressions = []
+    current, previous = report["results"], baseline["results"]
+    if current["rps"] < previous["rps"] * (1 - threshold):
+        regressions.append(f"débit global: {previous['rps']} -> {current['rps']} req/s")
+    for name, e in current["endpoints"].items():
+        base = previous["endpoints"].get(name)
+        if not base:
+            continue
+        for key, min_samples in MIN_SAMPLES.items():
+            if min(e["count"], base["count"]) < min_samples:
+                continue
+            if e[key] > base[key] * (1 + threshold) and e[key] - base[key] > min_delta_ms:
+                regressions.append(f"{name} {key}: {base[key]} -> {e[key]} ms")
+    return regressions
+
+
+async def main_async(args) -> Dict[str, Any]:
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, (args.mix or "").split(",")):
+        name, _, weight = item.partition("=")
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f"Opération inconnue: {name} (disponibles: {', '.join(DEFAULT_MIX)})")
+        mix[name] = int(weight)
+
+    workdir = process = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120)
+        mode = "url"
+    elif args.uvicorn:
+        workdir = prepare_workdir()
+        process = start_uvicorn(workdir, args.port, args.workers)
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=120)
+        mode = "uvicorn"
+    else:
+        workdir = prepare_workdir()
+        client = inprocess_client(workdir)
+        mode = "in-process"
+
+    try:
+        rng = random.Random(args.seed)
+        seed_start = time.perf_counter()
+        accounts = await seed(client, args, rng)
+        print(f"Jeu de données: {args.tenants} clients, {len(accounts)} utilisateurs, "
+              f"{args.files} fichiers / utilisateur, {args.documents} documents / client "
+              f"({time.perf_counter() - seed_start:.1f} s)")
+        if args.warmup:
+            await run_load(client, accounts, argparse.Namespace(**{**vars(args), "duration": args.warmup}), mix)
+        results = await run_load(client, accounts, args, mix)
+    finally:
+        await client.aclose()
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if workdir is not None and not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "mode": mode, "workers": args.workers if mode == "uvicorn" else 1, "concurrency": args.concurrency,
+            "seed": args.seed, "tenants": args.tenants, "users_per_tenant": args.users,
+            "files_per_user": args.files, "documents_per_tenant": args.documents, "mix": mix,
+            "git_revision": git_revision(), "python": platform.python_version(), "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Test de charge de l'API")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--uvicorn", action="store_true", help="Démarrer l'application sous uvicorn")
+    target.add_argument("--url", help="Viser un serveur déjà démarré (son jeu de données est complété)")
+    parser.add_argument("--workers", type=int, default=1, help="Workers uvicorn")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tenants", type=int, default=3)
+    parser.add_argument("--users", type=int, default=3, help="Utilisateurs par client (admin compris)")
+    parser.add_argument("--files", type=int, default=5, help="Fichiers par utilisateur")
+    parser.add_argument("--documents", type=int, default=100, help="Documents par client")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20, help="Durée de la mesure (secondes)")
+    parser.add_argument("--requests", type=int, default=0, help="Nombre maximal de requêtes (0 = selon la durée)")
+    parser.add_argument("--warmup", type=float, default=2, help="Préchauffage avant la mesure (secondes)")
+    parser.add_argument("--mix", help="Poids des opérations, ex. list_files=10,upload=0")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Rapport JSON")
+    parser.add_argument("--compare", help="Rapport JSON de référence")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Dégradation tolérée (0.25 = 25 %%)")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="Écart absolu ignoré (bruit)")
+    parser.add_argument("--keep", action="store_true", help="Conserver le répertoire de travail temporaire")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        differing = [key for key in COMPARABLE_SETTINGS if baseline["meta"].get(key) != report["meta"].get(key)]
+        if differing:
+            print(f"\nAttention: paramètres différents de la référence ({', '.join(differing)})")
+        regressions = compare(report, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print("\nRégressions:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\nAucune régression au-delà de {args.threshold:.0%} par rapport à {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
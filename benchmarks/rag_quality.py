@@ -0,0 +1,373 @@
+"""Benchmark qualité / latence de la recherche du RAG personnel, par mode de recherche.
+
+Hors ligne, sur une base et un stockage vides dans un répertoire temporaire
+(`backend/` n'est pas modifié) :
+
+    python benchmarks/rag_quality.py --users 3 --distractors 200 --output rag.json
+    python benchmarks/rag_quality.py --users 3 --distractors 200 --compare rag.json
+
+Chaque utilisateur reçoit un corpus : les documents étiquetés du jeu de questions
+(``--queries``, par défaut `rag_queries.json`) mélangés à ``--distractors`` fichiers
+générés (texte français du même domaine, `seed_data.py`). Pour chaque mode :
+
+- ``simple`` : `_search_simple` (mots-clés) ;
+- ``bm25`` : index BM25 seul (module `rank_bm25`) ;
+- ``vector`` : similarité du `vector_store` seul ;
+- ``hybrid`` : `_hybrid_search` (0,6 vecteur + 0,4 BM25) ;
+- ``pipeline`` : ce que fait `query()` (hybride, puis recherche simple si vide).
+
+Le rapport donne recall@k et MRR (déterministes à graine égale : comparables d'un
+commit à l'autre), les percentiles de latence par question, ainsi que le temps de
+construction de l'index et sa mémoire (`tracemalloc`). Un mode dont l'index n'existe
+pas dans cette installation est signalé indisponible.
+
+Avec ``--compare``, le code de sortie est 1 si un recall@k ou le MRR baisse de plus de
+``--max-quality-drop``, ou si une latence p95 / le temps de construction se dégrade de
+plus de ``--threshold`` (et de plus de ``--min-delta-ms``).
+"""
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from load_test import BACKEND_DIR, git_revision, percentile
+
+DEFAULT_QUERIES = Path(__file__).resolve().parent / "rag_queries.json"
+MODES = ("simple", "bm25", "vector", "hybrid", "pipeline")
+COMPARABLE_SETTINGS = ("users", "distractors", "sentences", "seed", "k", "queries_sha1")
+PASSWORD = "bench-password-123"
+
+
+def prepare_workdir() -> Path:
+    workdir = Path(tempfile.mkdtemp(prefix="bench_rag_"))
+    os.chdir(workdir)
+    os.environ["STORAGE_URL"] = f"sharded:{workdir / 'user_files'}"
+    sys.path.insert(0, str(BACKEND_DIR))
+    return workdir
+
+
+# ==================== Corpus ====================
+
+def build_corpus(labelled: Dict[str, Any], users: int, distractors: int, sentences: int, seed: int):
+    """Un client, `users` utilisateurs ; renvoie [(utilisateur, {file_id: id étiqueté})]"""
+    import models
+    import seed_data
+    from database import SessionLocal, engine, upgrade_schema
+    from file_storage import file_storage
+
+    models.Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    db = SessionLocal()
+    try:
+        seed_data.Seeder(
+            db, clients=1, users_per_client=users, documents_per_client=0, files_per_user=distractors,
+            sentences=sentences, password=PASSWORD, prefix="bench", seed=seed
+        ).run()
+        corpora = []
+        for user in db.query(models.User).order_by(models.User.id).all():
+            labels = {}
+            for document in labelled["documents"]:
+                filename = f"label_{document['id']}.txt"
+                key = file_storage.get_user_prefix(user.client_id, user.id) + filename
+                blob = file_storage.write_user_blob(
+                    user.client_id, key, io.BytesIO(document["content"].encode("utf-8")), ".txt"
+                )
+                user_file = models.UserFile(
+                    filename=filename, original_filename=filename, file_path=key, title=document["title"],
+                    client_id=user.client_id, user_id=user.id, file_size=blob["file_size"],
+                    content_hash=blob["content_hash"], storage_encoding=blob["storage_encoding"],
+                    stored_size=blob["stored_size"] if blob["storage_encoding"] else None,
+                    mime_type="text/plain", tags=document.get("tags", "")
+                )
+                db.add(user_file)
+                db.flush()
+                labels[user_file.id] = document["id"]
+            corpora.append(((user.id, user.client_id), labels))
+        db.commit()
+        return corpora
+    finally:
+        db.close()
+
+
+# ==================== Modes de recherche ====================
+
+def _file_ids(docs) -> List[int]:
+    return [doc.metadata.get("file_id") for doc in docs]
+
+
+def search_simple(rag, question: str, k: int) -> List[int]:
+    return _file_ids(rag._search_simple(question, k=k))
+
+
+def search_bm25(rag, question: str, k: int) -> List[int]:
+    scores = rag.bm25_index.get_scores(question.lower().split())
+    ranked = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
+    return _file_ids(rag.all_chunks[i] for i in ranked if scores[i] > 0)
+
+
+def search_vector(rag, question: str, k: int) -> List[int]:
+    return _file_ids(doc for doc, _ in rag.vector_store.similarity_search_with_score(question, k=k))
+
+
+def search_hybrid(rag, question: str, k: int) -> List[int]:
+    return _file_ids(doc for doc, _ in rag._hybrid_search(question, k=k))
+
+
+def search_pipeline(rag, question: str, k: int) -> List[int]:
+    results = rag._hybrid_search(question, k=10)
+    docs = [doc for doc, _ in results] if results else rag._search_simple(question, k=5)
+    return _file_ids(docs)[:k]
+
+
+SEARCHES: Dict[str, Callable] = {
+    "simple": search_simple,
+    "bm25": search_bm25,
+    "vector": search_vector,
+    "hybrid": search_hybrid,
+    "pipeline": search_pipeline,
+}
+
+
+def unavailable_reason(rag, mode: str) -> Optional[str]:
+    if mode == "bm25" and rag.bm25_index is None:
+        return "pas d'index BM25 (module rank_bm25 absent)"
+    if mode == "vector" and rag.vector_store is None:
+        return "pas de vector_store configuré"
+    if mode == "hybrid" and rag.bm25_index is None and rag.vector_store is None:
+        return "ni index BM25 ni vector_store"
+    return None
+
+
+# ==================== Mesures ====================
+
+def build_index(user_id: int, client_id: int, repeat: int):
+    """Construire l'index (temps médian sur `repeat`), puis une fois sous tracemalloc"""
+    from database import SessionLocal
+    from personal_rag import PersonalRAGSystem
+
+    durations = []
+    for _ in range(repeat):
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            PersonalRAGSystem(user_id, client_id, db)
+            durations.append(time.perf_counter() - start)
+        finally:
+            db.close()
+
+    db = SessionLocal()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        rag = PersonalRAGSystem(user_id, client_id, db)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # La session reste attachée à l'index (fermée par l'appelant après les mesures)
+    return rag, {
+        "build_ms": statistics.median(durations) * 1000,
+        "build_first_ms": durations[0] * 1000,
+        "retained_kb": (retained - before) / 1024,
+        "peak_kb": (peak - before) / 1024,
+        "documents": len(rag.all_documents),
+        "indexed_chars": rag.indexed_chars,
+    }
+
+
+def evaluate(rag, labels: Dict[int, str], queries: List[Dict[str, Any]], mode: str,
+             ks: List[int], repeat: int) -> Dict[str, Any]:
+    search = SEARCHES[mode]
+    depth = max(ks)
+    recalls = {k: [] for k in ks}
+    reciprocal_ranks, latencies = [], []
+    for query in queries:
+        relevant = set(query["relevant"])
+        for _ in range(repeat):
+            start = time.perf_counter()
+            found = search(rag, query["question"], depth)
+            latencies.append(time.perf_counter() - start)
+        ranked = [labels.get(file_id) for file_id in found]
+        for k in ks:
+            recalls[k].append(len(relevant & set(ranked[:k])) / len(relevant))
+        rank = next((position for position, label in enumerate(ranked, start=1) if label in relevant), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    return {
+        "recall": {k: statistics.mean(values) for k, values in recalls.items()},
+        "mrr": statistics.mean(reciprocal_ranks),
+        "latencies": latencies,
+    }
+
+
+def summarize(per_user: List[Dict[str, Any]], ks: List[int]) -> Dict[str, Any]:
+    latencies = sorted(value * 1000 for item in per_user for value in item["latencies"])
+    return {
+        "available": True,
+        **{f"recall@{k}": round(statistics.mean(item["recall"][k] for item in per_user), 4) for k in ks},
+        "mrr": round(statistics.mean(item["mrr"] for item in per_user), 4),
+        "queries": len(latencies),
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+
+def run(args, labelled: Dict[str, Any], modes: List[str], ks: List[int]) -> Dict[str, Any]:
+    seed_start = time.perf_counter()
+    corpora = build_corpus(labelled, args.users, args.distractors, args.sentences, args.seed)
+    print(f"Corpus: {len(corpora)} utilisateurs, {len(labelled['documents'])} documents étiquetés + "
+          f"{args.distractors} fichiers générés chacun ({time.perf_counter() - seed_start:.1f} s)")
+
+    builds, evaluations, unavailable = [], {mode: [] for mode in modes}, {}
+    for (user_id, client_id), labels in corpora:
+        rag, build = build_index(user_id, client_id, args.build_repeat)
+        builds.append(build)
+        for mode in modes:
+            reason = unavailable_reason(rag, mode)
+            if reason:
+                unavailable[mode] = reason
+                continue
+            search = SEARCHES[mode]
+            for query in labelled["queries"][:args.warmup]:
+                search(rag, query["question"], max(ks))
+            evaluations[mode].append(evaluate(rag, labels, labelled["queries"], mode, ks, args.repeat))
+        rag.db.close()
+
+    return {
+        "index": {
+            "documents": round(statistics.mean(b["documents"] for b in builds)),
+            "indexed_kb": round(statistics.mean(b["indexed_chars"] for b in builds) / 1024, 1),
+            "build_ms": round(statistics.mean(b["build_ms"] for b in builds), 3),
+            "build_first_ms": round(statistics.mean(b["build_first_ms"] for b in builds), 3),
+            "retained_kb": round(statistics.mean(b["retained_kb"] for b in builds), 1),
+            "peak_kb": round(max(b["peak_kb"] for b in builds), 1),
+        },
+        "modes": {
+            mode: ({"available": False, "reason": unavailable[mode]} if mode in unavailable
+                   else summarize(evaluations[mode], ks))
+            for mode in modes
+        },
+    }
+
+
+# ==================== Rapport et comparaison ====================
+
+def print_report(report: Dict[str, Any], ks: List[int]):
+    index = report["results"]["index"]
+    print(f"\nIndex par utilisateur: {index['documents']} documents, {index['indexed_kb']} Ko de texte, "
+          f"construction {index['build_ms']} ms (première: {index['build_first_ms']} ms), "
+          f"mémoire retenue {index['retained_kb']} Ko (pic {index['peak_kb']} Ko)")
+    header = "".join(f"{'R@' + str(k):>8}" for k in ks)
+    print(f"{'mode':<10}{header}{'MRR':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for mode, m in report["results"]["modes"].items():
+        if not m["available"]:
+            print(f"{mode:<10}indisponible: {m['reason']}")
+            continue
+        recalls = "".join(f"{m[f'recall@{k}']:>8.3f}" for k in ks)
+        print(f"{mode:<10}{recalls}{m['mrr']:>8.3f}{m['p50_ms']:>10}{m['p95_ms']:>10}{m['p99_ms']:>10}")
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_quality_drop: float,
+            threshold: float, min_delta_ms: float) -> List[str]:
+    """Régressions de qualité (absolues) et de latence (relatives) par rapport à une référence"""
+    regressions = []
+    current, previous = report["results"], baseline["results"]
+    now, before = current["index"]["build_ms"], previous["index"]["build_ms"]
+    if now > before * (1 + threshold) and now - before > min_delta_ms:
+        regressions.append(f"construction de l'index: {before} -> {now} ms")
+    for mode, m in current["modes"].items():
+        base = previous["modes"].get(mode)
+        if not base or not base["available"]:
+            continue
+        if not m["available"]:
+            regressions.append(f"{mode}: devenu indisponible ({m['reason']})")
+            continue
+        for key in [key for key in m if key.startswith("recall@")] + ["mrr"]:
+            if key in base and m[key] < base[key] - max_quality_drop:
+                regressions.append(f"{mode} {key}: {base[key]} -> {m[key]}")
+        for key in ("p50_ms", "p95_ms"):
+            if m[key] > base[key] * (1 + threshold) and m[key] - base[key] > min_delta_ms:
+                regressions.append(f"{mode} {key}: {base[key]} -> {m[key]} ms")
+    return regressions
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark qualité / latence de la recherche RAG")
+    parser.add_argument("--queries", default=str(DEFAULT_QUERIES), help="Jeu de questions étiquetées (JSON)")
+    parser.add_argument("--users", type=int, default=3, help="Utilisateurs (un index chacun)")
+    parser.add_argument("--distractors", type=int, default=200, help="Fichiers générés par utilisateur")
+    parser.add_argument("--sentences", type=int, default=12, help="Phrases moyennes par fichier généré")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--k", default="1,3,5,10", help="Rangs du recall@k")
+    parser.add_argument("--repeat", type=int, default=5, help="Exécutions de chaque question (latence)")
+    parser.add_argument("--build-repeat", type=int, default=3, help="Constructions d'index mesurées")
+    parser.add_argument("--warmup", type=int, default=3, help="Questions de préchauffage par mode")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Rapport JSON")
+    parser.add_argument("--compare", help="Rapport JSON de référence")
+    parser.add_argument("--max-quality-drop", type=float, default=0.02, help="Baisse tolérée de recall@k / MRR")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Dégradation de latence tolérée (0.25 = 25 %%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Écart absolu ignoré (bruit)")
+    parser.add_argument("--keep", action="store_true", help="Conserver le répertoire de travail temporaire")
+    args = parser.parse_args(argv)
+
+    modes = [mode for mode in args.modes.split(",") if mode]
+    unknown = [mode for mode in modes if mode not in SEARCHES]
+    if unknown:
+        parser.error(f"Mode inconnu: {', '.join(unknown)} (disponibles: {', '.join(MODES)})")
+    ks = sorted({int(k) for k in args.k.split(",")})
+    queries_text = Path(args.queries).read_text(encoding="utf-8")
+    labelled = json.loads(queries_text)
+
+    # Les journaux INFO par requête du RAG fausseraient les latences
+    logging.basicConfig(level=logging.WARNING)
+    cwd = os.getcwd()
+    workdir = prepare_workdir()
+    try:
+        results = run(args, labelled, modes, ks)
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "users": args.users, "distractors": args.distractors, "sentences": args.sentences, "seed": args.seed,
+            "k": ks, "repeat": args.repeat, "queries": len(labelled["queries"]),
+            "queries_sha1": hashlib.sha1(queries_text.encode("utf-8")).hexdigest()[:12],
+            "git_revision": git_revision(), "python": platform.python_version(), "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    print_report(report, ks)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        differing = [key for key in COMPARABLE_SETTINGS if baseline["meta"].get(key) != report["meta"].get(key)]
+        if differing:
+            print(f"\nAttention: paramètres différents de la référence ({', '.join(differing)})")
+        regressions = compare(report, baseline, args.max_quality_drop, args.threshold, args.min_delta_ms)
+        if regressions:
+            print("\nRégressions:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\nAucune régression par rapport à {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""Benchmark de la sérialisation et de la compression des réponses, par endpoint.
+
+Travaille sur une copie temporaire de la base et des fichiers (`backend/`), enrichie
+de documents synthétiques, via le client de test FastAPI (sans réseau) :
+
+    python benchmarks/response_serialization.py --documents 2000 --repeat 20
+
+Pour chaque endpoint : temps CPU et temps écoulé par requête, octets transférés,
+avec le chemin standard de FastAPI (json.dumps), le chemin rapide (pydantic-core /
+orjson), puis avec compression gzip (et brotli si le module est installé).
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+
+def prepare_workdir() -> Path:
+    """Copie de la base et des fichiers : le benchmark ne modifie pas `backend/`"""
+    workdir = Path(tempfile.mkdtemp(prefix="bench_responses_"))
+    shutil.copy(BACKEND_DIR / "saas_database.db", workdir / "saas_database.db")
+    if (BACKEND_DIR / "user_files").exists():
+        shutil.copytree(BACKEND_DIR / "user_files", workdir / "user_files")
+    os.chdir(workdir)
+    os.environ["STORAGE_URL"] = f"sharded:{workdir / 'user_files'}"
+    sys.path.insert(0, str(BACKEND_DIR))
+    return workdir
+
+
+def seed_documents(count: int, email: str):
+    import document_transfer
+    import models
+    from database import SessionLocal
+
+    lines = "".join(
+        json.dumps({"title": f"Document de test {i}", "content": f"Contenu du document {i}. " + "Texte métier. " * 150}) + "\n"
+        for i in range(count)
+    )
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.email == email).first()
+        document_transfer.DocumentImporter(db, user, report_errors_only=True).run(io.BytesIO(lines.encode()))
+    finally:
+        db.close()
+
+
+def measure(client, url: str, headers: dict, repeat: int):
+    import change_tracking
+
+    client.get(url, headers=headers)  # Préchauffage (adaptateurs pydantic)
+    cpu, wall, size = [], [], 0
+    for _ in range(repeat):
+        # Cache serveur des listes vidé : chaque requête est sérialisée
+        change_tracking.response_cache.clear()
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        response = client.get(url, headers=headers)
+        cpu.append(time.process_time() - cpu_start)
+        wall.append(time.perf_counter() - wall_start)
+        response.raise_for_status()
+        size = response.num_bytes_downloaded
+    return statistics.median(cpu) * 1000, statistics.median(wall) * 1000, size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sérialisation / compression des réponses")
+    parser.add_argument("--documents", type=int, default=2000, help="Documents synthétiques ajoutés à la copie")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--email", default="admin@client-a.com")
+    parser.add_argument("--password", default="password123")
+    args = parser.parse_args(argv)
+
+    workdir = prepare_workdir()
+    try:
+        import app as app_module  # Schéma de la copie mis à jour avant l'ajout des documents
+        seed_documents(args.documents, args.email)
+
+        from fastapi.testclient import TestClient
+        import json_responses
+        import response_compression
+
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        client = TestClient(app_module.app)
+        token = client.post("/auth/login", json={"email": args.email, "password": args.password}).json()["access_token"]
+        auth = {"Authorization": f"Bearer {token}"}
+
+        endpoints = [
+            f"/documents/?limit={args.documents}",
+            f"/documents/?limit={args.documents}&fields=summary",
+            "/search/?query=document",
+            "/my-files/search/?query=e",
+            "/documents/export",
+        ]
+        modes = [("standard", False, "identity"), ("rapide", True, "identity"), ("rapide+gzip", True, "gzip")]
+        if response_compression.brotli is not None:
+            modes.append(("rapide+br", True, "br"))
+
+        print(f"orjson: {'oui' if json_responses.orjson is not None else 'non'} - "
+              f"brotli: {'oui' if response_compression.brotli is not None else 'non'}\n")
+        print(f"{'endpoint':<45} {'mode':<12} {'CPU ms':>9} {'total ms':>9} {'octets':>11}")
+        for url in endpoints:
+            for name, fast, encoding in modes:
+                json_responses.FAST_JSON_RESPONSES = fast
+                cpu_ms, wall_ms, size = measure(client, url, {**auth, "Accept-Encoding": encoding}, args.repeat)
+                print(f"{url:<45} {name:<12} {cpu_ms:>9.2f} {wall_ms:>9.2f} {size:>11}")
+            print()
+    finally:
+        os.chdir(BACKEND_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
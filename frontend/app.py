@@ -5,6 +5,9 @@ from datetime import datetime
 from typing import Optional, Dict, Any
 import pandas as pd
 import os
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from io import BytesIO
 
 # Configuration
@@ -12,6 +15,13 @@ from io import BytesIO
 # call the backend service by its Docker Compose name (e.g. http://backend:8000).
 API_BASE_URL = os.environ.get('API_BASE_URL', 'http://localhost:8000')
 
+# Uploads en plusieurs parties au-delà de ce seuil (reprenables, parties envoyées en parallèle)
+CHUNKED_UPLOAD_THRESHOLD = int(os.environ.get('CHUNKED_UPLOAD_THRESHOLD_MB', '16')) * 1024 * 1024
+UPLOAD_PART_SIZE = 8 * 1024 * 1024
+UPLOAD_PARALLEL_PARTS = 4
+UPLOAD_PART_RETRIES = 3
+UPLOAD_RETRY_BACKOFF_SECONDS = 1
+
 # Initialisation de session
 if 'auth' not in st.session_state:
     st.session_state.auth = {
@@ -79,6 +89,12 @@ def make_request(endpoint: str, method: str = "GET", data: Optional[dict] = None
         headers = get_headers()
         url = f"{API_BASE_URL}{endpoint}"
         
+        # Listes déjà reçues : revalidation par ETag (304 si rien n'a changé)
+        etag_cache = st.session_state.setdefault('etag_cache', {})
+        cached = etag_cache.get(url) if method == "GET" else None
+        if cached:
+            headers["If-None-Match"] = cached[0]
+        
         try:
             if method == "GET":
                 response = requests.get(url, headers=headers)
@@ -100,8 +116,13 @@ def make_request(endpoint: str, method: str = "GET", data: Optional[dict] = None
                 elif method == "DELETE":
                     response = requests.delete(url, headers=headers)
             
+            if response.status_code == 304 and cached:
+                return cached[1]
             response.raise_for_status()
-            return response.json() if response.content else {"message": "Success"}
+            result = response.json() if response.content else {"message": "Success"}
+            if method == "GET" and response.headers.get("ETag"):
+                etag_cache[url] = (response.headers["ETag"], result)
+            return result
             
         except requests.exceptions.RequestException as e:
             handle_request_error(e)
@@ -213,9 +234,89 @@ def logout():
     st.session_state.current_page = "login"
 
 # ==================== NOUVELLES FONCTIONS POUR FICHIERS ====================
+def _send_upload_part(headers: dict, session_id: str, part_number: int, data: bytes):
+    """Envoyer une partie ; nouvelle tentative (avec attente) sur erreur réseau ou erreur serveur
+
+    Appelée depuis les threads de l'exécuteur, qui n'ont pas accès à `st.session_state` :
+    les headers d'authentification sont donc préparés par l'appelant.
+    """
+    headers = {**headers, 'X-Part-SHA256': hashlib.sha256(data).hexdigest()}
+    url = f"{API_BASE_URL}/my-files/uploads/{session_id}/parts/{part_number}"
+    for attempt in range(UPLOAD_PART_RETRIES):
+        if attempt:
+            time.sleep(UPLOAD_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+        try:
+            response = requests.put(url, headers=headers, data=data, timeout=300)
+        except requests.RequestException:
+            if attempt == UPLOAD_PART_RETRIES - 1:
+                raise
+            continue
+        if response.status_code == 200:
+            return part_number
+        if response.status_code < 500:
+            # Partie refusée (session expirée, finalisée, quota...) : inutile de réessayer
+            raise RuntimeError(response.json().get('detail', f"Partie {part_number} refusée"))
+    raise RuntimeError(f"Échec de l'envoi de la partie {part_number}")
+
+def upload_personal_file_chunked(file, title: str, tags: str = "", is_public: bool = False):
+    """Uploader un gros fichier en plusieurs parties (reprise possible après une coupure)"""
+    headers = get_headers()
+    part_headers = get_headers_multipart()
+    resume_key = f"{file.name}:{file.size}"
+    pending = st.session_state.setdefault('upload_sessions', {})
+    
+    # Reprendre la session précédente pour ce fichier si elle existe encore
+    session = None
+    if resume_key in pending:
+        response = requests.get(f"{API_BASE_URL}/my-files/uploads/{pending[resume_key]}", headers=headers)
+        if response.status_code == 200:
+            session = response.json()
+    if session is None:
+        response = requests.post(
+            f"{API_BASE_URL}/my-files/uploads",
+            headers=headers,
+            json={'filename': file.name, 'total_size': file.size, 'title': title,
+                  'tags': tags, 'is_public': is_public, 'part_size': UPLOAD_PART_SIZE}
+        )
+        if response.status_code != 200:
+            return False, response.json().get('detail', 'Erreur lors de l\'upload'), None
+        session = response.json()
+        pending[resume_key] = session['id']
+    
+    missing = [n for n in range(1, session['part_count'] + 1) if n not in set(session['received_parts'])]
+    progress = st.progress(1 - len(missing) / session['part_count'], text="Upload en cours...")
+    
+    def read_part(part_number):
+        file.seek((part_number - 1) * session['part_size'])
+        return file.read(session['part_size'])
+    
+    with ThreadPoolExecutor(max_workers=UPLOAD_PARALLEL_PARTS) as executor:
+        # Fenêtre bornée : au plus quelques parties en mémoire à la fois
+        futures, done = set(), 0
+        for part_number in missing:
+            futures.add(executor.submit(_send_upload_part, part_headers, session['id'], part_number, read_part(part_number)))
+            if len(futures) >= UPLOAD_PARALLEL_PARTS * 2:
+                finished = next(as_completed(futures))
+                futures.discard(finished)
+                finished.result()
+                done += 1
+                progress.progress(1 - (len(missing) - done) / session['part_count'])
+        for finished in as_completed(futures):
+            finished.result()
+    progress.empty()
+    
+    response = requests.post(f"{API_BASE_URL}/my-files/uploads/{session['id']}/complete", headers=headers)
+    if response.status_code == 200:
+        pending.pop(resume_key, None)
+        return True, "Fichier uploadé avec succès!", response.json()
+    return False, response.json().get('detail', 'Erreur lors de l\'upload'), None
+
 def upload_personal_file(file, title: str, tags: str = "", is_public: bool = False):
     """Uploader un fichier personnel"""
     try:
+        if file.size > CHUNKED_UPLOAD_THRESHOLD:
+            return upload_personal_file_chunked(file, title, tags, is_public)
+        
         files = {'file': (file.name, file, file.type)}
         data = {'title': title, 'tags': tags, 'is_public': str(is_public).lower()}
         
@@ -744,7 +845,7 @@ def show_view_file_page():
     else:
         # Fichier binaire ou pas de contenu
         # Pour obtenir la taille, nous devons faire un appel supplémentaire à l'endpoint de liste
-        files_list = make_request("/my-files/")
+        files_list = make_request("/my-files/?fields=id,file_size")
         file_size = "N/A"
         
         if files_list:
@@ -777,7 +878,7 @@ def show_view_file_page():
             
             # Obtenir la taille depuis la liste des fichiers
             file_size_display = "N/A"
-            files_list = make_request("/my-files/")
+            files_list = make_request("/my-files/?fields=id,file_size")
             if files_list:
                 for file in files_list:
                     if file['id'] == file_id:
@@ -4,6 +4,16 @@ import json
 
 BASE_URL = "http://localhost:8000"
 
+def login_user(email: str, password: str):
+    """En-tête d'authentification (jeton Bearer) et client d'un utilisateur de démonstration"""
+    response = requests.post(f"{BASE_URL}/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    token = response.json()
+    return {"Authorization": f"Bearer {token['access_token']}"}, token["user"]["client_id"]
+
+def login(email: str, password: str) -> dict:
+    return login_user(email, password)[0]
+
 def test_health_check():
     """Test du endpoint de santé"""
     response = requests.get(f"{BASE_URL}/health")
@@ -18,7 +28,7 @@ def test_invalid_api_key():
 
 def test_client_a_access():
     """Test l'accès du Client A à ses documents"""
-    headers = {"X-APP-KEY": "temaTA_key"}
+    headers, client_id = login_user("admin@client-a.com", "password123")
     
     # Récupérer les documents
     response = requests.get(f"{BASE_URL}/documents/", headers=headers)
@@ -26,14 +36,16 @@ def test_client_a_access():
     
     documents = response.json()
     print(f"Client A a {len(documents)} documents")
+    assert documents
     
     # Vérifier que tous les documents appartiennent au Client A
     for doc in documents:
-        assert "Client A" in doc["title"] or "strategie" in doc["content"].lower()
+        assert doc["client_id"] == client_id
+        assert doc["title"] != "Produit RC Pro B"
 
 def test_client_b_access():
     """Test l'accès du Client B à ses documents"""
-    headers = {"X-APP-KEY": "temaTB_key"}
+    headers, client_id = login_user("admin@client-b.com", "password456")
     
     # Récupérer les documents
     response = requests.get(f"{BASE_URL}/documents/", headers=headers)
@@ -41,14 +53,16 @@ def test_client_b_access():
     
     documents = response.json()
     print(f"Client B a {len(documents)} documents")
+    assert documents
     
     # Vérifier que tous les documents appartiennent au Client B
     for doc in documents:
-        assert "Client B" in doc["title"] or "marche" in doc["content"].lower()
+        assert doc["client_id"] == client_id
+        assert doc["title"] != "Produit RC Pro A"
 
 def test_create_document():
     """Test la création d'un document"""
-    headers = {"X-APP-KEY": "temaTA_key", "Content-Type": "application/json"}
+    headers = {**login("admin@client-a.com", "password123"), "Content-Type": "application/json"}
     
     new_doc = {
         "title": "Test document Client A",
@@ -71,13 +85,18 @@ def test_create_document():
 
 def test_search_documents():
     """Test la recherche de documents"""
-    headers = {"X-APP-KEY": "temaTA_key"}
+    headers = login("admin@client-a.com", "password123")
     
-    response = requests.get(f"{BASE_URL}/search/?query=stratégie", headers=headers)
+    response = requests.get(f"{BASE_URL}/search/?query=résiliation", headers=headers)
     assert response.status_code == 200
     
     results = response.json()
     assert len(results) > 0
+    
+    # Terme propre au Client A : aucun résultat pour le Client B
+    response = requests.get(f"{BASE_URL}/search/?query=résiliation", headers=login("admin@client-b.com", "password456"))
+    assert response.status_code == 200
+    assert response.json() == []
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
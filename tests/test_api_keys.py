@@ -0,0 +1,48 @@
+import pytest
+import requests
+
+BASE_URL = "http://localhost:8000"
+
+
+def login(email: str, password: str) -> dict:
+    response = requests.post(f"{BASE_URL}/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_api_key_lifecycle():
+    """La clé complète n'est retournée qu'à la création, puis authentifie jusqu'à sa révocation"""
+    headers = login("admin@client-a.com", "password123")
+
+    response = requests.post(f"{BASE_URL}/api-keys/", json={"name": "test-lifecycle"}, headers=headers)
+    assert response.status_code == 200
+    created = response.json()
+    key = created["key"]
+    assert key.startswith("tema_")
+    assert key.startswith(created["key_prefix"])
+
+    # La liste n'expose que le préfixe
+    response = requests.get(f"{BASE_URL}/api-keys/", headers=headers)
+    assert response.status_code == 200
+    listed = [k for k in response.json() if k["id"] == created["id"]][0]
+    assert "key" not in listed
+    assert listed["key_prefix"] == created["key_prefix"]
+
+    # Authentification avec la clé (deux fois : base puis cache des principaux)
+    for _ in range(2):
+        response = requests.get(f"{BASE_URL}/profile", headers={"Authorization": f"Bearer {key}"})
+        assert response.status_code == 200
+
+    # Même préfixe, secret différent
+    response = requests.get(f"{BASE_URL}/profile", headers={"Authorization": f"Bearer {key[:-1]}X"})
+    assert response.status_code == 401
+
+    # Révocation
+    response = requests.delete(f"{BASE_URL}/api-keys/{created['id']}", headers=headers)
+    assert response.status_code == 200
+    response = requests.get(f"{BASE_URL}/profile", headers={"Authorization": f"Bearer {key}"})
+    assert response.status_code == 401
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,30 @@
+import gzip
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+os.environ.setdefault("STORAGE_URL", "memory:")  # Pas d'arborescence ./user_files créée par l'import
+
+from blob_compression import BlobCodec  # noqa: E402
+from file_storage import FileStorageManager  # noqa: E402
+from storage_drivers import MemoryStorageDriver  # noqa: E402
+
+
+def test_gzip_blob_round_trip():
+    """Blob texte compressé : taille et hash logiques, contenu relu à l'identique"""
+    storage = FileStorageManager(driver=MemoryStorageDriver())
+    storage.codec = BlobCodec(storage.driver, mode="gzip")
+    data = "ligne de notes accentuées\n".encode() * 5000
+
+    blob = storage.write_user_blob(1, "client_1/user_1/notes.txt", io.BytesIO(data), ".txt")
+    assert blob["storage_encoding"] == "gzip"
+    assert blob["file_size"] == len(data)
+    assert blob["stored_size"] < len(data) // 10
+    assert gzip.decompress(storage.driver.read_bytes("client_1/user_1/notes.txt")) == data
+    assert storage.read_blob("client_1/user_1/notes.txt", "gzip") == data
+    assert b"".join(storage.iter_blob_chunks("client_1/user_1/notes.txt", "gzip", chunk_size=100)) == data
+
+    # Les formats non texte restent bruts
+    pdf = storage.write_user_blob(1, "client_1/user_1/scan.pdf", io.BytesIO(b"%PDF-1.4"), ".pdf")
+    assert pdf["storage_encoding"] is None and pdf["stored_size"] == pdf["file_size"] == 8
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import anyio
+import pytest
+from anyio import to_thread
+from fastapi import HTTPException
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from body_stream import BlockingBodyReader, read_prefix  # noqa: E402
+
+
+async def body(*chunks):
+    for chunk in chunks:
+        await anyio.sleep(0)
+        yield chunk
+
+
+def test_reader_replays_prefix_then_reads_chunks_from_worker_thread():
+    async def main():
+        chunks = body(b"ab", b"cd", b"", b"efgh")
+        head = await read_prefix(chunks, 3)
+        reader = BlockingBodyReader(chunks, prefix=head)
+        return head, await to_thread.run_sync(lambda: [reader.read(3), reader.read(), reader.read(1)])
+
+    head, reads = anyio.run(main)
+    assert head == b"abcd"
+    assert reads == [b"abc", b"defgh", b""]
+
+
+def test_reader_refuses_body_over_limit():
+    async def main():
+        reader = BlockingBodyReader(body(b"x" * 6, b"y" * 6), max_bytes=10)
+        assert await to_thread.run_sync(reader.read, 4) == b"xxxx"
+        for _ in range(2):  # L'erreur est renvoyée à chaque lecture suivante
+            with pytest.raises(HTTPException) as error:
+                await to_thread.run_sync(reader.read)
+            assert error.value.status_code == 413
+
+    anyio.run(main)
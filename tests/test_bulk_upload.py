@@ -0,0 +1,98 @@
+import io
+import tarfile
+import zipfile
+
+import requests
+
+BASE_URL = "http://localhost:8000"
+
+
+def login(email: str, password: str) -> dict:
+    response = requests.post(f"{BASE_URL}/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_bulk_zip_upload():
+    """Les fichiers autorisés d'une archive sont importés, les autres signalés"""
+    headers = login("user@client-a.com", "password123")
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("notes/a/bulk_note.txt", "note importée A")
+        archive.writestr("notes/b/bulk_note.txt", "note importée B")
+        archive.writestr("outils/script.exe", "MZ")
+
+    response = requests.post(
+        f"{BASE_URL}/my-files/bulk",
+        files={"archive": ("lot.zip", buffer.getvalue(), "application/zip")},
+        data={"tags": "bulk-test"},
+        headers=headers
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["imported_count"] == 2
+    assert [s["name"] for s in result["skipped"]] == ["outils/script.exe"]
+
+    # Même nom dans deux dossiers : deux fichiers distincts
+    contents = sorted(
+        requests.get(f"{BASE_URL}/my-files/{file_id}", headers=headers).json()["content"]
+        for file_id in result["file_ids"]
+    )
+    assert contents == ["note importée A", "note importée B"]
+
+    for file_id in result["file_ids"]:
+        assert requests.delete(f"{BASE_URL}/my-files/{file_id}", headers=headers).status_code == 200
+
+
+def test_bulk_tar_streamed_as_raw_body():
+    """Tar compressé envoyé en corps brut, importé au fil de la réception"""
+    headers = login("user@client-a.com", "password123")
+
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in (("flux/a.txt", b"note en flux A"), ("flux/b.md", b"# note en flux B")):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+    def chunks(data, size=1000):
+        for start in range(0, len(data), size):
+            yield data[start:start + size]
+
+    response = requests.post(
+        f"{BASE_URL}/my-files/bulk",
+        params={"tags": "bulk-stream"},
+        data=chunks(buffer.getvalue()),  # Transfer-Encoding: chunked, sans Content-Length
+        headers={**headers, "Content-Type": "application/gzip"}
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["imported_count"], result["skipped_count"]) == (2, 0)
+    try:
+        read = requests.get(f"{BASE_URL}/my-files/{result['file_ids'][0]}", headers=headers).json()
+        assert read["content"] == "note en flux A" and read["tags"] == "bulk-stream"
+    finally:
+        for file_id in result["file_ids"]:
+            assert requests.delete(f"{BASE_URL}/my-files/{file_id}", headers=headers).status_code == 200
+
+    # Corps qui n'est pas une archive
+    invalid = requests.post(f"{BASE_URL}/my-files/bulk", data=b"ceci n'est pas une archive", headers=headers)
+    assert invalid.status_code == 400
+
+
+def test_bulk_zip_raw_body_lists_capped_skips():
+    """Zip en corps brut ; la liste des fichiers ignorés est bornée, pas leur nombre"""
+    headers = login("user@client-a.com", "password123")
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for i in range(150):
+            archive.writestr(f"outils/script_{i}.exe", "MZ")
+
+    response = requests.post(f"{BASE_URL}/my-files/bulk", data=buffer.getvalue(),
+                             headers={**headers, "Content-Type": "application/zip"})
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["imported_count"], result["skipped_count"]) == (0, 150)
+    assert len(result["skipped"]) == 100
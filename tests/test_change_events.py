@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import change_events  # noqa: E402
+import change_tracking  # noqa: E402
+import models  # noqa: E402
+
+# Base sur disque : le bus lit avec sa propre connexion, comme entre deux workers
+engine = create_engine(f"sqlite:///{tempfile.mkdtemp()}/events.db", connect_args={"check_same_thread": False})
+models.Base.metadata.create_all(engine)
+Session = sessionmaker(bind=engine)
+
+
+def test_events_are_delivered_once_in_commit_order():
+    bus = change_events.ChangeEventBus(Session)
+    received, failures = [], []
+    bus.subscribe(lambda events: failures.append(1 / 0))
+    bus.subscribe(received.extend)
+
+    with Session() as db:
+        change_tracking.touch(db, 1, kind=change_events.DOCUMENTS)
+        db.commit()
+        # Premier appel : position courante, l'historique n'est pas rejoué
+        assert bus.poll() == 0
+
+        change_tracking.touch(db, 1, 7, change_events.FILES, object_id=42)
+        change_tracking.touch(db, 1, 7, change_events.FILES)
+        change_events.publish(db, change_events.API_KEY, 1, 7, object_id=3)
+        assert bus.poll() == 0  # pas encore commité
+        db.commit()
+
+        assert bus.poll() == 3
+        assert bus.poll() == 0
+
+    assert [(e["kind"], e["user_id"], e["object_id"], e["version"]) for e in received] == [
+        ("files", 7, 42, 1),
+        ("files", 7, None, 2),
+        ("api_key", 7, 3, None),
+    ]
+    assert bus.stats()["delivered"] == 3
+
+
+def test_prune_keeps_recent_events_and_ids_are_not_reused():
+    with Session() as db:
+        change_events.publish(db, change_events.DATA, 2)
+        db.commit()
+        old = db.query(models.ChangeEvent).order_by(models.ChangeEvent.id.desc()).first()
+        last_id = old.id
+        old.created_at = datetime.utcnow() - timedelta(hours=2)
+        db.commit()
+
+        assert change_events.prune(db, retention_seconds=3600) >= 1
+        change_events.publish(db, change_events.DATA, 2)
+        db.commit()
+        assert db.query(models.ChangeEvent.id).order_by(models.ChangeEvent.id.desc()).first().id > last_id
+
+
+def test_response_cache_evicts_changed_clients():
+    cache = change_tracking.ResponseCache(max_entries=10, max_bytes=10000)
+    cache.set((1, 10, "/my-files/", (), (1,)), b"a", "application/json")
+    cache.set((2, 20, "/my-files/", (), (1,)), b"b", "application/json")
+    cache.evict_clients({1})
+    assert cache.stats()["entries"] == 1
+    assert cache.get((2, 20, "/my-files/", (), (1,))) is not None
@@ -0,0 +1,99 @@
+import io
+import json
+import os
+import sys
+import tempfile
+
+import anyio
+import pytest
+from anyio import to_thread
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import document_transfer  # noqa: E402
+import models  # noqa: E402
+from body_stream import BlockingBodyReader  # noqa: E402
+
+
+def records(payload: bytes):
+    return list(document_transfer.iter_json_records(io.BytesIO(payload)))
+
+
+@pytest.fixture(autouse=True)
+def tiny_chunks(monkeypatch):
+    # Morceaux de 7 octets : éléments, nombres et caractères UTF-8 coupés en deux
+    monkeypatch.setattr(document_transfer, "CHUNK_SIZE", 7)
+
+
+def test_ndjson_lines_are_independent():
+    payload = "\ufeff" + "\n".join([json.dumps({"title": "été", "content": "x"}), "{oops", "", "12345"])
+    assert records(payload.encode()) == [
+        (1, {"title": "été", "content": "x"}, None),
+        (2, None, "JSON invalide: Expecting property name enclosed in double quotes (colonne 2)"),
+        (4, 12345, None),
+    ]
+
+
+def test_json_array_is_parsed_incrementally():
+    items = [{"title": f"doc {i}", "content": "é" * i} for i in range(20)] + [123456789]
+    parsed = records(json.dumps(items, ensure_ascii=False).encode())
+    assert [value for _, value, _ in parsed] == items
+    assert [index for index, _, _ in parsed] == list(range(1, 22))
+
+    with pytest.raises(ValueError):
+        records(b'[{"title": "a", "content": "b"} {"title": "c"}]')
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 12))
+def test_json_array_tokens_cut_at_any_boundary(monkeypatch, chunk_size):
+    monkeypatch.setattr(document_transfer, "CHUNK_SIZE", chunk_size)
+    items = [{"score": -1.25e-3, "ok": True, "no": False, "none": None, "text": "é 😀 \\ \""}, 31.5, -7]
+    parsed = records(json.dumps(items).encode())  # ensure_ascii : échappements \uXXXX coupés aussi
+    assert [value for _, value, _ in parsed] == items
+
+
+def test_malformed_element_fails_without_reading_rest_of_body():
+    class CountingStream(io.BytesIO):
+        read_bytes = 0
+
+        def read(self, size=-1):
+            data = super().read(size)
+            self.read_bytes += len(data)
+            return data
+
+    good = json.dumps({"title": "ok", "content": "x" * 100})
+    stream = CountingStream(("[" + good + ', {"title": oops}, ' + ", ".join([good] * 10000) + "]").encode())
+    with pytest.raises(ValueError, match="élément 2"):
+        list(document_transfer.iter_json_records(stream))
+    assert stream.read_bytes < 1000
+
+
+def test_import_starts_before_body_is_complete():
+    engine = create_engine(f"sqlite:///{tempfile.mkdtemp()}/transfer.db", connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    client = models.Client(name="Client")
+    db.add(client)
+    db.commit()
+    user = models.User(email="user@client.example", hashed_password="x", client_id=client.id)
+    db.add(user)
+    db.commit()
+    seen = []
+
+    async def body():
+        for i in range(3):
+            # Lots de 2 : le lot précédent est déjà en base quand le morceau suivant arrive
+            seen.append(db.query(models.Document).count())
+            lines = [json.dumps({"title": f"doc {2 * i + n}", "content": "x"}) for n in range(2)]
+            yield ("\n".join(lines) + "\n").encode()
+
+    async def main():
+        importer = document_transfer.DocumentImporter(db, user, batch_size=2)
+        return await to_thread.run_sync(importer.run, BlockingBodyReader(body()))
+
+    result = anyio.run(main)
+    db.close()
+    assert (result["created_count"], result["error_count"]) == (6, 0)
+    assert seen == [0, 2, 4]
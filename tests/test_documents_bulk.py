@@ -0,0 +1,34 @@
+import json
+
+import requests
+
+BASE_URL = "http://localhost:8000"
+
+
+def login(email: str, password: str) -> dict:
+    response = requests.post(f"{BASE_URL}/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_bulk_ndjson_streamed_body():
+    """Corps NDJSON envoyé par morceaux (sans Content-Length), une ligne invalide"""
+    headers = login("admin@client-a.com", "password123")
+    lines = [json.dumps({"title": f"Import flux {i}", "content": "contenu importé"}) for i in range(5)]
+    lines.insert(2, "{oops")
+
+    def chunks():
+        for line in lines:
+            yield (line + "\n").encode()
+
+    response = requests.post(f"{BASE_URL}/documents/bulk", params={"batch_size": 2}, data=chunks(),
+                             headers={**headers, "Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    result = response.json()
+    try:
+        assert (result["created_count"], result["error_count"], result["aborted"]) == (5, 1, None)
+        assert [r["line"] for r in result["results"] if r["error"]] == [3]
+    finally:
+        for row in result["results"]:
+            if row["id"]:
+                assert requests.delete(f"{BASE_URL}/documents/{row['id']}", headers=headers).status_code == 200
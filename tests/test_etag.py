@@ -0,0 +1,37 @@
+import requests
+
+BASE_URL = "http://localhost:8000"
+
+
+def login(email: str, password: str) -> dict:
+    response = requests.post(f"{BASE_URL}/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_list_not_modified_until_write():
+    """304 tant que rien ne change, nouvel ETag après une création"""
+    headers = login("admin@client-a.com", "password123")
+    response = requests.get(f"{BASE_URL}/documents/", headers=headers)
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    response = requests.get(f"{BASE_URL}/documents/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    created = requests.post(f"{BASE_URL}/documents/", json={"title": "ETag", "content": "test"}, headers=headers)
+    try:
+        response = requests.get(f"{BASE_URL}/documents/", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert any(d["id"] == created.json()["id"] for d in response.json())
+    finally:
+        requests.delete(f"{BASE_URL}/documents/{created.json()['id']}", headers=headers)
+
+
+def test_etag_is_per_user():
+    admin = login("admin@client-a.com", "password123")
+    user = login("user@client-a.com", "password123")
+    etag = requests.get(f"{BASE_URL}/my-files/", headers=admin).headers["ETag"]
+    response = requests.get(f"{BASE_URL}/my-files/", headers={**user, "If-None-Match": etag})
+    assert response.status_code == 200
@@ -0,0 +1,97 @@
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import models  # noqa: E402
+import sql_monitor  # noqa: E402
+from database import upgrade_schema  # noqa: E402
+from file_catalog import PublicFileCatalog  # noqa: E402
+
+engine = create_engine(f"sqlite:///{tempfile.mkdtemp()}/catalog.db", connect_args={"check_same_thread": False})
+models.Base.metadata.create_all(engine)
+upgrade_schema(engine)
+Session = sessionmaker(bind=engine)
+
+
+@pytest.fixture(scope="module")
+def data():
+    db = Session()
+    client, other = models.Client(name="Client A"), models.Client(name="Client B")
+    db.add_all([client, other])
+    db.commit()
+    alice = models.User(email="alice@a.example", hashed_password="x", client_id=client.id)
+    bob = models.User(email="bob@a.example", hashed_password="x", client_id=client.id)
+    mallory = models.User(email="mallory@b.example", hashed_password="x", client_id=other.id)
+    db.add_all([alice, bob, mallory])
+    db.commit()
+
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(6):
+        owner = alice if i % 2 == 0 else bob
+        rows.append(models.UserFile(
+            filename=f"f{i}.txt", original_filename=f"rapport_{i}.txt", file_path=f"k/f{i}.txt",
+            title=f"Rapport {i}", client_id=client.id, user_id=owner.id, file_size=10,
+            is_public=i != 5, tags="rh" if i < 3 else "finance", created_at=start + timedelta(days=i)
+        ))
+    rows.append(models.UserFile(
+        filename="b.txt", file_path="k/b.txt", title="Rapport client B", client_id=other.id, user_id=mallory.id,
+        file_size=10, is_public=True, tags="rh", created_at=start
+    ))
+    db.add_all(rows)
+    db.commit()
+    yield {"db": db, "client": client.id, "other": other.id, "alice": alice.id, "bob": bob.id}
+    db.close()
+
+
+def titles(files):
+    return [f.title for f in files]
+
+
+def test_lists_public_files_of_the_client_newest_first(data):
+    catalog = PublicFileCatalog(data["db"])
+    # Fichier 5 privé, fichier du client B exclu
+    assert titles(catalog.list(data["client"])) == ["Rapport 4", "Rapport 3", "Rapport 2", "Rapport 1", "Rapport 0"]
+    assert catalog.count(data["client"]) == 5
+    assert titles(catalog.list(data["other"])) == ["Rapport client B"]
+
+
+def test_filters_and_pagination(data):
+    catalog = PublicFileCatalog(data["db"])
+    # Fichiers des autres utilisateurs seulement
+    assert titles(catalog.list(data["client"], exclude_user_id=data["alice"])) == ["Rapport 3", "Rapport 1"]
+    assert catalog.count(data["client"], exclude_user_id=data["alice"]) == 2
+    assert titles(catalog.list(data["client"], tag="finance")) == ["Rapport 4", "Rapport 3"]
+    assert catalog.count(data["client"], tag="rh") == 3
+    assert titles(catalog.list(data["client"], skip=1, limit=2)) == ["Rapport 3", "Rapport 2"]
+    assert titles(catalog.search(data["client"], "rapport_1")) == ["Rapport 1"]
+    assert titles(catalog.search(data["client"], "Rapport", exclude_user_id=data["bob"], limit=2)) == [
+        "Rapport 4", "Rapport 2"
+    ]
+
+
+def test_list_uses_the_client_public_created_index(data):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        PublicFileCatalog(data["db"]).list(data["client"], limit=10)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    statement, parameters = statements[-1]
+    with engine.connect() as conn:
+        plan = sql_monitor.explain(conn, statement, parameters)
+    assert any("ix_user_files_client_public_created" in line for line in plan), plan
+    assert not any("TEMP B-TREE" in line for line in plan), plan
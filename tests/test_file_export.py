@@ -0,0 +1,50 @@
+import io
+import os
+import sys
+import zipfile
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+os.environ.setdefault("STORAGE_URL", "memory:")  # Pas d'arborescence ./user_files créée par l'import
+
+import file_export  # noqa: E402
+from file_storage import FileStorageManager  # noqa: E402
+from storage_drivers import MemoryStorageDriver  # noqa: E402
+
+
+def make_export(files):
+    storage = FileStorageManager(driver=MemoryStorageDriver())
+    rows = []
+    for i, (name, data) in enumerate(files, start=1):
+        key = f"client_1/user_1/{i}_{name}"
+        storage.driver.put_bytes(key, data)
+        rows.append(SimpleNamespace(file_path=key, original_filename=name, filename=name,
+                                    created_at=datetime(2026, 1, 2, 3, 4, 5)))
+    return file_export.build_export(storage, rows)
+
+
+@pytest.mark.parametrize("zip64", [False, True])
+def test_export_is_valid_and_ranges_match(monkeypatch, zip64):
+    if zip64:
+        # Forcer les enregistrements ZIP64 sans fichiers de 4 Go
+        monkeypatch.setattr(file_export, "ZIP64_ENTRY_THRESHOLD", 0)
+    files = [("notes.txt", b"bonjour " * 500), ("notes.txt", b"doublon"), ("scan.pdf", os.urandom(3000))]
+
+    full = b"".join(make_export(files))
+    with zipfile.ZipFile(io.BytesIO(full)) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["notes.txt", "notes_2.txt", "scan.pdf"]
+        assert archive.getinfo("scan.pdf").compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo("notes.txt").compress_type == zipfile.ZIP_DEFLATED
+        assert archive.read("notes_2.txt") == b"doublon"
+
+    # Plages recalculées sans cache : mêmes octets que l'archive complète
+    file_export.entry_info_cache._items.clear()
+    export = make_export(files)
+    infos, total = export.layout()
+    assert total == len(full)
+    for start, end in [(0, 10), (100, 2999), (len(full) - 30, len(full) - 1)]:
+        assert b"".join(export.iter_range(start, end, infos)) == full[start:end + 1]
@@ -0,0 +1,122 @@
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import index_server  # noqa: E402
+
+
+def test_ring_spreads_users_and_moves_few_on_resize():
+    nodes = [f"/tmp/index-{i}.sock" for i in range(4)]
+    ring = index_server.HashRing(nodes)
+    owners = {user_id: ring.node_for(user_id) for user_id in range(4000)}
+    counts = [list(owners.values()).count(node) for node in nodes]
+    assert min(counts) > 600
+
+    grown = index_server.HashRing(nodes + ["/tmp/index-4.sock"])
+    moved = [user_id for user_id, node in owners.items() if grown.node_for(user_id) != node]
+    # Seuls les utilisateurs repris par le nouveau serveur changent de serveur
+    assert all(grown.node_for(user_id) == "/tmp/index-4.sock" for user_id in moved)
+    assert len(moved) < 0.35 * len(owners)
+
+
+@pytest.fixture
+def server_path():
+    path = os.path.join(tempfile.mkdtemp(), "index-0.sock")
+    server = index_server.IndexServer(path, workers=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    for _ in range(100):
+        if os.path.exists(path):
+            break
+        time.sleep(0.01)
+    yield path
+    server.shutdown()
+    thread.join(5)
+
+
+def test_client_batches_requests_over_pooled_connections(server_path):
+    client = index_server.IndexClient([server_path], pool_size=2, batch_size=16)
+    try:
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            replies = list(executor.map(lambda _: client.call(server_path, {"op": "stats"}), range(100)))
+        assert all(reply["socket"] == server_path for reply in replies)
+        stats = client.stats()[0]
+        assert stats["requests"] == 101
+        assert stats["batches"] < stats["requests"]
+
+        with pytest.raises(index_server.IndexServerError):
+            client.call(server_path, {"op": "inconnue"})
+    finally:
+        client.close()
+
+
+def test_unreachable_server_is_reported():
+    path = os.path.join(tempfile.mkdtemp(), "absent.sock")
+    client = index_server.IndexClient([path], pool_size=1, timeout=2)
+    try:
+        with pytest.raises(index_server.IndexServerUnavailable):
+            client.call(path, {"op": "stats"})
+    finally:
+        client.close()
+
+
+class FakeServer:
+    """Serveur minimal : `behaviours[n]` décide du sort de la n-ième connexion ("close" ou "hang")"""
+
+    def __init__(self, behaviours):
+        self.path = os.path.join(tempfile.mkdtemp(), "fake.sock")
+        self.behaviours = behaviours
+        self.frames = 0
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        self.listener.listen()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        for behaviour in self.behaviours:
+            conn, _ = self.listener.accept()
+            requests = index_server.receive_frame(conn)
+            self.frames += 1
+            index_server.send_frame(conn, [{"result": "ok"} for _ in requests])
+            if behaviour == "close":
+                conn.close()  # Redémarrage du serveur : la connexion du pool est morte
+                continue
+            while True:
+                try:
+                    index_server.receive_frame(conn)
+                except (OSError, ValueError):
+                    break
+                self.frames += 1  # "hang" : lot reçu, jamais de réponse
+
+
+def test_pooled_connection_closed_by_server_is_retried():
+    server = FakeServer(["close", "close"])
+    client = index_server.IndexClient([server.path], pool_size=1, timeout=2)
+    try:
+        assert client.call(server.path, {"op": "stats"}) == "ok"
+        assert client.call(server.path, {"op": "stats"}) == "ok"
+        assert server.frames == 2
+    finally:
+        client.close()
+
+
+def test_timeout_is_not_retried():
+    server = FakeServer(["hang", "hang"])
+    client = index_server.IndexClient([server.path], pool_size=1, timeout=0.3)
+    try:
+        assert client.call(server.path, {"op": "stats"}) == "ok"
+        with pytest.raises(index_server.IndexServerUnavailable):
+            client.call(server.path, {"op": "stats"})
+        time.sleep(0.6)
+        # Le lot en attente n'a pas été renvoyé sur une nouvelle connexion
+        assert server.frames == 2
+    finally:
+        client.close()
@@ -0,0 +1,40 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+import load_test  # noqa: E402
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 11)]
+    assert load_test.percentile(values, 50) == 5.0
+    assert load_test.percentile(values, 95) == 10.0
+    assert load_test.percentile(values, 10) == 1.0
+    assert load_test.percentile([1.0, 2.0], 50) == 1.0
+    assert load_test.percentile([7.0], 99) == 7.0
+    assert load_test.percentile([], 50) == 0.0
+
+
+def run(rps=100.0, **endpoints):
+    return {"results": {"rps": rps, "endpoints": {
+        name: {"count": count, "p50_ms": p50, "p95_ms": p95} for name, (count, p50, p95) in endpoints.items()
+    }}}
+
+
+def test_compare_flags_only_significant_regressions():
+    baseline = run(list_files=(200, 60.0, 90.0), login=(12, 85.0, 118.0), upload=(40, 70.0, 97.0))
+
+    # Variations d'une exécution identique à l'autre : p95 sur peu de requêtes, endpoint peu appelé
+    noisy = run(95.0, list_files=(190, 66.0, 100.0), login=(11, 100.0, 170.0), upload=(38, 74.0, 170.0))
+    assert load_test.compare(noisy, baseline, threshold=0.25, min_delta_ms=5.0) == []
+
+    slower = run(70.0, list_files=(150, 90.0, 91.0), upload=(40, 71.0, 300.0), rag_query=(50, 500.0, 900.0))
+    assert load_test.compare(slower, baseline, threshold=0.25, min_delta_ms=5.0) == [
+        "débit global: 100.0 -> 70.0 req/s",
+        "list_files p50_ms: 60.0 -> 90.0 ms",
+    ]
+
+    # Écart relatif important mais absolu négligeable
+    fast = run(list_files=(200, 1.0, 2.0))
+    assert load_test.compare(run(list_files=(200, 2.0, 4.0)), fast, threshold=0.25, min_delta_ms=5.0) == []
@@ -0,0 +1,81 @@
+import pytest
+import requests
+
+BASE_URL = "http://localhost:8000"
+
+
+def login(email: str, password: str) -> dict:
+    response = requests.post(f"{BASE_URL}/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_metrics_use_route_templates():
+    """Latence par gabarit de route, pas par URL (cardinalité bornée)"""
+    headers = login("user@client-a.com", "password123")
+    requests.get(f"{BASE_URL}/my-files/", headers=headers)
+    requests.get(f"{BASE_URL}/my-files/999999", headers=headers)
+
+    response = requests.get(f"{BASE_URL}/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/my-files/",status="200"}' in text
+    assert 'route="/my-files/{file_id}",status="404"' in text
+    assert "/my-files/999999" not in text
+    assert 'db_queries_per_request_count{route="/my-files/"}' in text
+
+
+def test_rag_debug_timings_for_admins_only():
+    question = {"question": "Quelle est la procédure ?", "debug_timings": True}
+    admin = login("admin@client-a.com", "password123")
+    # Un fichier ajouté force le rechargement de l'index gardé en cache
+    uploaded = requests.post(
+        f"{BASE_URL}/my-files/upload",
+        data={"title": "Procédure de test"},
+        files={"file": ("procedure_metrics.txt", "Procédure de test des métriques".encode(), "text/plain")},
+        headers=admin
+    ).json()
+    try:
+        result = requests.post(f"{BASE_URL}/my-files/rag/query", json=question, headers=admin).json()
+    finally:
+        requests.delete(f"{BASE_URL}/my-files/{uploaded['id']}", headers=admin)
+    stages = [stage["name"] for stage in result["debug_timings"]["stages"]]
+    assert stages[0] == "rag.request"
+    assert "rag.load_files" in stages
+
+    user = login("user@client-a.com", "password123")
+    result = requests.post(f"{BASE_URL}/my-files/rag/query", json=question, headers=user).json()
+    assert "debug_timings" not in result
+
+
+def query_count(response) -> int:
+    """Nombre de requêtes SQL annoncé par l'en-tête Server-Timing"""
+    timing = response.headers["Server-Timing"]
+    return int(timing.split('desc="')[1].split()[0])
+
+
+@pytest.mark.parametrize("path, budget", [
+    ("/debug/client-info", 2),
+    ("/my-files/", 3),
+    ("/documents/", 3),
+    ("/my-files/stats", 5),
+])
+def test_query_budgets(path, budget):
+    headers = login("admin@client-a.com", "password123")
+    response = requests.get(f"{BASE_URL}{path}", headers=headers)
+    assert response.status_code == 200
+    assert query_count(response) <= budget
+
+
+def test_profile_header_for_admins_only():
+    admin = login("admin@client-a.com", "password123")
+    response = requests.get(f"{BASE_URL}/my-files/", headers={**admin, "X-Profile": "1"})
+    profile = response.json()
+    assert response.headers["X-Profiled-Status"] == "200"
+    assert profile["path"] == "/my-files/"
+    assert "top_functions" in profile
+
+    user = login("user@client-a.com", "password123")
+    response = requests.get(f"{BASE_URL}/my-files/", headers={**user, "X-Profile": "1"})
+    assert isinstance(response.json(), list)
@@ -0,0 +1,28 @@
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import metrics  # noqa: E402
+
+
+def test_configured_workers_from_command_line_or_environment():
+    assert metrics.configured_workers(["uvicorn", "app:app"], {}) == 1
+    assert metrics.configured_workers(["uvicorn", "app:app", "--workers", "4"], {}) == 4
+    assert metrics.configured_workers(["gunicorn", "-w", "3", "app:app"], {}) == 3
+    assert metrics.configured_workers(["uvicorn", "app:app", "--workers=2"], {"WEB_CONCURRENCY": "8"}) == 2
+    assert metrics.configured_workers(["uvicorn", "app:app"], {"WEB_CONCURRENCY": "8"}) == 8
+
+
+def test_warning_when_metrics_are_not_aggregated(monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "MULTIPROC_DIR", None)
+    monkeypatch.setattr(sys, "argv", ["uvicorn", "app:app", "--workers", "4"])
+    with caplog.at_level(logging.WARNING, logger="metrics"):
+        metrics.check_worker_setup()
+    assert "4 workers" in caplog.text
+
+    caplog.clear()
+    monkeypatch.setattr(sys, "argv", ["uvicorn", "app:app"])
+    metrics.check_worker_setup()
+    assert caplog.text == ""
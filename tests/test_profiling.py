@@ -0,0 +1,34 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from profiling import StackSampler  # noqa: E402
+
+
+def busy_helper(deadline):
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+def endpoint():
+    busy_helper(time.perf_counter() + 0.2)
+
+
+def test_sampler_keeps_only_endpoint_stacks():
+    scope = {"endpoint": endpoint}
+    sampler = StackSampler(scope, 0.002)
+    sampler.start()
+    worker = threading.Thread(target=endpoint)
+    worker.start()
+    worker.join()
+    sampler.stop()
+
+    assert sampler.samples > 10
+    collapsed = sampler.collapsed()
+    assert all(line.startswith("test_profiling.py:endpoint;") for line in collapsed.splitlines())
+    assert "test_profiling.py:busy_helper" in collapsed
+    totals = {item["function"].split()[0]: item["total_samples"] for item in sampler.top_functions()}
+    assert totals["test_profiling.py:endpoint"] == max(totals.values())
@@ -0,0 +1,31 @@
+import requests
+
+BASE_URL = "http://localhost:8000"
+
+
+def login(email: str, password: str) -> dict:
+    response = requests.post(f"{BASE_URL}/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_document_summary_view():
+    """fields=summary : pas de contenu complet, seulement un extrait"""
+    headers = login("admin@client-a.com", "password123")
+    documents = requests.get(f"{BASE_URL}/documents/", params={"fields": "summary"}, headers=headers).json()
+    assert documents
+    for document in documents:
+        assert set(document) == {"id", "title", "size", "updated_at", "snippet"}
+        assert len(document["snippet"]) <= 200
+
+    response = requests.get(f"{BASE_URL}/documents/", params={"fields": "id,password"}, headers=headers)
+    assert response.status_code == 400
+
+
+def test_my_files_hide_storage_path():
+    headers = login("user@client-a.com", "password123")
+    files = requests.get(f"{BASE_URL}/my-files/", headers=headers).json()
+    assert all("file_path" not in f for f in files)
+
+    files = requests.get(f"{BASE_URL}/my-files/", params={"fields": "id,file_size"}, headers=headers).json()
+    assert all(set(f) == {"id", "file_size"} for f in files)
@@ -0,0 +1,68 @@
+import uuid
+
+import requests
+
+BASE_URL = "http://localhost:8000"
+
+
+def login(email: str, password: str) -> dict:
+    response = requests.post(f"{BASE_URL}/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def ask(headers: dict, question: str) -> dict:
+    response = requests.post(f"{BASE_URL}/my-files/rag/query", json={"question": question}, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+def cites(result: dict, title: str) -> bool:
+    return any(source.startswith(title) for source in result["sources"])
+
+
+def test_cached_index_follows_uploads_and_deletes():
+    """L'index RAG gardé en mémoire voit un fichier ajouté puis supprimé"""
+    headers = login("user@client-a.com", "password123")
+    word = f"zephyrin{uuid.uuid4().hex[:8]}"
+    title = f"Note {word}"
+    question = f"Que dit la note {word} ?"
+
+    ask(headers, question)  # Index construit et mis en cache
+
+    response = requests.post(
+        f"{BASE_URL}/my-files/upload",
+        data={"title": title},
+        files={"file": (f"{word}.txt", f"La note {word} rappelle la procédure d'archivage.".encode(), "text/plain")},
+        headers=headers
+    )
+    assert response.status_code == 200
+    file_id = response.json()["id"]
+    try:
+        assert cites(ask(headers, question), title)
+    finally:
+        requests.delete(f"{BASE_URL}/my-files/{file_id}", headers=headers)
+
+    assert not cites(ask(headers, question), title)
+
+
+def test_public_files_are_shared_within_the_client_only():
+    """Un fichier public est trouvé par les autres utilisateurs du client, pas par un autre client"""
+    owner = login("user@client-a.com", "password123")
+    word = f"zephyrin{uuid.uuid4().hex[:8]}"
+    title = f"Note partagée {word}"
+    question = f"Que dit la note {word} ?"
+
+    response = requests.post(
+        f"{BASE_URL}/my-files/upload",
+        data={"title": title, "is_public": "true"},
+        files={"file": (f"{word}.txt", f"La note {word} rappelle la procédure d'archivage.".encode(), "text/plain")},
+        headers=owner
+    )
+    assert response.status_code == 200
+    file_id = response.json()["id"]
+    try:
+        assert cites(ask(login("admin@client-a.com", "password123"), question), title)
+        assert not cites(ask(login("admin@client-b.com", "password456"), question), title)
+    finally:
+        requests.delete(f"{BASE_URL}/my-files/{file_id}", headers=owner)
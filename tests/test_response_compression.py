@@ -0,0 +1,65 @@
+import gzip
+import os
+import sys
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from response_compression import CompressionMiddleware, choose_encoding  # noqa: E402
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=100)
+BODY = "ligne de texte\n" * 200
+
+
+@app.get("/text")
+def text():
+    return PlainTextResponse(BODY)
+
+
+@app.get("/small")
+def small():
+    return PlainTextResponse("court")
+
+
+@app.get("/stream")
+def stream():
+    return StreamingResponse((BODY for _ in range(3)), media_type="application/x-ndjson")
+
+
+@app.get("/zip")
+def archive():
+    return Response(BODY.encode(), media_type="application/zip")
+
+
+@app.get("/encoded")
+def encoded():
+    return Response(gzip.compress(BODY.encode()), media_type="text/plain", headers={"Content-Encoding": "gzip"})
+
+
+client = TestClient(app)
+
+
+def test_compression_rules():
+    response = client.get("/text", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text == BODY
+
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip" and response.text == BODY * 3
+
+    # Petite réponse, type binaire, déjà encodée, client sans gzip : inchangées
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/zip", headers={"Accept-Encoding": "gzip"}).headers
+    assert client.get("/encoded", headers={"Accept-Encoding": "gzip"}).text == BODY
+    assert "content-encoding" not in client.get("/text", headers={"Accept-Encoding": "identity"}).headers
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("") is None
@@ -0,0 +1,44 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import seed_data  # noqa: E402
+
+
+def plan(seed: int, index: int = 1):
+    seeder = seed_data.Seeder(None, clients=1, users_per_client=3, documents_per_client=4,
+                              files_per_user=2, seed=seed)
+    return seeder, seeder._plan_client(index)
+
+
+def documents(item):
+    return [(d["title"], d["content"], d["user_position"]) for d in item["documents"]]
+
+
+def test_plans_are_reproducible_per_seed_and_client():
+    seeder, first = plan(7)
+    _, again = plan(7)
+    _, other = plan(8)
+    for item in (first, again, other):
+        item["client"].pop("created_at")
+        for user in item["users"]:
+            user.pop("created_at")
+            user.pop("hashed_password")
+    # Les dates sont relatives à l'heure de lancement ; le reste est identique
+    assert documents(first) == documents(again)
+    assert first["users"] == again["users"]
+    assert [f["content"] for f in first["files"]] == [f["content"] for f in again["files"]]
+    assert documents(first) != documents(other)
+
+    assert first["client"]["name"] == "seed_000001"
+    assert [user["is_admin"] for user in first["users"]] == [True, False, False]
+    assert len(first["documents"]) == 4 and len(first["files"]) == 6
+    assert seeder.hashed_password.startswith("$pbkdf2")
+
+
+def test_file_names_are_unique_and_safe():
+    _, item = plan(3)
+    names = [(f["user_position"], f["filename"]) for f in item["files"]]
+    assert len(set(names)) == len(names)
+    assert seed_data.slugify("Procédure résiliation / RC Pro") == "procedure_resiliation_rc_pro"
@@ -0,0 +1,51 @@
+import uuid
+
+import requests
+
+BASE_URL = "http://localhost:8000"
+
+
+def login(email: str, password: str) -> dict:
+    response = requests.post(f"{BASE_URL}/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def upload(headers: dict, title: str, tag: str, is_public: bool) -> int:
+    response = requests.post(
+        f"{BASE_URL}/my-files/upload",
+        data={"title": title, "tags": tag, "is_public": str(is_public).lower()},
+        files={"file": ("partage.txt", b"contenu partage", "text/plain")},
+        headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def shared_ids(headers: dict, path: str = "/shared-files/", **params) -> list:
+    response = requests.get(f"{BASE_URL}{path}", params=params, headers=headers)
+    assert response.status_code == 200
+    return [item["id"] for item in response.json()]
+
+
+def test_shared_files_visibility():
+    """Fichiers publics visibles des autres utilisateurs du client seulement"""
+    owner = login("user@client-a.com", "password123")
+    colleague = login("admin@client-a.com", "password123")
+    outsider = login("admin@client-b.com", "password456")
+    tag = f"tag{uuid.uuid4().hex[:8]}"
+
+    public_id = upload(owner, f"Public {tag}", tag, True)
+    private_id = upload(owner, f"Privé {tag}", tag, False)
+    try:
+        assert shared_ids(colleague, tag=tag) == [public_id]
+        assert shared_ids(colleague, "/shared-files/search/", query=tag) == [public_id]
+        count = requests.get(f"{BASE_URL}/shared-files/count", params={"tag": tag}, headers=colleague).json()
+        assert count["count"] == 1
+        # Mes propres fichiers et ceux d'un autre client n'apparaissent pas
+        assert shared_ids(owner, tag=tag) == []
+        assert shared_ids(outsider, tag=tag) == []
+        assert shared_ids(outsider, "/shared-files/search/", query=tag) == []
+    finally:
+        for file_id in (public_id, private_id):
+            requests.delete(f"{BASE_URL}/my-files/{file_id}", headers=owner)
@@ -0,0 +1,71 @@
+import io
+import os
+import sys
+import tempfile
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import models  # noqa: E402
+from file_storage import FileStorageManager  # noqa: E402
+from shared_rag import SharedKnowledgeIndex  # noqa: E402
+from storage_drivers import MemoryStorageDriver  # noqa: E402
+
+engine = create_engine(f"sqlite:///{tempfile.mkdtemp()}/shared.db", connect_args={"check_same_thread": False})
+models.Base.metadata.create_all(engine)
+Session = sessionmaker(bind=engine)
+storage = FileStorageManager(driver=MemoryStorageDriver())
+
+
+def add_file(db, client_id, user_id, title, content, is_public):
+    key = storage.new_user_file_key(client_id, user_id, f"{title}.txt")
+    blob = storage.write_user_blob(client_id, key["key"], io.BytesIO(content.encode()), ".txt")
+    row = models.UserFile(
+        filename=key["filename"], file_path=key["key"], title=title, client_id=client_id, user_id=user_id,
+        file_size=blob["file_size"], content_hash=blob["content_hash"],
+        storage_encoding=blob["storage_encoding"], is_public=is_public
+    )
+    db.add(row)
+    db.commit()
+    return row
+
+
+def titles(results):
+    return [doc.metadata["title"] for doc, score in results]
+
+
+def test_shared_index_respects_visibility_and_syncs():
+    db = Session()
+    client, other = models.Client(name="Client A"), models.Client(name="Client B")
+    db.add_all([client, other])
+    db.commit()
+    alice = models.User(email="alice@a.example", hashed_password="x", client_id=client.id)
+    bob = models.User(email="bob@a.example", hashed_password="x", client_id=client.id)
+    mallory = models.User(email="mallory@b.example", hashed_password="x", client_id=other.id)
+    db.add_all([alice, bob, mallory])
+    db.commit()
+
+    question = "Quelle est la procédure de télétravail ?"
+    public = add_file(db, client.id, alice.id, "Télétravail public", "La procédure de télétravail : deux jours.", True)
+    add_file(db, client.id, alice.id, "Télétravail privé", "Procédure de télétravail confidentielle.", False)
+    add_file(db, other.id, mallory.id, "Télétravail client B", "Procédure de télétravail du client B.", True)
+    db.add(models.Document(title="Charte télétravail", content="Procédure de télétravail du client.",
+                           client_id=client.id, user_id=alice.id))
+    db.commit()
+
+    index = SharedKnowledgeIndex(client.id, db, file_manager=storage)
+    assert index.info()["public_files"] == 1 and index.info()["documents"] == 1
+    assert sorted(titles(index.search(question, bob.id, client.id))) == ["Charte télétravail", "Télétravail public"]
+    # Mes fichiers publics viennent de mon index personnel
+    assert titles(index.search(question, alice.id, client.id)) == ["Charte télétravail"]
+    # Un utilisateur d'un autre client ne voit rien de cet index
+    assert index.search(question, mallory.id, other.id) == []
+
+    public.is_public = False
+    db.commit()
+    assert index.sync(db) == {"loaded": 0, "removed": 1}
+    assert titles(index.search(question, bob.id, client.id)) == ["Charte télétravail"]
+    assert index.sync(db) == {"loaded": 0, "removed": 0}
+    db.close()
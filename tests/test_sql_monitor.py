@@ -0,0 +1,75 @@
+import logging
+import os
+import sys
+
+import pytest
+from sqlalchemy import Column, ForeignKey, Integer, String, create_engine
+from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import metrics  # noqa: E402
+import sql_monitor  # noqa: E402
+
+Base = declarative_base()
+
+
+class Author(Base):
+    __tablename__ = "authors"
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    books = relationship("Book")
+
+
+class Book(Base):
+    __tablename__ = "books"
+    id = Column(Integer, primary_key=True)
+    author_id = Column(Integer, ForeignKey("authors.id"))
+
+
+engine = create_engine("sqlite://")
+Base.metadata.create_all(engine)
+sql_monitor.instrument_engine(engine)
+Session = sessionmaker(bind=engine)
+
+with Session() as _db:
+    _db.add_all(Author(name=f"a{i}", books=[Book()]) for i in range(12))
+    _db.commit()
+
+
+def test_n_plus_one_is_reported(caplog):
+    caplog.set_level(logging.WARNING, logger="sql_monitor")
+    with metrics.request_scope("/authors") as stats, Session() as db:
+        for author in db.query(Author).all():
+            author.books  # Chargement paresseux : une requête par auteur
+    assert stats.db_queries == 13
+    assert any("N+1 probable sur /authors" in r.message for r in caplog.records)
+
+
+def test_query_budget():
+    with Session() as db:
+        with sql_monitor.assert_max_queries(1):
+            db.query(Author).count()
+        with pytest.raises(sql_monitor.QueryBudgetExceeded):
+            with sql_monitor.assert_max_queries(1):
+                for author in db.query(Author).all():
+                    author.books
+
+
+def test_slow_query_logged_with_plan(caplog, monkeypatch):
+    caplog.set_level(logging.WARNING, logger="sql_monitor")
+    monkeypatch.setattr(sql_monitor, "SLOW_QUERY_MS", 0)
+    with Session() as db:
+        db.query(Book).filter(Book.author_id == 3).all()
+    message = next(r.message for r in caplog.records if "Requête lente" in r.message)
+    assert "plan: SCAN books" in message
+
+
+def test_failed_query_leaves_no_state_on_connection():
+    with metrics.request_scope("/authors") as stats, engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(Exception):
+                conn.exec_driver_sql("SELECT * FROM table_absente")
+        conn.exec_driver_sql("SELECT 1")
+        assert not any(key.startswith("sql_monitor") and value for key, value in conn.info.items())
+    assert stats.db_queries == 1
@@ -0,0 +1,129 @@
+import io
+import os
+import sys
+import tempfile
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import models  # noqa: E402
+import storage_accounting  # noqa: E402
+from file_storage import FileStorageManager  # noqa: E402
+from storage_drivers import MemoryStorageDriver  # noqa: E402
+
+engine = create_engine(f"sqlite:///{tempfile.mkdtemp()}/accounting.db", connect_args={"check_same_thread": False})
+models.Base.metadata.create_all(engine)
+Session = sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def db():
+    session = Session()
+    for model in (models.StorageUsage, models.UserFile, models.User, models.Client):
+        session.query(model).delete()
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def storage():
+    return FileStorageManager(driver=MemoryStorageDriver())
+
+
+def make_user(db, quota_bytes=None):
+    client = models.Client(name="Client", storage_quota_bytes=quota_bytes)
+    db.add(client)
+    db.commit()
+    user = models.User(email="user@client.example", hashed_password="x", client_id=client.id)
+    db.add(user)
+    db.commit()
+    return user
+
+
+def write_file(db, storage, user, name, data: bytes, mime_type):
+    key = storage.new_user_file_key(user.client_id, user.id, name)
+    blob = storage.write_user_blob(user.client_id, key["key"], io.BytesIO(data), key["extension"])
+    row = models.UserFile(filename=key["filename"], file_path=key["key"], title=name, client_id=user.client_id,
+                          user_id=user.id, file_size=blob["file_size"], mime_type=mime_type)
+    db.add(row)
+    storage_accounting.record_upload(db, user.client_id, user.id, mime_type, row.file_size)
+    db.commit()
+    return row
+
+
+def test_upload_and_delete_update_user_and_client_counters(db, storage):
+    user = make_user(db)
+    note = write_file(db, storage, user, "note.txt", b"x" * 100, "text/plain")
+    write_file(db, storage, user, "notes.md", b"y" * 40, "text/markdown")
+
+    stats = storage_accounting.get_usage_stats(db, user.client_id, user.id)
+    assert (stats["file_count"], stats["total_size_bytes"], stats["client_total_size_bytes"]) == (2, 140, 140)
+    assert stats["by_mime_type"] == {
+        "text/plain": {"file_count": 1, "total_size_bytes": 100},
+        "text/markdown": {"file_count": 1, "total_size_bytes": 40},
+    }
+
+    storage_accounting.record_delete(db, user.client_id, user.id, note.mime_type, note.file_size, file_id=note.id)
+    db.delete(note)
+    db.commit()
+    stats = storage_accounting.get_usage_stats(db, user.client_id, user.id)
+    assert (stats["file_count"], stats["total_size_bytes"], stats["client_total_size_bytes"]) == (1, 40, 40)
+    assert list(stats["by_mime_type"]) == ["text/markdown"]
+
+
+def test_quota_overflow_is_refused_and_blob_removed(db, storage):
+    user = make_user(db, quota_bytes=150)
+    write_file(db, storage, user, "note.txt", b"x" * 100, "text/plain")
+
+    key = storage.new_user_file_key(user.client_id, user.id, "big.txt")
+    blob = storage.write_user_blob(user.client_id, key["key"], io.BytesIO(b"z" * 80), ".txt")
+    with pytest.raises(HTTPException) as error:
+        storage_accounting.check_quota_for_blob(
+            db, user.client_id, user.id, {"file_size": blob["file_size"], "file_path": key["key"]}, storage=storage
+        )
+    assert error.value.status_code == 413
+    assert storage.stat_user_file(key["key"]) is None
+    assert storage_accounting.get_remaining_quota(db, user.client_id, user.id) == 50
+
+
+def test_reconcile_fixes_injected_drift(db, storage):
+    user = make_user(db)
+    write_file(db, storage, user, "note.txt", b"x" * 100, "text/plain")
+    write_file(db, storage, user, "notes.md", b"y" * 40, "text/markdown")
+    expected = storage_accounting.get_usage_stats(db, user.client_id, user.id)
+
+    db.query(models.StorageUsage).filter(models.StorageUsage.mime_type == "text/plain").update(
+        {models.StorageUsage.file_count: 7, models.StorageUsage.total_bytes: 12345}
+    )
+    db.query(models.StorageUsage).filter(models.StorageUsage.mime_type == "text/markdown").delete()
+    db.commit()
+
+    result = storage_accounting.reconcile_usage(db, client_id=user.client_id, storage=storage)
+    assert result["corrected_rows"] == 4  # 2 types x (utilisateur, client)
+    assert storage_accounting.get_usage_stats(db, user.client_id, user.id) == expected
+    assert storage_accounting.reconcile_usage(db, client_id=user.client_id, storage=storage) == {"corrected_rows": 0}
+
+
+def test_reconciliation_job_runs_once_per_interval(db, storage, monkeypatch):
+    user = make_user(db)
+    write_file(db, storage, user, "note.txt", b"x" * 100, "text/plain")
+    runs = []
+    monkeypatch.setattr(storage_accounting, "SessionLocal", Session)
+    monkeypatch.setattr(storage_accounting, "reconcile_usage", lambda db: runs.append(db) or {"corrected_rows": 0})
+    lock_path = os.path.join(tempfile.mkdtemp(), "reconcile.lock")
+
+    # Deux workers qui démarrent ensemble : une seule passe
+    assert storage_accounting.run_reconciliation_job(lock_path) == {"corrected_rows": 0}
+    assert storage_accounting.run_reconciliation_job(lock_path) is None
+    assert len(runs) == 1
+
+    # Compteurs incohérents (base restaurée, lignes ajoutées hors API) : nouvelle passe malgré la passe récente
+    db.query(models.StorageUsage).delete()
+    db.commit()
+    assert storage_accounting.run_reconciliation_job(lock_path) == {"corrected_rows": 0}
+    assert len(runs) == 2
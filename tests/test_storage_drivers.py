@@ -0,0 +1,164 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from storage_drivers import (  # noqa: E402
+    LocalStorageDriver,
+    MemoryStorageDriver,
+    S3StorageDriver,
+    ShardedLocalStorageDriver,
+)
+
+
+def make_s3_driver():
+    moto = pytest.importorskip("moto")
+    boto3 = pytest.importorskip("boto3")
+    mock = moto.mock_aws()
+    mock.start()
+    client = boto3.client("s3", region_name="us-east-1")
+    client.create_bucket(Bucket="test-bucket")
+    return S3StorageDriver("test-bucket", prefix="files", client=client), mock
+
+
+@pytest.fixture(params=["memory", "local", "sharded", "s3"])
+def driver(request, tmp_path):
+    """Même contrat pour tous les drivers"""
+    if request.param == "memory":
+        yield MemoryStorageDriver()
+    elif request.param == "local":
+        yield LocalStorageDriver(str(tmp_path))
+    elif request.param == "sharded":
+        yield ShardedLocalStorageDriver(str(tmp_path))
+    else:
+        s3_driver, mock = make_s3_driver()
+        yield s3_driver
+        mock.stop()
+
+
+def test_put_get_stat_delete(driver):
+    key = "client_1/user_1/notes.txt"
+    assert driver.put(key, io.BytesIO(b"bonjour le monde")) == 16
+    assert driver.read_bytes(key) == b"bonjour le monde"
+    assert driver.stat(key)["size"] == 16
+    assert driver.get_range(key, 8, 9) == b"le"
+    assert b"".join(driver.iter_chunks(key, start=8, chunk_size=3)) == b"le monde"
+
+    assert driver.delete(key)
+    assert driver.stat(key) is None
+    with pytest.raises(FileNotFoundError):
+        driver.open(key)
+
+
+def test_list_is_resumable(driver):
+    keys = [f"client_1/user_{u}/doc_{i}.txt" for u in (1, 2) for i in range(5)]
+    for key in keys:
+        driver.put_bytes(key, key.encode())
+    driver.put_bytes(".gc/state.json", b"{}")  # clé interne, jamais listée
+
+    listed = [blob["key"] for blob in driver.list("")]
+    assert sorted(listed) == sorted(keys)
+
+    # Reprise après une clé quelconque : aucune perte, aucun doublon
+    resumed = listed[:4] + [blob["key"] for blob in driver.list("", start_after=listed[3])]
+    assert resumed == listed
+
+    assert sorted(b["key"] for b in driver.list("client_1/user_2/")) == sorted(k for k in keys if "user_2" in k)
+
+
+def test_move(driver):
+    driver.put_bytes("client_1/user_1/a.txt", b"x")
+    driver.move("client_1/user_1/a.txt", ".quarantine/client_1/user_1/a.txt")
+    assert driver.stat("client_1/user_1/a.txt") is None
+    assert driver.read_bytes(".quarantine/client_1/user_1/a.txt") == b"x"
+
+
+def test_multipart_upload_out_of_order(driver):
+    key = "client_1/user_1/gros.txt"
+    part_size = max(driver.min_part_size, 16)
+    data = os.urandom(part_size * 2 + 10)
+    upload_id = driver.create_multipart(key, len(data))
+
+    parts = []
+    for number in (3, 1, 2):
+        offset = (number - 1) * part_size
+        chunk = data[offset:offset + part_size]
+        parts.append(driver.put_part(key, upload_id, number, offset, io.BytesIO(chunk)))
+
+    assert driver.complete_multipart(key, upload_id, parts) == len(data)
+    assert driver.read_bytes(key) == data
+    assert [blob["key"] for blob in driver.list("")] == [key]
+
+
+def test_sharded_layout(tmp_path):
+    driver = ShardedLocalStorageDriver(str(tmp_path), levels=2, width=2)
+    driver.put_bytes("client_1/user_1/a.txt", b"x")
+    path = driver.local_path("client_1/user_1/a.txt")
+    assert path.exists()
+    assert len(path.relative_to(tmp_path).parts) == 5
+
+
+def test_sharded_reads_flat_files_during_reshard(tmp_path):
+    flat = LocalStorageDriver(str(tmp_path))
+    keys = sorted(f"client_1/user_1/doc_{i}.txt" for i in range(20))
+    for key in keys:
+        flat.put_bytes(key, key.encode())
+
+    driver = ShardedLocalStorageDriver(str(tmp_path))
+    assert driver.read_bytes(keys[0]) == keys[0].encode()
+    assert sorted(b["key"] for b in driver.list("client_1/")) == keys
+
+    # Réécriture : la version à plat masquée est supprimée
+    driver.put_bytes(keys[1], b"nouveau")
+    assert not (tmp_path / keys[1]).exists()
+
+    from migrate_storage import InPlaceResharder
+    result = InPlaceResharder(driver).run()
+    assert result["moved"] == 19 and result["failed"] == 0
+    strict = ShardedLocalStorageDriver(str(tmp_path), legacy_fallback=False)
+    assert sorted(b["key"] for b in strict.list("")) == keys
+    assert strict.read_bytes(keys[1]) == b"nouveau"
+    assert all(len(strict.local_path(key).relative_to(tmp_path).parts) == 5 for key in keys)
+
+
+def test_migration_copies_dictionaries_and_text_cache(tmp_path):
+    from migrate_storage import StorageMigrator
+    source = MemoryStorageDriver()
+    for key in ("client_1/user_1/a.txt", "client_2/user_3/b.txt", ".zdict/40000.dict",
+                ".zdict/client_1.current", ".extracted/ab/abcd.txt.gz", ".gc/state.json"):
+        source.put_bytes(key, key.encode())
+
+    target = LocalStorageDriver(str(tmp_path / "full"))
+    assert StorageMigrator(source, target).run()["copied"] == 5
+    assert target.read_bytes(".zdict/40000.dict") == b".zdict/40000.dict"
+    assert target.stat(".extracted/ab/abcd.txt.gz") is not None
+    assert target.stat(".gc/state.json") is None
+
+    # Migration d'un seul client : dictionnaires copiés mais conservés à la source
+    partial = MemoryStorageDriver()
+    result = StorageMigrator(source, partial, delete_source=True).run("client_1/")
+    assert result["copied"] == 3
+    assert partial.stat(".zdict/client_1.current") is not None and partial.stat(".extracted/ab/abcd.txt.gz") is None
+    assert source.stat("client_1/user_1/a.txt") is None and source.stat(".zdict/40000.dict") is not None
+
+
+def test_migrated_dictionary_compressed_blob_is_readable(tmp_path):
+    pytest.importorskip("zstandard")
+    from blob_compression import BlobCodec
+    from file_storage import FileStorageManager
+    from migrate_storage import StorageMigrator
+
+    source = FileStorageManager(driver=MemoryStorageDriver())
+    source.codec = BlobCodec(source.driver, mode="zstd")
+    samples = [f"Compte rendu de réunion n°{i}\nParticipants: équipe {i % 7}\n".encode() * 20 for i in range(40)]
+    assert source.codec.train_dictionary(1, samples)["trained"]
+    key = "client_1/user_1/notes.txt"
+    blob = source.write_user_blob(1, key, io.BytesIO(samples[3]), ".txt")
+    assert blob["storage_encoding"].startswith("zstd:")
+
+    target = FileStorageManager(driver=LocalStorageDriver(str(tmp_path)))
+    assert StorageMigrator(source.driver, target.driver).run()["failed"] == 0
+    assert target.read_blob(key, blob["storage_encoding"]) == samples[3]
@@ -0,0 +1,146 @@
+import io
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import models  # noqa: E402
+import storage_accounting  # noqa: E402
+from file_storage import FileStorageManager  # noqa: E402
+from storage_drivers import LocalStorageDriver  # noqa: E402
+from storage_gc import StorageReconciler  # noqa: E402
+
+engine = create_engine(f"sqlite:///{tempfile.mkdtemp()}/gc.db", connect_args={"check_same_thread": False})
+models.Base.metadata.create_all(engine)
+Session = sessionmaker(bind=engine)
+
+OLD = time.time() - 7200  # Plus ancien que le délai de grâce par défaut (1 h)
+
+
+@pytest.fixture
+def db():
+    session = Session()
+    for model in (models.StorageUsage, models.UserFile, models.User, models.Client):
+        session.query(model).delete()
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def storage():
+    return FileStorageManager(driver=LocalStorageDriver(tempfile.mkdtemp()))
+
+
+@pytest.fixture
+def user(db):
+    client = models.Client(name="Client")
+    db.add(client)
+    db.commit()
+    user = models.User(email="user@client.example", hashed_password="x", client_id=client.id)
+    db.add(user)
+    db.commit()
+    return user
+
+
+def make_reconciler(storage, **options):
+    gc = StorageReconciler(storage=storage, **options)
+    gc.lock_path = os.path.join(tempfile.mkdtemp(), "gc.lock")
+    return gc
+
+
+def write_file(db, storage, user, name, data: bytes):
+    key = storage.new_user_file_key(user.client_id, user.id, name)
+    blob = storage.write_user_blob(user.client_id, key["key"], io.BytesIO(data), key["extension"])
+    row = models.UserFile(filename=key["filename"], file_path=key["key"], title=name, client_id=user.client_id,
+                          user_id=user.id, file_size=blob["file_size"], mime_type="text/plain")
+    db.add(row)
+    storage_accounting.record_upload(db, user.client_id, user.id, row.mime_type, row.file_size)
+    db.commit()
+    return row
+
+
+def put_blob(storage, key, data=b"orphelin", mtime=OLD):
+    storage.driver.put_bytes(key, data)
+    os.utime(storage.driver.root / key, (mtime, mtime))
+
+
+def test_orphans_are_quarantined_only_after_grace_period(db, storage, user):
+    kept = write_file(db, storage, user, "note.txt", b"x" * 10)
+    put_blob(storage, "client_1/user_1/ancien.txt")
+    put_blob(storage, "client_1/user_1/en_cours.txt", mtime=time.time())
+
+    metrics = make_reconciler(storage).run(db)
+
+    assert metrics["passes_completed"] == 1
+    assert metrics["orphan_files"] == metrics["quarantined_files"] == 1
+    assert storage.driver.stat("client_1/user_1/ancien.txt") is None
+    assert storage.driver.stat(".quarantine/client_1/user_1/ancien.txt")["size"] == len(b"orphelin")
+    # Fichier récent (upload en cours) et fichier référencé : laissés en place
+    assert storage.driver.stat("client_1/user_1/en_cours.txt") is not None
+    assert storage.stat_user_file(kept.file_path) is not None
+
+
+def test_hidden_prefixes_are_not_scanned(db, storage, user):
+    for key in (".uploads/abc/part-1", ".extracted/ab/cdef.txt", ".quarantine/client_1/user_1/vieux.txt"):
+        put_blob(storage, key)
+
+    metrics = make_reconciler(storage).run(db)
+
+    assert metrics["files_scanned"] == 0 and metrics["orphan_files"] == 0
+    assert storage.driver.stat(".uploads/abc/part-1") is not None
+    assert storage.driver.stat(".extracted/ab/cdef.txt") is not None
+    assert storage.driver.stat(".quarantine/client_1/user_1/vieux.txt") is not None
+    assert storage.driver.stat(".quarantine/.quarantine/client_1/user_1/vieux.txt") is None
+
+
+def test_size_repair_adjusts_counters(db, storage, user):
+    row = write_file(db, storage, user, "note.txt", b"x" * 100)
+    storage.driver.put_bytes(storage.resolve_key(row.file_path), b"x" * 160)  # Modifié hors API
+
+    metrics = make_reconciler(storage).run(db)
+
+    assert metrics["repaired_sizes"] == 1
+    db.refresh(row)
+    assert row.file_size == 160
+    stats = storage_accounting.get_usage_stats(db, user.client_id, user.id)
+    assert (stats["file_count"], stats["total_size_bytes"], stats["client_total_size_bytes"]) == (1, 160, 160)
+
+
+def test_dangling_row_is_reported_not_deleted_by_default(db, storage, user):
+    row = write_file(db, storage, user, "note.txt", b"x" * 10)
+    storage.driver.delete(storage.resolve_key(row.file_path))
+
+    metrics = make_reconciler(storage).run(db)
+
+    assert metrics["dangling_rows"] == 1 and metrics["deleted_rows"] == 0
+    assert db.query(models.UserFile).count() == 1
+    assert storage_accounting.get_usage_stats(db, user.client_id, user.id)["file_count"] == 1
+
+    metrics = make_reconciler(storage, delete_dangling_rows=True).run(db)
+    assert metrics["deleted_rows"] == 1
+    assert db.query(models.UserFile).count() == 0
+    assert storage_accounting.get_usage_stats(db, user.client_id, user.id)["file_count"] == 0
+
+
+def test_interrupted_pass_resumes_from_checkpoint(db, storage, user):
+    keys = [f"client_1/user_1/orphelin_{i}.txt" for i in range(5)]
+    for key in keys:
+        put_blob(storage, key)
+
+    first = make_reconciler(storage, batch_size=2).run(db, max_batches=1)
+    assert first["files_scanned"] == 2
+    assert first["checkpoint"] == {**first["checkpoint"], "phase": "storage", "last_key": keys[1]}
+
+    # Nouveau processus : reprise après la dernière clé traitée, sans revoir les deux premières
+    second = make_reconciler(storage, batch_size=2).run(db)
+    assert second["files_scanned"] == 3
+    assert second["quarantined_files"] == 3 and second["passes_completed"] == 1
+    assert second["checkpoint"]["last_key"] is None
+    assert all(storage.driver.stat(".quarantine/" + key) is not None for key in keys)
@@ -0,0 +1,66 @@
+import uuid
+
+import requests
+
+BASE_URL = "http://localhost:8000"
+
+
+def register() -> dict:
+    """Nouveau client (et son administrateur) : compteurs partant de zéro"""
+    suffix = uuid.uuid4().hex[:8]
+    response = requests.post(f"{BASE_URL}/auth/register", json={
+        "email": f"stats-{suffix}@example.com",
+        "full_name": "Test compteurs",
+        "password": "password123",
+        "company_name": f"Compteurs {suffix}"
+    })
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def listed_usage(headers: dict) -> dict:
+    """Nombre, taille et répartition par type recalculés depuis la liste des fichiers"""
+    files = requests.get(f"{BASE_URL}/my-files/", params={"limit": 1000}, headers=headers).json()
+    by_mime_type = {}
+    for item in files:
+        usage = by_mime_type.setdefault(item["mime_type"], {"file_count": 0, "total_size_bytes": 0})
+        usage["file_count"] += 1
+        usage["total_size_bytes"] += item["file_size"]
+    return {
+        "file_count": len(files),
+        "total_size_bytes": sum(item["file_size"] for item in files),
+        "by_mime_type": by_mime_type
+    }
+
+
+def stats(headers: dict) -> dict:
+    response = requests.get(f"{BASE_URL}/my-files/stats", headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    return {key: data[key] for key in ("file_count", "total_size_bytes", "by_mime_type")}
+
+
+def test_stats_follow_uploads_and_deletes():
+    """Les compteurs de /my-files/stats suivent les ajouts et suppressions"""
+    headers = register()
+    before = stats(headers)
+    assert before == {"file_count": 0, "total_size_bytes": 0, "by_mime_type": {}}
+
+    content = "# Compteurs\n" + "ligne de test\n" * 50
+    response = requests.post(
+        f"{BASE_URL}/my-files/upload",
+        data={"title": "Compteurs de stockage"},
+        files={"file": ("compteurs.md", content.encode(), "text/markdown")},
+        headers=headers
+    )
+    assert response.status_code == 200
+    uploaded = response.json()
+    try:
+        after = stats(headers)
+        assert after["file_count"] == before["file_count"] + 1
+        assert after["total_size_bytes"] == before["total_size_bytes"] + len(content.encode())
+        assert after == listed_usage(headers)
+    finally:
+        requests.delete(f"{BASE_URL}/my-files/{uploaded['id']}", headers=headers)
+
+    assert stats(headers) == before
@@ -0,0 +1,70 @@
+import hashlib
+import io
+import os
+import sys
+import time
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from storage_drivers import MemoryStorageDriver  # noqa: E402
+from text_extraction import TextExtractionService  # noqa: E402
+
+
+def make_docx(*paragraphs):
+    body = "".join(f"<w:p><w:r><w:t>{p}</w:t></w:r></w:p>" for p in paragraphs)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("word/document.xml", f"<w:document><w:body>{body}</w:body></w:document>")
+    return buffer.getvalue()
+
+
+def test_docx_extracted_once_then_cached():
+    driver = MemoryStorageDriver()
+    data = make_docx("Premier  paragraphe", "Second &amp; dernier")
+    driver.put_bytes("client_1/user_1/a.docx", data)
+    content_hash = hashlib.sha256(data).hexdigest()
+    service = TextExtractionService(driver, workers=0)
+
+    text = service.get_text("client_1/user_1/a.docx", ".docx", content_hash)
+    assert text == "Premier paragraphe\nSecond & dernier"
+    assert driver.exists(service.cache_key(content_hash))
+
+    # Deuxième accès : servi par le cache, même sans le blob d'origine
+    driver.delete("client_1/user_1/a.docx")
+    assert service.get_text("client_1/user_1/a.docx", ".docx", content_hash) == text
+    assert service.stats["extractions"] == 1
+    assert service.stats["cache_hits"] == 1
+
+
+def test_cache_keys_hidden_from_listings():
+    driver = MemoryStorageDriver()
+    driver.put_bytes("client_1/user_1/a.docx", make_docx("x"))
+    service = TextExtractionService(driver, workers=0)
+    service.get_text("client_1/user_1/a.docx", ".docx")
+    assert [blob["key"] for blob in driver.list("")] == ["client_1/user_1/a.docx"]
+
+
+def test_timed_out_extraction_restarts_pool(monkeypatch):
+    import text_extraction
+
+    @text_extraction.register_extractor(".lent")
+    def extract_forever(data: bytes) -> str:
+        time.sleep(60)
+        return ""
+
+    monkeypatch.setattr(text_extraction, "EXTRACTION_TIMEOUT_SECONDS", 1)
+    service = TextExtractionService(MemoryStorageDriver(), workers=1)
+    try:
+        with pytest.raises(TimeoutError):
+            service._extract(".lent", b"piege")
+        assert service._pool is None
+
+        # Le processus bloqué est arrêté : l'extraction suivante a un pool neuf
+        assert service._extract(".txt", "Texte  suivant".encode()) == "Texte suivant"
+    finally:
+        if service._pool is not None:
+            service._pool.shutdown()
+        text_extraction._EXTRACTORS.pop(".lent")
@@ -0,0 +1,128 @@
+import io
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import models  # noqa: E402
+import storage_accounting  # noqa: E402
+import upload_sessions  # noqa: E402
+from file_storage import FileStorageManager  # noqa: E402
+from storage_drivers import MemoryStorageDriver  # noqa: E402
+
+engine = create_engine(f"sqlite:///{tempfile.mkdtemp()}/uploads.db", connect_args={"check_same_thread": False})
+models.Base.metadata.create_all(engine)
+Session = sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def db():
+    session = Session()
+    for model in (models.UploadPart, models.UploadSession, models.StorageUsage, models.User, models.Client):
+        session.query(model).delete()
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = FileStorageManager(driver=MemoryStorageDriver())
+    monkeypatch.setattr(upload_sessions, "file_storage", storage)
+    return storage
+
+
+@pytest.fixture
+def user(db):
+    client = models.Client(name="Client", storage_quota_bytes=10)
+    db.add(client)
+    db.commit()
+    user = models.User(email="user@client.example", hashed_password="x", client_id=client.id)
+    db.add(user)
+    db.commit()
+    return user
+
+
+def open_session(db, user, content: bytes, parts=(1, 2)):
+    session = upload_sessions.create_session(db, user, "gros.txt", total_size=len(content), part_size=4)
+    for n in parts:
+        upload_sessions.write_part(db, session, n, io.BytesIO(content[(n - 1) * 4:n * 4]))
+    return session
+
+
+def staged_parts(storage, session):
+    return [n for n in range(1, session.part_count + 1)
+            if storage.driver.stat(storage.driver._part_key(session.driver_upload_id, n)) is not None]
+
+
+def test_expired_session_is_refused_then_cleaned_up(db, storage, user):
+    session = open_session(db, user, b"abcdefgh", parts=(1,))
+    session.expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+
+    with pytest.raises(HTTPException) as error:
+        upload_sessions.get_session(db, user, session.id)
+    assert error.value.status_code == 410
+
+    assert staged_parts(storage, session) == [1]
+    assert upload_sessions.expire_sessions(db) == 1
+    assert staged_parts(storage, session) == []
+    assert db.query(models.UploadSession).count() == db.query(models.UploadPart).count() == 0
+
+
+def test_quota_is_checked_again_before_assembly(db, storage, user):
+    session = open_session(db, user, b"abcdefgh")
+    # Un autre fichier enregistré entre-temps : il ne reste plus que 4 octets
+    storage_accounting.record_upload(db, user.client_id, user.id, "text/plain", 6)
+    db.commit()
+
+    with pytest.raises(HTTPException) as error:
+        upload_sessions.complete_session(db, session)
+    assert error.value.status_code == 413
+    # Rien n'est assemblé ; la session reste reprenable
+    assert storage.driver.stat(session.storage_key) is None
+    assert upload_sessions.get_session(db, user, session.id).part_count == 2
+
+
+def test_failed_assembly_drops_session(db, storage, user, monkeypatch):
+    session = open_session(db, user, b"abcdefgh")
+    session_id = session.id
+
+    def broken(*args):
+        raise OSError("disque plein")
+    monkeypatch.setattr(storage.driver, "complete_multipart", broken)
+
+    with pytest.raises(OSError):
+        upload_sessions.complete_session(db, session)
+    assert staged_parts(storage, session) == []
+    with pytest.raises(HTTPException) as error:
+        upload_sessions.get_session(db, user, session_id)
+    assert error.value.status_code == 404
+
+
+def test_concurrent_completion_is_rejected(db, storage, user, monkeypatch):
+    session = open_session(db, user, b"abcdefgh")
+    other_db = Session()
+    check_quota = storage_accounting.check_quota
+    completed = []
+
+    def racing_check_quota(*args):
+        # L'autre finalisation passe entre nos vérifications et notre réservation
+        monkeypatch.setattr(storage_accounting, "check_quota", check_quota)
+        completed.append(upload_sessions.complete_session(other_db, other_db.get(models.UploadSession, session.id)))
+        check_quota(*args)
+    monkeypatch.setattr(storage_accounting, "check_quota", racing_check_quota)
+
+    with pytest.raises(HTTPException) as error:
+        upload_sessions.complete_session(db, session)
+    other_db.close()
+    assert error.value.status_code == 409
+    assert completed[0]["file_size"] == 8
+    assert storage.driver.read_bytes(completed[0]["file_path"]) == b"abcdefgh"
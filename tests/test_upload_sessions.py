@@ -0,0 +1,75 @@
+import hashlib
+
+import requests
+
+BASE_URL = "http://localhost:8000"
+
+
+def login(email: str, password: str) -> dict:
+    response = requests.post(f"{BASE_URL}/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def put_part(headers, session_id, part_number, data: bytes, sha256=None):
+    part_headers = {**headers, "X-Part-SHA256": sha256 or hashlib.sha256(data).hexdigest()}
+    return requests.put(f"{BASE_URL}/my-files/uploads/{session_id}/parts/{part_number}",
+                        data=data, headers=part_headers)
+
+
+def test_upload_session_flow():
+    """Parties dans le désordre, parties refusées, finalisation puis nouvelle tentative"""
+    headers = login("user@client-a.com", "password123")
+    content = b"0123456789"
+    response = requests.post(f"{BASE_URL}/my-files/uploads", headers=headers, json={
+        "filename": "gros_fichier.txt", "total_size": len(content), "part_size": 4, "tags": "upload-test"
+    })
+    assert response.status_code == 200
+    session = response.json()
+    assert (session["part_count"], session["received_parts"]) == (3, [])
+    session_id = session["id"]
+
+    assert put_part(headers, session_id, 3, content[8:]).status_code == 200
+    assert put_part(headers, session_id, 1, content[:4]).status_code == 200
+
+    # Somme incorrecte et partie trop grande : refusées, la partie 2 reste à envoyer
+    assert put_part(headers, session_id, 2, content[4:8], sha256="0" * 64).status_code == 400
+    assert put_part(headers, session_id, 2, content[4:9]).status_code == 413
+    state = requests.get(f"{BASE_URL}/my-files/uploads/{session_id}", headers=headers).json()
+    assert state["received_parts"] == [1, 3]
+
+    response = requests.post(f"{BASE_URL}/my-files/uploads/{session_id}/complete", headers=headers)
+    assert response.status_code == 400
+    assert "Parties manquantes: 2" in response.json()["detail"]
+
+    assert put_part(headers, session_id, 2, content[4:8]).status_code == 200
+    response = requests.post(f"{BASE_URL}/my-files/uploads/{session_id}/complete", headers=headers)
+    assert response.status_code == 200
+    file_id = response.json()["id"]
+    try:
+        assert response.json()["file_size"] == len(content)
+        read = requests.get(f"{BASE_URL}/my-files/{file_id}", headers=headers).json()
+        assert read["content"] == content.decode()
+
+        # Session consommée : une nouvelle tentative ne crée pas de second fichier
+        retry = requests.post(f"{BASE_URL}/my-files/uploads/{session_id}/complete", headers=headers)
+        assert retry.status_code == 404
+    finally:
+        assert requests.delete(f"{BASE_URL}/my-files/{file_id}", headers=headers).status_code == 200
+
+
+def test_upload_session_abort():
+    """Un upload abandonné n'est plus accessible, ni par son propriétaire ni par un autre utilisateur"""
+    headers = login("user@client-a.com", "password123")
+    response = requests.post(f"{BASE_URL}/my-files/uploads", headers=headers, json={
+        "filename": "abandon.txt", "total_size": 8, "part_size": 4
+    })
+    session_id = response.json()["id"]
+    assert put_part(headers, session_id, 1, b"abcd").status_code == 200
+
+    other = login("admin@client-a.com", "password123")
+    assert requests.get(f"{BASE_URL}/my-files/uploads/{session_id}", headers=other).status_code == 404
+
+    assert requests.delete(f"{BASE_URL}/my-files/uploads/{session_id}", headers=headers).status_code == 200
+    assert requests.get(f"{BASE_URL}/my-files/uploads/{session_id}", headers=headers).status_code == 404
+    assert put_part(headers, session_id, 2, b"efgh").status_code == 404